@@ -0,0 +1,216 @@
+import hashlib
+import inspect
+import json
+import os
+from multiprocessing import Pool
+import numpy as np
+"""
+Tokenization of the fine-tuning data, cached on disk.
+
+Tokenizing the training set entry by entry takes minutes for larger corpora, and the notebook lost it on every
+kernel restart. TokenCache tokenizes the entries in batches, on a pool of worker processes, and saves the token ids
+under a key made of:
+- the tokenizer: its name, the transformers version, its serialized vocabulary and post-processing (which adds the
+  bos and eos tokens), its padding side and pad token
+- the formatting function, from its source code
+- max_length (None for no truncation or padding)
+Within that key every entry is cached under the hash of its training text (the output of the formatting function), so
+a re-run loads the cache and only tokenizes the entries that were added or changed since. Entries tokenized by a run
+are saved as a new shard (a .npz file of the flat token ids and their offsets), and once there are more than
+MAX_SHARDS shards, loading the cache merges them into one, so a re-run reads a few files however many runs came before.
+
+Any tokenizer works, a small local one included, so the cache can be tried on a CPU:
+    from token_cache import TokenCache
+    cache = TokenCache("token_cache", tokenizer, format_for_training, max_length=400)
+    tokenized_train_dataset = cache.tokenize(train_data, labels=True)
+"""
+
+BATCH_SIZE = 256
+HASH_BYTES = 16
+MAX_SHARDS = 8
+
+_tokenizer = None
+_options = None
+
+
+def _digest(data):
+    return hashlib.blake2b(data.encode("utf-8") if isinstance(data, str) else data, digest_size=HASH_BYTES).hexdigest()
+
+
+def text_hash(text):
+    """
+    :param text: Training text of an entry
+    :return: Hash of the text, as bytes
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=HASH_BYTES).digest()
+
+
+def _flatten(rows, dtype):
+    # Lists from the tokenizer or arrays from the cache, concatenated
+    if not rows:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate([np.asarray(row, dtype=dtype) for row in rows])
+
+
+def tokenizer_fingerprint(tokenizer):
+    """
+    :param tokenizer: transformers tokenizer
+    :return: Dictionary identifying the tokenizer and the way it tokenizes
+    """
+    import transformers
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    # Fast tokenizers serialize their whole pipeline, slow ones are identified by their vocabulary
+    serialized = backend.to_str() if backend is not None else json.dumps(sorted(tokenizer.get_vocab().items()))
+    return {"name": getattr(tokenizer, "name_or_path", ""),
+            "class": type(tokenizer).__name__,
+            "transformers": transformers.__version__,
+            "tokenizer": _digest(serialized),
+            "padding_side": tokenizer.padding_side,
+            "pad_token": tokenizer.pad_token}
+
+
+def function_fingerprint(function):
+    try:
+        source = inspect.getsource(function)
+    except (OSError, TypeError):  # No source, e.g. a function typed in a console
+        source = function.__code__.co_code.hex() + repr(function.__code__.co_consts)
+    return _digest(source)
+
+
+def _start_worker(tokenizer, options):
+    global _tokenizer, _options
+    _tokenizer, _options = tokenizer, options
+
+
+def _start_pool_worker(tokenizer, options):
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"  # The pool already uses every core
+    _start_worker(tokenizer, options)
+
+
+def tokenize_batch(texts):
+    """
+    Tokenizes a batch of training texts, in a worker process
+    :param texts: List of texts
+    :return: (list of input_ids lists, list of attention_mask lists)
+    """
+    encoded = _tokenizer(texts, **_options)
+    return encoded["input_ids"], encoded["attention_mask"]
+
+
+class TokenCache:
+    """
+    Token ids of the entries of the fine-tuning data, cached on disk.
+    :param cache_dir: Directory of the cache, shared by every key
+    :param tokenizer: transformers tokenizer
+    :param format_function: Function making the training text of an entry
+    :param max_length: Length the token ids are truncated and padded to, None to keep them as they are
+    """
+
+    def __init__(self, cache_dir, tokenizer, format_function, max_length=None):
+        self.tokenizer = tokenizer
+        self.format_function = format_function
+        self.max_length = max_length
+        self.options = {} if max_length is None else {"truncation": True, "max_length": max_length,
+                                                     "padding": "max_length"}
+        self.fingerprint = {"tokenizer": tokenizer_fingerprint(tokenizer),
+                            "format": function_fingerprint(format_function),
+                            "max_length": max_length}
+        self.key = _digest(json.dumps(self.fingerprint, sort_keys=True))
+        self.directory = os.path.join(cache_dir, self.key)
+        self.hits = 0
+        self.misses = 0
+
+    def _shards(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if name.startswith("shard-") and name.endswith(".npz"))
+
+    def load(self):
+        """
+        Loads every cached entry, and merges the shards into one if there are more than MAX_SHARDS
+        :return: {text hash: (input_ids array, attention_mask array)} of every cached entry
+        """
+        shards = self._shards()
+        cached = {}
+        for name in shards:
+            with np.load(os.path.join(self.directory, name)) as shard:
+                hashes, offsets = shard["hashes"], shard["offsets"]
+                input_ids, attention_mask = shard["input_ids"], shard["attention_mask"]
+            for row, digest in enumerate(hashes):
+                start, end = offsets[row], offsets[row + 1]
+                cached[digest.tobytes()] = (input_ids[start:end], attention_mask[start:end])
+        if len(shards) > MAX_SHARDS:
+            self._write_shard(list(cached), [ids for ids, _ in cached.values()],
+                              [masks for _, masks in cached.values()])
+            # The merged shard is complete before the old ones go, an interrupted run only leaves entries twice
+            for name in shards:
+                os.remove(os.path.join(self.directory, name))
+        return cached
+
+    def _save(self, hashes, input_ids, attention_mask):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "key.json"), "w") as f:
+            json.dump(self.fingerprint, f, indent=2)
+        self._write_shard(hashes, input_ids, attention_mask)
+
+    def _write_shard(self, hashes, input_ids, attention_mask):
+        shard = {"hashes": np.frombuffer(b"".join(hashes), dtype=np.uint8).reshape(-1, HASH_BYTES),
+                 "offsets": np.concatenate(([0], np.cumsum([len(ids) for ids in input_ids]))).astype(np.int64),
+                 "input_ids": _flatten(input_ids, np.int32),
+                 "attention_mask": _flatten(attention_mask, np.int8)}
+        # Numbered after the last shard, shards are numbered in the order they were written
+        shards = self._shards()
+        number = int(shards[-1][len("shard-"):-len(".npz")]) + 1 if shards else 0
+        path = os.path.join(self.directory, f"shard-{number:05d}.npz")
+        # Written under another name first, so an interrupted run never leaves a broken shard
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **shard)
+        os.replace(path + ".tmp", path)
+
+    def tokenize(self, entries, labels=False, workers=None, batch_size=BATCH_SIZE):
+        """
+        Tokenizes the entries that are not in the cache, saves them, and returns the tokens of every entry
+        :param entries: List of entries
+        :param labels: Add labels, a copy of input_ids, for self-supervised fine-tuning
+        :param workers: Number of worker processes, defaults to the number of CPUs, 1 to tokenize in this process
+        :param batch_size: Entries tokenized at a time
+        :return: List of {"input_ids", "attention_mask"(, "labels")} dictionaries, in the order of the entries
+        """
+        # Formatting is cheap, and the texts are what the tokens depend on
+        texts = [self.format_function(entry) for entry in entries]
+        hashes = [text_hash(text) for text in texts]
+        cached = self.load()
+        missing = {}  # Texts appearing twice are tokenized once
+        for digest, text in zip(hashes, texts):
+            if digest not in cached:
+                missing.setdefault(digest, text)
+        self.hits = sum(digest in cached for digest in hashes)
+        self.misses = len(missing)
+        if missing:
+            new_hashes = list(missing)
+            new_texts = list(missing.values())
+            batches = [new_texts[i:i + batch_size] for i in range(0, len(new_texts), batch_size)]
+            workers = min(workers or os.cpu_count() or 1, len(batches))
+            if workers <= 1:
+                _start_worker(self.tokenizer, self.options)
+                results = [tokenize_batch(batch) for batch in batches]
+            else:
+                with Pool(workers, initializer=_start_pool_worker, initargs=(self.tokenizer, self.options)) as pool:
+                    results = pool.map(tokenize_batch, batches)
+            input_ids = [ids for batch_ids, _ in results for ids in batch_ids]
+            attention_mask = [masks for _, batch_masks in results for masks in batch_masks]
+            self._save(new_hashes, input_ids, attention_mask)
+            for digest, ids, masks in zip(new_hashes, input_ids, attention_mask):
+                cached[digest] = (ids, masks)
+
+        tokenized = []
+        for digest in hashes:
+            ids, masks = cached[digest]
+            # Arrays from the cache, lists from this run
+            ids = ids.tolist() if isinstance(ids, np.ndarray) else list(ids)
+            record = {"input_ids": ids,
+                      "attention_mask": masks.tolist() if isinstance(masks, np.ndarray) else list(masks)}
+            if labels:
+                record["labels"] = list(ids)
+            tokenized.append(record)
+        return tokenized
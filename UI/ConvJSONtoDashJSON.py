@@ -1,39 +1,26 @@
-import json
-import time
-import random
-import string
+from pipeline import arguments, run
+"""
+This conversion file makes a test file for the UI's LLM comparison out of our main JSON format, by copying the
+ground truth as the output of two LLMs.
 
-f = open("C:/Users/milli/Downloads/OSW_labeled_data.json")
-#file = json.load(f)
-ids = set()
-files = [f]
-class NoFileError: Exception
-def generate_dialog_id(existing_ids=set()):
-    while True:  # Get current timestamp
-        random_string = ''.join(random.choices(string.ascii_letters + string.digits, k=6))  # Generate a random string
-        dialog_id = f"{random_string}"  # Combine timestamp and random string
-        if dialog_id not in existing_ids:
-            existing_ids.add(dialog_id)
-            return dialog_id
+Run from the UI folder (see pipeline.py for the options):
+    python ConvJSONtoDashJSON.py OSW_labeled_data.json -o DashTest.json
+"""
 
-def file_convert():
-    merged_json = []
-    if len(files) > 1:  # main case
-        merged_json = json.load(files[0])
-        for file_ in files[1:]:
-            merged_json.append(json.load(file_))
-    elif len(files) == 0:  # error no file case
-        raise NoFileError
-    else:  # one file case
-        merged_json = json.load(files[0])
-    prompts = []
-    for sentence in merged_json:
-        sentence['LLM'] = {'GPT3.5': sentence['causal relations']}
-        sentence['LLM']["Bert"] = sentence['causal relations']
-        prompts.append(sentence)
-    return prompts
-with open("C:/Users/milli/Downloads/DashTest.json", "w") as f:
-    #quarter = round((len(file) - 1) * 0.75)
-    tokenized_json = file_convert()
 
-    f.write(json.dumps(tokenized_json,indent=2))
\ No newline at end of file
+def to_dash(passage):
+    """
+    :param passage: Passage
+    :return: [passage with the ground truth as the GPT3.5 and Bert outputs]
+    """
+    passage.llm = {'GPT3.5': list(passage.relations), 'Bert': list(passage.relations)}
+    return [passage]
+
+
+def main():
+    args = arguments("Copies the ground truth of our main JSON format as LLM outputs").parse_args()
+    run(args.files, args.output, [to_dash], args.workers, compact=args.compact)
+
+
+if __name__ == '__main__':
+    main()
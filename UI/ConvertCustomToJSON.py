@@ -1,11 +1,8 @@
-import json
-import time
-import random
-import string
-import numpy as np
-import pandas as pd
-import datasets
-from datasets import Dataset, load_dataset
+import os
+from augment import TRAINING_WEIGHTS, Augmenter, dialog, labels
+from corpus_model import Passage, Relation
+from pipeline import arguments, read_passages, run
+from split import KEYS, Splitter
 """
 This conversion file converts data that is not in JSON format to our main JSON format.
 This should be used on some basis (weekly?) to convert any data that is from old or different labeling methods.
@@ -13,176 +10,137 @@ Given that these data files are NOT in a standard format, each file will probabl
  it's own function for conversion
 which convert these files to the current labeled-data structure (our main JSON format).
 This means that this conversion file is NOT designed to convert LLM outputs back to the main JSON format.
+
+It also makes the training and testing dialogs out of our main JSON format. Run from the UI folder (see pipeline.py
+for the options):
+    python ConvertCustomToJSON.py OSW_labeled_data.json -o Training_data.json --format training
+    python ConvertCustomToJSON.py OSW_labeled_data.json -o Testing_data.json --format testing
+The training dialogs are made from the train split of the passages and the testing dialogs from the test split, so no
+passage is in both (see split.py).
+    python ConvertCustomToJSON.py "Secondary literature data combined file.xlsx" -o combined.json --format excel
 """
 
-f = open("C:/Users/milli/Downloads/OSW_labeled_data.json")
-file = json.load(f)
-ids = set()
+DIALOG_SPLITS = {"train": 0.75, "test": 0.25}  # Passages of the training and testing dialogs
+TESTING_PROMPT = "Given a sentence, label the causal relations that indicate a change in quantity, quality, or sentiment. Direction can only be \"increase\" or \"decrease\". Label the following sentence. \n"
+
+
+SHEET_COLUMNS = [
+    'ID', 'Author', 'Year', 'Title', 'Food System Focus', 'Causal claim',
+
+    'Independent variable (original)', 'Direction (Independent)', 'Dependent variable (original)',
+
+    'Independent variable (coded)', 'Dependent variable (coded)', 'Relationship',
+
+    'Consolidation Term (Independent) new', 'Consolidation Term (Dependent) new'
+]
+SHEET_REQUIRED = ['Causal claim', 'Independent variable (original)', 'Dependent variable (original)',
+                  'Direction (Independent)']
+SENTENCE_KEY = ['ID', 'Causal claim']  # Rows of the same claim of the same paper are relations of one passage
+
+
+def read_sheet(path, cache=True):
+    """
+    Reads the rows of the secondary literature spreadsheet that have a relation. Parsing Excel files is slow, so the
+    rows are cached next to the spreadsheet as Parquet (path + ".parquet", needs pyarrow), and read from the cache as
+    long as it is newer than the spreadsheet.
+    :param path: Path of the spreadsheet
+    :param cache: Whether to read and write the cache
+    :return: DataFrame of SHEET_COLUMNS
+    """
+    import pandas as pd
+    cache_path = path + ".parquet"
+    if cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        try:
+            return pd.read_parquet(cache_path)
+        except ImportError:
+            cache = False  # No Parquet engine, every run parses the spreadsheet
+    df = pd.read_excel(path, usecols=SHEET_COLUMNS)[SHEET_COLUMNS]
+    df = df.dropna(subset=SHEET_REQUIRED)
+    df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+    # Mixed columns (numbers and text in the same column) can't be written as Parquet
+    text = df.columns[df.dtypes == object]
+    df[text] = df[text].astype("string")
+    if cache:
+        try:
+            df.to_parquet(cache_path, index=False)
+        except ImportError:
+            pass
+    return df
+
 
-def kuldeep_excel():
+def kuldeep_excel(path, cache=True):
     # Almost all of this code was taken from Kuldeep's preparing_data.ipynb
     # Some of it was changed as his code goes straight for making it into suitable for Llama2
-    df = pd.read_excel('/mnt/scratch/singhku2/llm_finetuning_data/[2023] Patel, Ronak -- Secondary literature data combined file_20220614.xlsx')
-    df = df[
-        [
-            'ID', 'Author', 'Year', 'Title', 'Food System Focus', 'Causal claim',
-
-            'Independent variable (original)', 'Direction (Independent)', 'Dependent variable (original)',
-
-            'Independent variable (coded)', 'Dependent variable (coded)', 'Relationship',
-
-            'Consolidation Term (Independent) new', 'Consolidation Term (Dependent) new'
-        ]
-    ]
-    df.dropna(subset=['Independent variable (original)', 'Dependent variable (original)', 'Direction (Independent)'],
-              inplace=True)
-    df.to_csv('/llm_finetuning_data/filtered_ronak_patel_data.csv', index=False)
-
-    list_of_outputs = []
-
-    for idx in tqdm(df.sentence_id.unique().tolist()):
-        temp_df = df[df.sentence_id == idx]
-        temp_dict = {
-            #  'sentence_id': idx,
-            'text': temp_df['Causal claim'].to_list()[0],
-            'causal relations': [],
-            'meta_data': {'title':'', 'authors': '', "year": ''}
-        }
-        if not temp_df['Title'].to_list()[0].isna():
-            temp_dict['meta_data']['title'] = temp_df['Title'].to_list()[0]
-        if temp_df['Year'].to_list()[0] > 1000:  # Could probably change this to .isna() as well
-            temp_dict['meta_data']['year'] = temp_df['Year'].to_list()[0]
-        if not temp_df['Author'].to_list()[0].isna():
-            temp_dict['meta_data']['author'] = temp_df['Author'].to_list()[0]
-
-        for _, row in temp_df.iterrows():
-            temp_relation = {'src':'','tgt':'','direction':''}
-            temp_relation['src'] = row['Independent variable (original)'].lower()
-            temp_relation['tgt'] = row['Dependent variable (original)'].lower()
-            temp_relation['direction'] = row['Direction (Independent)'].lower()
-            temp_dict['casual relations'].append(temp_relation)
-
-        list_of_outputs.append(temp_dict)
+    # The rows are grouped in one pass: the first row of every claim gives the passage and its meta data, and the
+    # rows of the claim, sorted together, give its relations.
+    import numpy as np
+    import pandas as pd
+    df = read_sheet(path, cache)
+    if df.empty:
+        return
+    # Rows without an ID are grouped by their claim alone, rather than left out of every group
+    sentence_id = df.groupby(SENTENCE_KEY, sort=False, dropna=False).ngroup().to_numpy()
+    order = np.argsort(sentence_id, kind="stable")
+    firsts = df.iloc[order[np.flatnonzero(np.r_[True, np.diff(sentence_id[order]) != 0])]]
+    ends = np.flatnonzero(np.r_[np.diff(sentence_id[order]) != 0, True]) + 1
+    sources = df['Independent variable (original)'].str.lower().to_numpy()[order].tolist()
+    targets = df['Dependent variable (original)'].str.lower().to_numpy()[order].tolist()
+    directions = df['Direction (Independent)'].str.lower().to_numpy()[order].tolist()
+
+    start = 0
+    for end, text, title, year, authors in zip(ends.tolist(), firsts['Causal claim'].tolist(), firsts['Title'].tolist(),
+                                               firsts['Year'].tolist(), firsts['Author'].tolist()):
+        passage = Passage(text)
+        if not pd.isna(title):
+            passage.meta_data['title'] = title
+        if year > 1000:  # Missing years are NaN, which is never > 1000
+            passage.meta_data['year'] = int(year)
+        if not pd.isna(authors):
+            passage.meta_data['authors'] = authors
+        for relation in zip(sources[start:end], targets[start:end], directions[start:end]):
+            passage.add(Relation(*relation))
+        start = end
 
         # Should now be in our universal JSON format
-
-        with open("Secondary literature data combined.json", 'w') as outfile:
-            json.dump(list_of_outputs)
-
-
-def generate_dialog_id(existing_ids=set()):
-    while True:  # Get current timestamp
-        random_string = ''.join(random.choices(string.ascii_letters + string.digits, k=6))  # Generate a random string
-        dialog_id = f"{random_string}"  # Combine timestamp and random string
-        if dialog_id not in existing_ids:
-            existing_ids.add(dialog_id)
-            return dialog_id
-
-with open("C:/Users/milli/Downloads/Training_data.json","w") as f:
-    quarter = round((len(file) - 1) * 0.75)
-    prompts = []
-    
-    for sentence in file:
-        id = generate_dialog_id(ids)
-        ids.add(id)
-        id2 = generate_dialog_id(ids)
-        ids.add(id2)
-        id3 = generate_dialog_id(ids)
-        ids.add(id3)
-        id4 = generate_dialog_id(ids)
-        ids.add(id4)
-        txt = ""
-        master = {"dialog_id": f"{id}",
-                  "dialog": []}
-        test = {"messages": [{"role": "system",
-                              "content": "Given a sentence, label the causal relations that indicate a change in quantity, quality, or sentiment and provide it as a list of JSON dictionaries, where each dictionary is formatted as {\"src\": \"\", \"tgt\":\"\", \"direction\":\"\"}. Direction can only be \"increase\" or \"decrease\", and \"src\" stands for source while \"tgt\" stands for target. Label for the following sentence. \n"}]}
-        user = {"id": 0, "sender": "participant1",
-                "text": sentence["text"]}
-        assistant = {"id": 1, "sender": "participant2", "text": ""}
-        for relation in sentence["causal relations"]:
-            assistant["text"] += "source " + relation["src"] + " target " + relation["tgt"] + " direction " + relation["direction"] + "  "
-        master["dialog"].append(user)
-        master["dialog"].append(assistant)
-        master["eval_score"] =  10
-        master["profile_match"] = 1
-        prompts.append(master)
-
-
-        master2 = {"dialog_id": f"{id2}",
-                  "dialog": []}
-        user = {"id": 0, "sender": "participant1",
-                "text": sentence["text"]}
-        assistant = {"id": 1, "sender": "participant2", "text": "source source source source source source source source source source source source source source source source source source source source source source source source"}
-        master2["dialog"].append(user)
-        master2["dialog"].append(assistant)
-        master2["eval_score"] = 0
-        master2["profile_match"] = 0
-        prompts.append(master2)
-
-
-        master3 = {"dialog_id": f"{id3}",
-                   "dialog": []}
-        user = {"id": 0, "sender": "participant1",
-                "text": sentence["text"]}
-        assistant = {"id": 1, "sender": "participant2",
-                     "text": "target target target target target target target target target target target target target target target target target target target target target target target target"}
-        master3["dialog"].append(user)
-        master3["dialog"].append(assistant)
-        master3["eval_score"] = 0
-        master3["profile_match"] = 0
-        prompts.append(master3)
-
-        master = {"dialog_id": f"{id4}",
-                   "dialog": []}
-        user = {"id": 0, "sender": "participant1",
-                "text": sentence["text"]}
-        assistant = {"id": 1, "sender": "participant2",
-                     "text": "direction direction direction direction direction direction direction direction"}
-        master["dialog"].append(user)
-        master["dialog"].append(assistant)
-        master["eval_score"] = 0
-        master["profile_match"] = 0
-        prompts.append(master)
-        master = {"dialog_id": f"{id4}",
-                  "dialog": []}
-        user = {"id": 0, "sender": "participant1",
-                "text": sentence["text"]}
-        assistant = {"id": 1, "sender": "participant2",
-                     "text": "source target direction source target direction source target direction source target direction source target direction"}
-        master["dialog"].append(user)
-        master["dialog"].append(assistant)
-        master["eval_score"] = 2
-        master["profile_match"] = 0
-        prompts.append(master)
-    temp = json.dumps(prompts,indent=2)
-    f.write(temp)
-
-with open("C:/Users/milli/Downloads/Testing_data.json","w") as f:
-    quarter = round((len(file)-1)*0.75)
-    prompts = []
-    for sentence in file[quarter:]:
-        id = generate_dialog_id(ids)
-        ids.add(id)
-        master = {"dialog_id": f"{id}",
-                  "dialog": []}
-        test = {"messages": [{"role": "system",
-                              "content": "Given a sentence, label the causal relations that indicate a change in quantity, quality, or sentiment and provide it as a list of JSON dictionaries, where each dictionary is formatted as {\"src\": \"\", \"tgt\":\"\", \"direction\":\"\"}. Direction can only be \"increase\" or \"decrease\", and \"src\" stands for source while \"tgt\" stands for target."}]}
-        user = {"id":0, "sender":"participant1","text":"Given a sentence, label the causal relations that indicate a change in quantity, quality, or sentiment. Direction can only be \"increase\" or \"decrease\". Label the following sentence. \n"+sentence["text"]}
-        assistant = {"id":1,"sender":"participant2","text": ""}
-        if sentence["causal relations"]:
-            pass
-        for relation in sentence["causal relations"]:
-            assistant["text"] += "source " + relation["src"] + " target " + relation["tgt"] + " direction " + relation["direction"] + "  "
-        master["dialog"].append(user)
-        master["dialog"].append(assistant)
-        master["eval_score"] =  10
-        #master["profile_match"]: 2
-        test['messages'].append(user)
-        test['messages'].append(assistant)
-        temp = json.dumps(test)
-        prompts.append(master)
-    temp = json.dumps(prompts,indent=2)
-    f.write(temp)
+        yield passage
+
+
+# The dialog with the labels of the sentence, and four dialogs with bad answers (see augment.py for more)
+to_training_dialogs = Augmenter(TRAINING_WEIGHTS)
+
+
+def to_testing_dialog(sentence):
+    """
+    :param sentence: Passage
+    :return: [dialog with the prompt and the labels of the sentence]
+    """
+    return [dialog(TESTING_PROMPT + sentence.text, labels(sentence.relations), 10)]
+
+
+def main():
+    parser = arguments("Converts other formats to our main JSON format, and our main JSON format to dialogs")
+    parser.add_argument("--format", choices=("training", "testing", "excel"), default="training",
+                        help="training or testing dialogs from our main JSON format, or our main JSON format from "
+                             "the secondary literature spreadsheet")
+    parser.add_argument("--no-cache", action="store_true", help="Parse the spreadsheet again instead of its cache")
+    parser.add_argument("--split-by", choices=KEYS, default="text",
+                        help="Split the training and testing passages by text, or by paper title")
+    args = parser.parse_args()
+    splitter = Splitter(DIALOG_SPLITS, args.split_by)
+    if args.format == "excel":
+        run(args.files, args.output, [],
+            passages=(passage for path in args.files for passage in kuldeep_excel(path, not args.no_cache)),
+            compact=args.compact)
+    elif args.format == "training":
+        run(args.files, args.output, [to_training_dialogs], args.workers,
+            passages=splitter.select(read_passages(args.files), "train"), compact=args.compact)
+    else:
+        run(args.files, args.output, [to_testing_dialog], args.workers,
+            passages=splitter.select(read_passages(args.files), "test"), compact=args.compact)
+
+
+if __name__ == '__main__':
+    main()
 
 """""
 
@@ -4,12 +4,24 @@ from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 import json
-import math
 import base64
 from dash_selectable import DashSelectable
 import io
+import os
 from striprtf.striprtf import rtf_to_text
 from datetime import date
+import uuid
+from corpus_model import Corpus
+from corpus_io import strip_compression, write_json_array
+from corpus_store import CorpusStore, new_sentence
+from state_backend import backend_from_env
+from instrumentation import instrument_from_env
+from matching import matcher_from_env
+from arrow_corpus import arrow_support, is_arrow_stream
+from ingest import start_arrow_ingest, start_ingest, start_job, open_server_file, progress_text
+from pdf_ingest import PdfBatch, pdf_support
+from segmenter import default_segmenter
+from upload_cache import UploadCache, content_key
 """
 Functionality ideas:
 - Could write "helper" functions for callbacks to increase readability of callbacks
@@ -17,7 +29,6 @@ Functionality ideas:
 -- First goal though is getting the information and tables created, then they can be implemented wherever is ideal
 
 Functionality to be added:
-- Ability to read in PDF files and convert them to txt, and process them that way
 - Undo button
 - Ability to manually compare LLM output to ground truth labels and mark them as correct or incorrect
 
@@ -27,15 +38,11 @@ Functionality to be updated:
 Unexpected (or frustrating) Behavior:
 - Clicking anywhere on the same "y" as the upload button opens the file menu
 - After saving a json, the input sentences are removed and the program is basically reset
--- However, even though it is reset, you cannot upload the same file consecutively.
+-- The labeled corpus is still in the state database (twosix_state.db by default), see export_annotations.py
 -- You CAN upload 1 paper, then upload a second paper, and they will combine in the storage.
---- This problem likely occurs based on how dash is handling uploads, and may not be fixable. 
---- Also, this issue may not be relevant as why would you upload the same thing multiple times consecutively.
---- This issue is probably due to the filename not changing within the app, thus not invoking the callback.
+-- The upload is cleared after every upload so the same file can be uploaded again, in which case it is not parsed
+-- again but taken from the upload cache (see upload_cache.py)
 Errors in Functionality:
-- Weird infrequent error where next/back count increases by an additional 1 every live update from dash
--- There should be no live update for users as this occurs when the code or css is edited
--- A fix could be to put the JS code into its own asset file, and maybe it won't dupe the event reader
 - UI is best on and designed for a 1920x1080 monitor, and needs a way to scale to other sizes
 """
 
@@ -67,11 +74,28 @@ inverse_in = html.Div(id="inverse-div", hidden=True,children=[
     dbc.Button("Cancel", color="danger",id='cancel-inverse',n_clicks=0),
 ])
 
+# Keyboard shortcuts, KeyboardEvent.key to the id of the button it clicks (see assets/keyboard.js)
+KEYMAP = {
+    "ArrowLeft": "back-btn",
+    "ArrowRight": "next-btn",
+    "ArrowUp": "increase-btn",
+    "+": "increase-btn",
+    "ArrowDown": "decrease-btn",
+    "-": "decrease-btn",
+    "_": "decrease-btn",  # Shift and -
+    "s": "source-btn",
+    "t": "target-btn",
+    "S": "save-btn",  # Shift and s
+}
+
 app = dash.Dash(__name__,external_stylesheets=[dbc.themes.CYBORG], meta_tags=[
         {"name": "viewport", "content": "width=device-width, initial-scale=1"},
     ],)
+server = app.server  # WSGI application, served by serve.py in production
+# Latency and payload size of every callback, served on /metrics, see instrumentation.py
+callback_metrics = instrument_from_env(app)
 
-app.layout = html.Div([
+main_layout = html.Div([
 
     html.Div([
         metadata_prompt,
@@ -82,7 +106,9 @@ app.layout = html.Div([
             children=[html.H5(id="sentence",className="d-grid gap-2 d-md-flex justify-content-md-center"), html.P(id="output")],
         ),],),
         html.Br(),
-        html.P(id="output2"), # output for some key functions that don't actually need an output, but Dash needs an output
+        html.P(id="output2"), # Index of the current sentence
+        # Keyboard shortcuts, read by assets/keyboard.js
+        html.Div(id="keymap", hidden=True, **{"data-keymap": json.dumps(KEYMAP)}),
         html.Div([
             dbc.Row([
                 dbc.Col([
@@ -217,6 +243,7 @@ app.layout = html.Div([
             dbc.Col([]),
             dbc.Col([dcc.Upload(
                 id='upload-data',
+                multiple=True,
                 children=html.Div([
                     dbc.Button('Select Files')
             ]),),
@@ -225,11 +252,24 @@ app.layout = html.Div([
         ]),
         #dbc.Button('Modify and add new sentence', outline=True, color="info", id="inverse-btn"),
         html.Br(),
+        dbc.Row([
+            dbc.Col([]),
+            dbc.Col([]),
+            dbc.Col([dbc.Input(id='server-path', placeholder='.json or .jsonl file on the server', type='text'),
+                     dbc.Button('Load from Server', id='server-load-btn', n_clicks=0)],
+                    className="d-grid gap-2 d-md-flex justify-content-end"),
+        ]),
+        html.Div(id='ingest-progress'),
+        dcc.Interval(id='ingest-interval', interval=500, disabled=True),
         html.Br(),
 
         html.Br(),
         html.Br(),
-        html.Div(id="output-data-upload"),
+        html.Div(id="output-data-upload", children=[
+            html.Div(id="sentence-window"),
+            dbc.Pagination(id="sentence-page", max_value=1, active_page=1, fully_expanded=False,
+                           first_last=True, previous_next=True),
+        ]),
         dbc.Modal(
             [
                 dbc.ModalHeader(dbc.ModalTitle("LLM Output Comparison")),
@@ -259,22 +299,39 @@ app.layout = html.Div([
             size="xl",
             is_open=False,
         ),
-        dcc.Store(id='input-sentences', data=["Please Insert RTF or JSON File"], storage_type='local'),
 
-        dcc.Store(id='all-relation-store', data=[], storage_type='local'),
-        # CHANGE BACK TO SESSION OR LOCAL FOR RESEARCHER RELEASE
+        # The corpus itself is kept on the server (see corpus_store.py), the browser only receives its revision
+        dcc.Store(id='corpus-revision', data=0, storage_type='memory'),
 
+        # Navigation and labeling happen in the browser (see assets/navigation.js). The cursor is the 1 based index of
+        # the current sentence, and sentence-cache the window of sentences around it sent by load_window
+        dcc.Store(id='cursor', data=0, storage_type='memory'),
+        dcc.Store(id='sentence-cache', storage_type='memory'),
+        dcc.Store(id='window-request', storage_type='memory'),
+        dcc.Store(id='pending-relation', storage_type='memory'),
         dcc.Store(id='current-relation-store',data={"src":"","tgt":"","direction":""},storage_type='memory'),
         dcc.Store(id='meta-data',data={"title": "", "authors": "", "year": ""},storage_type='memory'),
-        dcc.Store(id='llm-metrics',data={}, storage_type='local'),
-        dcc.Store(id='llm-scores',data={}, storage_type='local'),
-        dcc.Store(id='llm-outputs',data={}, storage_type='local'),
         #dcc.Store(id='index-store',data=0, storage_type='memory'),
         dcc.Download(id="download-json"),
     ],
     style={'overflow-x':'hidden'})
 ])
 
+# Every edit is written through to the state backend (SQLite by default), which worker processes share,
+# see state_backend.py
+corpus = CorpusStore(backend_from_env(), matcher_from_env())
+
+
+def serve_layout():
+    """
+    Dash calls this on every page load. The generated session id is only used on the first visit, afterwards the
+    dcc.Store replaces it with the id saved in localStorage, so refreshing the page keeps the same corpus.
+    """
+    return html.Div([dcc.Store(id='session-id', data=uuid.uuid4().hex, storage_type='local'), main_layout])
+
+
+app.layout = serve_layout
+
 
 @app.callback(Output("output", "children"),
               [Input("dash-selectable", "selectedValue")])
@@ -286,213 +343,136 @@ def display_output(value):
     return "Currently selected: {}".format(text)
 
 
+# Number of sentences rendered by the sentence browser at a time
+WINDOW_SIZE = 10
+# Number of sentences sent to the browser at a time, navigation within them needs no server call
+CACHE_SIZE = 5 * WINDOW_SIZE
+
+
 @app.callback(
-    [Output('all-relation-store', 'data',allow_duplicate=True),
-     Output('sentence','children'),
-     Output('current-relation-store', 'data',allow_duplicate=True),
-     Output('next-btn', 'n_clicks',allow_duplicate=True),
-     Output('back-btn', 'n_clicks',allow_duplicate=True)],
-    [Input('next-btn', 'n_clicks'),
-     Input('back-btn', 'n_clicks')],
-    [State('sentence', 'children'),
-     State('all-relation-store', 'data'),
-     State('current-relation-store', 'data'),
-     State('input-sentences','data'),],
-    prevent_initial_call='initial_duplicate',
+    Output('sentence-cache', 'data'),
+    [Input('corpus-revision', 'data'),
+     Input('window-request', 'data')],
+    [State('sentence-cache', 'data'),
+     State('session-id', 'data')],
 )
-def next_sentence(n_clicks, back_clicks, current_text, all_data,curr_relation,sentences):
-    current_sentence_index = int(n_clicks) - int(back_clicks)
-    button_id = ctx.triggered_id if not None else False
-    if len(sentences) == 1:  # Prevents moving the amount of clicks, and thus the index of sentences
-        # , when there is no file [On start, and after download]
-        return all_data, "Please Insert RTF or JSON File", curr_relation, 0, 0
-    if current_sentence_index < 0: # if we've gone negative, we can just reset the clicks and return default sentence
-        return all_data, "Please Insert RTF or JSON File", curr_relation, 0, 0
-    if len(all_data) <= current_sentence_index: # This case is used when arrow keys are used instead of buttons
-        # At max array size
-        if curr_relation["src"] == '' or curr_relation["tgt"] == '':
-            return dash.no_update, all_data[-1]["text"], curr_relation, len(all_data), 0
-        all_data = saving_relation(-1, all_data, curr_relation)
-        curr_relation = {'src': "", 'tgt': '', 'direction': ''}
-        return all_data, all_data[-1]["text"], curr_relation, len(all_data), 0
-    if current_sentence_index == 0:
-        return all_data, sentences[current_sentence_index], curr_relation, 0, 0
-    elif current_sentence_index == 1:
-        return all_data, all_data[current_sentence_index-1]["text"], curr_relation, n_clicks, back_clicks
-    elif current_sentence_index < len(sentences):
-        # Handling case where current relation is not filled out enough to be usable
-        if button_id == "back-btn":
-            index = current_sentence_index
-        else:
-            index = current_sentence_index - 2  # -1 because of starter sentence,-1 again because next button makes index + 1
-            # of where we are saving, so -2
-        all_data = saving_relation(index,all_data,curr_relation)
-        curr_relation = {'src':"",'tgt':'','direction':''}
-        return all_data, all_data[current_sentence_index-1]["text"], curr_relation, n_clicks, back_clicks
-    elif all_data[-1]["text"] == current_text:
-        # This case is hit when the user hits the final sentence of a paper, and hits next 1 additional time
-        # This makes sure that the last sentence is saved.
-        # The following code in this elif could be made into a function as it is now repeated.
-        all_data = saving_relation(-1,all_data,curr_relation)
-        curr_relation = {'src': "", 'tgt': '', 'direction': ''}
-        if button_id == "back_btn":
-            return all_data, all_data[-2]["text"], curr_relation, n_clicks, back_clicks
-        else:
-            return all_data, all_data[-1]["text"], curr_relation, n_clicks-1, back_clicks
+def load_window(revision, request, cache, session):
+    """
+    Sends the browser the window of sentences it navigates in. The window starts where the browser asked for it,
+    and is kept in place when the corpus changes.
+    :param revision: Corpus revision
+    :param request: {"start": 0 based index} sent by assets/navigation.js when the cursor leaves the window
+    :param cache: Window currently held by the browser
+    :param session: Session id
+    :return: {"revision", "start", "length", "page_size", "sentences": [{"text", "causal relations"}]}
+    """
+    length = corpus.length(session)
+    if ctx.triggered_id == 'window-request' and request:
+        start = request["start"]
+    elif cache:
+        start = cache["start"]
     else:
-        return all_data, current_text, curr_relation, n_clicks, back_clicks
-
-# Callback for increase, decrease, source,target, save, and reset in the following
+        start = 0
+    # Windows start on a page of the sentence browser, and always hold the last sentence if start is past it
+    start = max(0, min(start, (length - 1) // WINDOW_SIZE * WINDOW_SIZE)) // WINDOW_SIZE * WINDOW_SIZE
+    return {"revision": corpus.revision(session), "start": start, "length": length, "page_size": WINDOW_SIZE,
+            "sentences": corpus.window(session, start, start + CACHE_SIZE)}
 
 
-@app.callback(
-    [Output('my-direction', 'children'),
-     Output('my-source', 'children'),
-     Output('my-target', 'children'),
-     Output("current-relation-store", "data")],
-    [Input('increase-btn', 'n_clicks'),
+app.clientside_callback(
+    ClientsideFunction(namespace='navigation', function_name='step'),
+    [Output('cursor', 'data'),
+     Output('current-relation-store', 'data'),
+     Output('pending-relation', 'data'),
+     Output('window-request', 'data')],
+    [Input('next-btn', 'n_clicks'),
+     Input('back-btn', 'n_clicks'),
+     Input('save-btn', 'n_clicks'),
+     Input('reset-btn', 'n_clicks'),
+     Input('increase-btn', 'n_clicks'),
      Input('decrease-btn', 'n_clicks'),
      Input('source-btn', 'n_clicks'),
      Input('target-btn', 'n_clicks'),
-     Input('next-btn', 'n_clicks'),
-     Input('reset-btn', 'n_clicks')],
-    [State("dash-selectable", "selectedValue"),
-     State("current-relation-store", "data"),
-     State("inverse-div",'hidden')
-     ],
+     Input('sentence-cache', 'data')],
+    [State('cursor', 'data'),
+     State('current-relation-store', 'data'),
+     State('dash-selectable', 'selectedValue'),
+     State('inverse-div', 'hidden')],
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='navigation', function_name='render'),
+    [Output('sentence', 'children'),
+     Output('datatable-current', 'data'),
+     Output('next-data', 'children'),
+     Output('prev-data', 'children'),
+     Output('output2', 'children')],
+    [Input('cursor', 'data'),
+     Input('sentence-cache', 'data')],
 )
-def allLabel(inc, dec, src, tgt, next, reset, selected_data, relation, modifier_block):
-    """
-    Function that handles all relation button data
-    :param inc: Increase button
-    :param dec: Decrease button
-    :param src: Source button
-    :param tgt: Target button
-    :param next: Next button - allows next button to access function
-    :param reset: Reset button - allows reset button to access function
-    :param selected_data: User-selected data
-    :param relation: Relation data storage
-    :return: [Direction text, ]
-    """
-    button_id = ctx.triggered_id if not None else False
-    direcText = f"Direction: "
-    srcText = f"Source: "
-    tgtText = f"Target: "
-    if button_id == "reset-btn":
-        relation = {'src': "", 'tgt': '', 'direction': ''}
-        return direcText, srcText, tgtText, relation
-    if not modifier_block: # not modifier_block because this is visibility, when it is visible, we do not allow
-        return dash.no_update, dash.no_update,dash.no_update, dash.no_update
-    if button_id == "increase-btn":
-        relation["direction"] = "Increase"
-        return f"Direction: Increase",dash.no_update, dash.no_update,relation
-    elif button_id == "decrease-btn":
-        relation["direction"] = "Decrease"
-        return f"Direction: Decrease",dash.no_update, dash.no_update,relation
-    elif button_id == "source-btn":
-        relation["src"] = selected_data
-        return dash.no_update, f"Source: {selected_data}", dash.no_update,relation
-    elif button_id == "target-btn":
-        relation["tgt"] = selected_data
-        return dash.no_update, dash.no_update, f"Target: {selected_data}",relation
-    else:  # This else corresponds to initial call (program start) and when the next button is hit
-        # Have not tried multiple changes to one output from one button,
-        # and it probably isn't a good idea, so don't change this
-        return direcText,srcText,tgtText,relation
 
+app.clientside_callback(
+    ClientsideFunction(namespace='navigation', function_name='relation'),
+    [Output('my-direction', 'children'),
+     Output('my-source', 'children'),
+     Output('my-target', 'children')],
+    Input('current-relation-store', 'data'),
+)
 
-@app.callback(
-    [Output('all-relation-store','data',allow_duplicate=True),
-     Output('current-relation-store','data',allow_duplicate=True)],
-    [Input('save-btn', 'n_clicks')],
-    [State('current-relation-store','data'),
-     State('all-relation-store', 'data'),
-     State('next-btn', 'n_clicks'),
-     State('back-btn', 'n_clicks'),
-     State("inverse-div",'hidden')],
+app.clientside_callback(
+    ClientsideFunction(namespace='navigation', function_name='page'),
+    [Output('sentence-window', 'children'),
+     Output('sentence-page', 'max_value'),
+     Output('sentence-page', 'active_page'),
+     Output('window-request', 'data', allow_duplicate=True)],
+    [Input('cursor', 'data'),
+     Input('sentence-cache', 'data'),
+     Input('sentence-page', 'active_page')],
     prevent_initial_call=True,
 )
-def save_relation(n_clicks,curr_relation,all_data,for_index,back_index, modifier_block):
-    index = int(for_index)-int(back_index)
-    if not modifier_block: # not modifier_block because this is visibility, when it is visible, we do not allow
-       return dash.no_update, dash.no_update
-    if index <= 0:
-        return all_data,dash.no_update
-    all_data = saving_relation(index-1,all_data,curr_relation)
-    return all_data,dash.no_update
-
-
-def saving_relation(index,all_data,curr_relation):
-    if curr_relation["src"] == '' or curr_relation["tgt"] == '':
-        pass
-    else:
-        if len(all_data[index]["causal relations"]):
-            check = False
-            for relation in all_data[index]["causal relations"]:
-                if relation == curr_relation:
-                    check = True
-            if not check:  # checking if it's a duplicate
-                all_data[index]["causal relations"].append(curr_relation)
-        else:
-            all_data[index]["causal relations"].append(curr_relation)
-    return all_data
 
 
 @app.callback(
-    [Output('datatable-current', 'data'),
-     Output('next-data', 'children'),
-     Output('prev-data', 'children')],
-    Input('all-relation-store', 'data'),
-    [State('next-btn', 'n_clicks'),
-     State('back-btn', 'n_clicks'),
-     State('datatable-current', 'data'),
-     State('datatable-current', 'columns')]
+    Output('corpus-revision', 'data', allow_duplicate=True),
+    Input('pending-relation', 'data'),
+    State('session-id', 'data'),
+    prevent_initial_call=True,
 )
-def currentStorage(data, for_index, back_index, rows,columns):
-    if not data:  # If there is no input file
-        return [], dash.no_update, dash.no_update
-    index = int(for_index)-int(back_index)
-    if index <= 0:  # If we're at the starter sentence
-        return dash.no_update, dash.no_update, dash.no_update
-    elif index == 1:  # If at first sentence of paper, there is no previous sentence
-        rows = []
-        for relation in data[index-1]['causal relations']:
-            rows.append({c['id']: relation[val] for c, val in zip(columns,relation)})
-        if len(data)>1:
-            return rows, f"Next Passage: {data[index]['text']}", "Previous Passage: []"
-        else:
-            return rows, f"Next Passage: []", "Previous Passage: []"
-    elif len(data) <= index:  # If we're at EOF, there is no next sentence
-        rows = []
-        index = len(data)
-        for relation in data[index - 1]['causal relations']:
-            rows.append({c['id']: relation[val] for c, val in zip(columns, relation)})
-        return rows, f"Next Passage: []", f"Previous Passage: {data[index - 2]['text']}"
-    else:
-        rows = []
-        for relation in data[index - 1]['causal relations']:
-            rows.append({c['id']: relation[val] for c, val in zip(columns, relation)})
-        return rows, f"Next Passage: {data[index]['text']}", f"Previous Passage: {data[index - 2]['text']}"
+def save_relation(pending, session):
+    """
+    Saves a completed relation, sent by the browser when the user saves it or leaves its sentence
+    :param pending: {"index": 0 based sentence index, "relation": relation dictionary}
+    :param session: Session id
+    :return: Corpus revision
+    """
+    if not pending or not 0 <= pending["index"] < corpus.length(session):
+        raise PreventUpdate
+    if not corpus.add_relation(session, pending["index"], pending["relation"]):
+        raise PreventUpdate  # Duplicate relation
+    return corpus.revision(session)
 
 
 @app.callback(
-    [Output('all-relation-store', 'data', allow_duplicate=True),
-     Output('datatable-current', 'data', allow_duplicate=True)],
-    Input('datatable-current', 'data'),
-    [State('all-relation-store', 'data'),
-     State('next-btn', 'n_clicks'),
-     State('back-btn', 'n_clicks'),],
+    Output('corpus-revision', 'data', allow_duplicate=True),
+    Input('datatable-current', 'data_timestamp'),
+    [State('datatable-current', 'data'),
+     State('cursor', 'data'),
+     State('session-id', 'data')],
     prevent_initial_call=True
 )
-def updating_json(rows,data,next_index,back_index):
+def updating_json(timestamp,rows,index,session):
     """
     This function updates the JSON after the editable dash datatable has been changed.
-    :param value:
-    :return:
+    data_timestamp only changes on user edits, not when the table is filled by assets/navigation.js.
+    :param timestamp: Time of the edit
+    :param rows: Table rows
+    :param index: Cursor
+    :param session: Session id
+    :return: Corpus revision
     """
-    if len(data)==0:
+    if corpus.length(session)==0 or not index:
         raise PreventUpdate
-    index = int(next_index)-int(back_index)
+    old_relations = corpus.relations(session, index-1)
     conv = []
     for row, i in zip(rows,range(len(rows))):  # row is a singular relation
         temp = {}
@@ -504,210 +484,263 @@ def updating_json(rows,data,next_index,back_index):
         if temp["direction"] == "-":
             temp["direction"] = 'decrease'
         if temp["direction"] != "increase" and temp["direction"] != "decrease":
-            temp["direction"] = data[index-1]['causal relations'][i]['direction']
+            temp["direction"] = old_relations[i]['direction']
         if temp["src"] == "":  # if any parameters are empty, restore that part of the relation
-            temp["src"] = data[index - 1]['causal relations'][i]['src']
+            temp["src"] = old_relations[i]['src']
         if temp["tgt"] == "":
-            temp["tgt"] = data[index - 1]['causal relations'][i]['tgt']
+            temp["tgt"] = old_relations[i]['tgt']
         conv.append(temp)
-
-    data[index-1]['causal relations'] = conv
-    return data, rows
+    if conv == old_relations:
+        raise PreventUpdate
+    return corpus.set_relations(session, index-1, conv)
 
 @app.callback(
     [Output("download-json", "data"),
-     Output('all-relation-store','data'),
-     Output('input-sentences','data', allow_duplicate=True),
-     Output('next-btn','n_clicks'),
-     Output('llm-metrics','data', allow_duplicate=True),
-     Output('llm-scores','data', allow_duplicate=True),
+     Output('corpus-revision','data'),
      ],
     Input("download-btn", "n_clicks"),
-    [State('all-relation-store','data'),
-     State('next-btn','n_clicks'),
-     State('input-sentences','data'),
-     State('upload-data', 'filename'),
+    [State('upload-data', 'filename'),
+     State('session-id', 'data'),
      ],
     prevent_initial_call=True,
 )
-def download(n_clicks,data,curr_sen_index, inp_sentences,file):
+def download(n_clicks,file,session):
     # In current implementation, only required variables are the input (download-btn)
-    # and the state of all-relation-store
+    # and the session's corpus
     """
 
     :param n_clicks:
-    :param data:
-    :param curr_sen_index:
-    :param inp_sentences:
-    :return: json, relational storage, input_sentences, next btn n_clicks
+    :param file: Uploaded file names
+    :param session:
+    :return: json, corpus revision
     """
-    # WHEN YOU HIT SAVE, YOU ARE DONE WITH THAT SESSION, ALL REMAINING SENTENCES ARE REMOVED, AND THE PROGRAM IS
-    # BASICALLY RESET
-    if not data:
-        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-    fileData = json.dumps(data, indent=2)
+    # WHEN YOU HIT SAVE, YOU ARE DONE WITH THAT CORPUS, ALL REMAINING SENTENCES ARE REMOVED, AND THE PROGRAM IS
+    # BASICALLY RESET. Every edit is already saved in the state backend, which keeps the corpus after the reset,
+    # see export_annotations.py to export it again
+    if not corpus.length(session):
+        return dash.no_update, dash.no_update
+    # Compact, one sentence per line, written record by record (see corpus_io.py)
+    buffer = io.BytesIO()
+    write_json_array(corpus.export(session), buffer, compact=True)
+    fileData = buffer.getvalue().decode("utf-8")
+    revision = corpus.clear(session)
     today = date.today()
+    if isinstance(file, list):  # Several files can be uploaded at once, the download is named after the first
+        file = file[0]
     if file is None:
-        return dict(content=fileData, filename=f"Labeled_Data-{today}.json"), [], ["Please Insert RTF or JSON File"], 0, {}, {}
-    file = file.replace(".rtf",f"-{today}.json")
-    return dict(content=fileData, filename=file), [], ["Please Insert RTF or JSON File"], 0, {}, {}
+        return dict(content=fileData, filename=f"Labeled_Data-{today}.json"), revision
+    # paper.pdf, corpus.jsonl.gz, ... are downloaded as paper-<date>.json, corpus-<date>.json
+    file = os.path.splitext(strip_compression(file))[0] + f"-{today}.json"
+    return dict(content=fileData, filename=file), revision
 
 
-# This callback also activates on download, and updates the text on screen.
+# Parsed uploads by content hash, shared by every session
+upload_cache = UploadCache()
 
 
-@app.callback(
-    Output('output-data-upload', 'children', allow_duplicate=True),
-    Input('input-sentences','data'),
-    prevent_initial_call='initial_duplicate',
-)
-def refresh(inp_sentences):
-    return f"Current Sentences: {inp_sentences}" + f" Length: {len(inp_sentences)}"
+def parse_json_upload(decoded):
+    """
+    Parses an uploaded JSON file in our main JSON format, LLM outputs included
+    :param decoded: File content
+    :return: List of passages
+    """
+    # Scores and LLM comparison tables are kept by the corpus store, which updates them on every ground truth edit
+    # (see scoring.py and alignment.py)
+    return Corpus.loads(decoded).passages
+
 
+def parse_rtf_upload(decoded):
+    temp = io.StringIO(decoded.decode('utf-8')).getvalue()
+    text = rtf_to_text(temp)
+    # See segmenter.py for the abbreviation lexicon
+    return [new_sentence(sentence) for sentence in default_segmenter.sentences(text)]
 
-def abbreviation_handler(sentences):
-    # File handler helper function
-    sentences_to_add = []
-    temp = sentences[0]
-    for i in range(len(sentences) - 1):
-        if sentences[i] == '':
+
+def parse_txt_upload(decoded):
+    data = []
+    text = io.StringIO(decoded.decode('utf-8')).getvalue()
+    newline_split = text.split("\n")
+    for sentence in newline_split:
+        if sentence == '':
             continue
-        if not (sentences[i + 1].strip())[0].isupper():
-            temp = temp + '. ' + sentences[i + 1]
-        else:
-            sentences_to_add.append(temp)
-            temp = sentences[i + 1]
-    sentences_to_add.append(temp)
-    return sentences_to_add
+        sentence = sentence.replace("\r", "")
+        data.append(new_sentence(sentence))
+    return data
+
+
+def cached_parse(parse, decoded, extension):
+    """
+    Parses an upload, or returns the cached result if the same content was uploaded before
+    :param parse: Parser of the file type
+    :param decoded: File content
+    :param extension: File type, part of the key as the same bytes are parsed differently as RTF and as TXT
+    :return: (parsed upload, whether it came from the cache)
+    """
+    key = content_key(decoded) + extension
+    parsed = upload_cache.get(key)
+    if parsed is not None:
+        return parsed, True
+    parsed = parse(decoded)
+    upload_cache.put(key, parsed, len(decoded))
+    return parsed, False
 
 
-@app.callback([Output('input-sentences','data'),
-               Output('all-relation-store','data', allow_duplicate=True),
+@app.callback([Output('corpus-revision','data', allow_duplicate=True),
                Output(metadata_prompt,'hidden'),
-               Output('llm-metrics','data'),
-               Output('llm-scores','data'),
-               Output('llm-outputs','data')],
+               Output('ingest-interval','disabled', allow_duplicate=True),
+               Output('ingest-progress', 'children', allow_duplicate=True),
+               Output('upload-data', 'contents')],
               Input('upload-data', 'contents'),
               [State('upload-data', 'filename'),
-               State('input-sentences','data'),
-               State('all-relation-store','data'),
-               State('llm-metrics','data'),
-               State('llm-scores','data'),
-               State('llm-outputs','data')],
+               State('session-id', 'data')],
               prevent_initial_call="initial_duplicate"
 )
-def upload(list_of_contents, list_of_names,inp_sentences,data,LLM_metrics,LLM_scores, LLM_outputs):
+def upload(list_of_contents, list_of_names, session):
+    """
+    Adds the uploaded files to the corpus. JSON, RTF and TXT files are parsed here, while JSONL and PDF files are
+    streamed into the corpus by a background job (see ingest.py and pdf_ingest.py). Parsed JSON, RTF, TXT and PDF
+    files are cached by content, so uploading the same file again (under any name) skips parsing.
+    The upload contents are cleared afterwards, otherwise Dash would not fire this callback for the same file twice.
+    :param list_of_contents: Base64 contents of the uploaded files
+    :param list_of_names: Names of the uploaded files
+    :param session: Session id
+    :return: [corpus revision, metadata prompt hidden, interval disabled, progress text, upload contents]
+    """
     if list_of_contents is None:
-        if len(inp_sentences) > 1:
-            return inp_sentences, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-    content_type, content_string = list_of_contents.split(',')
-    decoded = base64.b64decode(content_string)
-    if ".json" in list_of_names:
-        data = json.loads(decoded)
-        for sentence in data:
-            inp_sentences.append(sentence["text"])
-        if 'LLM' in data[0].keys():
-            for LLM in data[0]['LLM']:
-                LLM_scores[LLM] = {"TP":0, "FP":0, "TN":0, "FN": 0}
-                LLM_metrics[LLM] = {}
-            for sentence in data:
-                for LLM in sentence['LLM'].keys():  # LLM is a list of relations
-                    if LLM in LLM_outputs.keys():
-                        LLM_outputs[LLM].append(sentence['LLM'][LLM])
-                    else:
-                        LLM_outputs[LLM] = sentence['LLM'][LLM]
-                    for relation in sentence['causal relations']:
-                        if relation not in sentence['LLM'][LLM]:
-                            LLM_scores[LLM]['FN'] += 1
-                        else:
-                            LLM_scores[LLM]['TP'] += 1
-                    if len(LLM) == 0:
-                        if len(sentence['causal relations']) == 0:
-                            LLM_scores[LLM]['TN'] += 1
-                    for relation in sentence['LLM'][LLM]:
-                        if relation not in sentence['causal relations']:
-                            LLM_scores[LLM]['FP'] += 1
-                        # Don't need an else here, as that'd be a true positive and is already added
-            for LLM in LLM_scores:
-                LLM_metrics[LLM]['precision'] = LLM_scores[LLM]['TP'] / (LLM_scores[LLM]['TP'] + LLM_scores[LLM]['FP'])
-                LLM_metrics[LLM]['recall'] = LLM_scores[LLM]['TP'] / (LLM_scores[LLM]['TP'] + LLM_scores[LLM]['FN'])
-                LLM_metrics[LLM]['F1'] = (2 * LLM_metrics[LLM]['precision'] * LLM_metrics[LLM]['recall']) / (LLM_metrics[LLM]['precision'] + LLM_metrics[LLM]['recall'])
-                LLM_metrics[LLM]['accuracy'] = ((LLM_scores[LLM]['TP'] + LLM_scores[LLM]['TN']) /
-                                                (LLM_scores[LLM]['TP'] + LLM_scores[LLM]['TN'] + LLM_scores[LLM]['FP'] + LLM_scores[LLM]['FN']))
-            return inp_sentences, data, dash.no_update, LLM_metrics, LLM_scores, LLM_outputs
-        return inp_sentences, data, dash.no_update, dash.no_update, dash.no_update, dash.no_update
-    if ".rtf" in list_of_names:
-        temp = io.StringIO(decoded.decode('utf-8')).getvalue()
-        text = rtf_to_text(temp)
-        period_split = text.split(". ")
-        sentences = []
-        for sentence in period_split:
-            temp = sentence.split(".\n")
-            if type(temp) is str:
-                sentences.append(sentence)
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    data = []
+    pdfs = []
+    pdf_keys = []
+    cached = []
+    metadata_hidden = dash.no_update
+    interval_disabled = dash.no_update
+    message = dash.no_update
+    for contents, name in zip(list_of_contents, list_of_names):
+        content_type, content_string = contents.split(',')
+        decoded = base64.b64decode(content_string)
+        hit = False
+        lowered = name.lower()  # Paper.PDF is a PDF too
+        if lowered.endswith(".pdf"):
+            key = content_key(decoded) + ".pdf"
+            parsed = upload_cache.get(key)
+            hit = parsed is not None
+            if hit:
+                data += parsed
             else:
-                for sen in temp:
-                    if sen == "":
-                        continue
-                    sentences.append(sen)
-        sentences = abbreviation_handler(sentences)
-        for sentence in sentences:
-            if sentence == '':
-                continue
-            sentence = sentence.replace("\n", "")
-            sentence = sentence + "."
-            inp_sentences.append(sentence)
-            template = {"text": sentence,
-                        "causal relations": [],
-                        "meta_data": {"title": "", "authors": "", "year": ""}}
-            data.append(template)
-    if ".txt" in list_of_names:
-        text = io.StringIO(decoded.decode('utf-8')).getvalue()
-        newline_split = text.split("\n")
-        for sentence in newline_split:
-            if sentence == '':
-                continue
-            sentence = sentence.replace("\r", "")
-            inp_sentences.append(sentence)
-            template = {"text": sentence,
-                        "causal relations": [],
-                        "meta_data": {"title": "", "authors": "", "year": ""}}
-            data.append(template)
-    return inp_sentences, data, False, dash.no_update, dash.no_update, dash.no_update
+                pdfs.append((name, decoded))
+                pdf_keys.append((key, len(decoded)))
+            metadata_hidden = False
+        elif ".jsonl" in lowered or lowered.endswith((".gz", ".xz")):
+            # Line-delimited and compressed corpora are streamed into the corpus in the background, see ingest.py
+            if start_ingest(corpus, session, io.BytesIO(decoded), len(decoded), name) is None:
+                message = "A file is already loading, please wait for it to finish."
+            interval_disabled = False
+        elif ".json" in lowered:
+            file_data, hit = cached_parse(parse_json_upload, decoded, ".json")
+            data += file_data
+        elif ".rtf" in lowered:
+            file_data, hit = cached_parse(parse_rtf_upload, decoded, ".rtf")
+            data += file_data
+            metadata_hidden = False
+        elif ".txt" in lowered:
+            file_data, hit = cached_parse(parse_txt_upload, decoded, ".txt")
+            data += file_data
+            metadata_hidden = False
+        if hit:
+            cached.append(name)
+    if cached and message is dash.no_update:
+        message = f"Already parsed, loaded from cache: {', '.join(cached)}"
+    if pdfs:
+        if not pdf_support():
+            message = "PDF files need pypdf, install it with: pip install pypdf"
+        else:
+            # Pages are counted and extracted by the pool, a damaged PDF stops the job with an error in its status
+            batch = PdfBatch(pdfs)
+            name = ", ".join(name for name, _ in pdfs)
+            # Fully extracted PDFs are cached, a PDF that failed part way is not
+            on_file = lambda index, sentences: upload_cache.put(pdf_keys[index][0], sentences, pdf_keys[index][1])
+            if start_job(corpus, session, batch.sentences(on_file), name, batch.progress, batch.close,
+                         batch.size) is None:
+                message = "A file is already loading, please wait for it to finish."
+            interval_disabled = False
+    return corpus.extend(session, data), metadata_hidden, interval_disabled, message, None
+
+
+@app.callback([Output('ingest-interval', 'disabled'),
+               Output('ingest-progress', 'children', allow_duplicate=True)],
+              Input('server-load-btn', 'n_clicks'),
+              [State('server-path', 'value'),
+               State('session-id', 'data')],
+              prevent_initial_call=True
+)
+def load_server_file(n_clicks, path, session):
+    """
+    Streams a .json or .jsonl file (or a .gz or .xz compressed one), or an Arrow corpus, that is already on the server
+    into the corpus, without going through the browser.
+    :param n_clicks: Load from Server button
+    :param path: Path of the file, relative to ingest.DATA_DIR
+    :param session: Session id
+    :return: [Interval disabled, progress text]
+    """
+    if not path:
+        raise PreventUpdate
+    try:
+        stream, size = open_server_file(path)
+    except OSError as error:
+        return dash.no_update, f"Could not open {path}: {error}"
+    if is_arrow_stream(stream):  # Memory-mapped instead of parsed, see arrow_corpus.py
+        stream.close()
+        if not arrow_support():
+            return dash.no_update, "Arrow corpora need pyarrow, install it with: pip install pyarrow"
+        job = start_arrow_ingest(corpus, session, stream.name, path)
+    else:
+        job = start_ingest(corpus, session, stream, size, path)
+    if job is None:
+        return dash.no_update, "A file is already loading, please wait for it to finish."
+    return False, f"Loading {path}"
+
+
+@app.callback([Output('ingest-progress', 'children'),
+               Output('corpus-revision', 'data', allow_duplicate=True),
+               Output('ingest-interval', 'disabled', allow_duplicate=True)],
+              Input('ingest-interval', 'n_intervals'),
+              State('session-id', 'data'),
+              prevent_initial_call=True
+)
+def ingest_progress(n_intervals, session):
+    # Polls the background ingestion job, and stops polling once it is done
+    status = corpus.status(session)
+    if status is None:
+        return dash.no_update, dash.no_update, True
+    return progress_text(status), corpus.revision(session), status["done"]
 
 
 @app.callback([Output(metadata_prompt,'hidden',allow_duplicate=True),
-               Output('all-relation-store','data', allow_duplicate=True)],
+               Output('corpus-revision','data', allow_duplicate=True)],
               Input('metadata-finish-button', 'n_clicks'),
               [State('title', 'value'),
                State('author','value'),
                State('year','value'),
-               State('all-relation-store','data'),],
+               State('session-id','data'),],
               prevent_initial_call="initial_duplicate"
 )
-def metadata(n_clicks, title, author, year, data):
+def metadata(n_clicks, title, author, year, session):
     meta_dict = {"title": title, "authors": author, "year": year}
-    for i in range(len(data)):
-        if data[i]["meta_data"] == {"title": "", "authors": "", "year": ""}:
-            data[i]["meta_data"] = meta_dict
-    return True, data
+    return True, corpus.fill_meta_data(session, meta_dict)
 
 
 @app.callback(
                Output("inverse-div",'hidden',allow_duplicate=True),
               Input('inverse-btn', 'n_clicks'),
               [State("inverse-div",'hidden'),
-               State('all-relation-store','data'),
-               State('next-btn', 'n_clicks'),
-               State('back-btn', 'n_clicks'),
-               State('inverse-in', 'value')],
+               State('cursor', 'data'),
+               State('inverse-in', 'value'),
+               State('session-id', 'data')],
               prevent_initial_call=True
 )
-def modify(n_clicks, editable, data,for_index,back_index,input_val):
-    if not data:
+def modify(n_clicks, editable,index,input_val,session):
+    if not corpus.length(session):
         return dash.no_update
-    index = int(for_index)-int(back_index)
     if index == 0:
         return dash.no_update
     if editable:
@@ -719,254 +752,83 @@ def modify(n_clicks, editable, data,for_index,back_index,input_val):
 
 @app.callback([
                Output("inverse-div",'hidden',allow_duplicate=True),
-               Output('all-relation-store','data', allow_duplicate=True),
-               Output('sentence','children', allow_duplicate=True),
-               Output('input-sentences','data', allow_duplicate=True)],
+               Output('corpus-revision','data', allow_duplicate=True)],
               [Input('submit-inverse', 'n_clicks'),
                Input('cancel-inverse', 'n_clicks')],
               [State("inverse-div",'hidden'),
-               State('sentence','children'),
-               State('all-relation-store','data'),
-               State('next-btn', 'n_clicks'),
-               State('back-btn', 'n_clicks'),
+               State('cursor', 'data'),
                State('inverse-in', 'value'),
-               State('input-sentences', 'data')],
+               State('session-id', 'data')],
               prevent_initial_call=True
 )
-def save_inverse(n_clicks, n_clicks2, visible, sen, data,for_index,back_index,input_val,sentence_list):
+def save_inverse(n_clicks, n_clicks2, visible,index,input_val,session):
     trigger = ctx.triggered_id
-    if trigger == "cancel-inverse":
-        return True, dash.no_update, dash.no_update, dash.no_update
-    index = int(for_index) - int(back_index)
+    if trigger == "cancel-inverse" or not index:
+        return True, dash.no_update
+    current = corpus.sentence(session, index - 1)  # -1 because the corpus does not have starter sentence
     relations = []
-    for relation in data[index - 1]["causal relations"]:  # -1 because data does not have starter sentence
+    for relation in current["causal relations"]:
         temp = dict(relation)
         if temp["direction"] == "increase":
             temp["direction"] = "decrease"
         else:
             temp["direction"] = "increase"
         relations.append(temp)
-    template = {"text": input_val,
-                "causal relations": relations,
-                "meta_data": data[index]["meta_data"]}
-    data.insert(index, template)
-    sentence_list.insert(index + 1, input_val)
-    return True, data, dash.no_update, sentence_list
+    revision = corpus.insert(session, index, new_sentence(input_val, relations, current["meta_data"]))
+    return True, revision
 
 
-@app.callback([
-               Output('sentence','children', allow_duplicate=True),
-               Output('inverse-in', 'value',allow_duplicate=True),],
+@app.callback(
+               Output('inverse-in', 'value',allow_duplicate=True),
               Input('inverse-div', 'hidden'),
               [State('sentence','children'),
                ],
               prevent_initial_call=True
 )
 def inverse_pt2(hidden,sen):
-    return sen, sen
+    return sen
 
 
-@app.callback([
-               Output('input-sentences','data', allow_duplicate=True),
-               Output('all-relation-store','data',allow_duplicate=True),
-               Output('next-btn', 'n_clicks',allow_duplicate=True),
-               Output('sentence', 'children',allow_duplicate=True),],
+@app.callback(
+               Output('corpus-revision','data',allow_duplicate=True),
               Input('discard-btn', 'n_clicks'),
-              [State('input-sentences','data'),
-               State('all-relation-store','data'),
-               State('next-btn', 'n_clicks'),
-               State('back-btn', 'n_clicks')
+              [State('cursor', 'data'),
+               State('session-id', 'data')
                ],
               prevent_initial_call=True
 )
-def discard(n_clicks,sentence_storage,data,for_index,back_index):
-    if len(sentence_storage) == 1:
-        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
-    index = int(for_index)-int(back_index)
-    if index == 0:
-        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
-    if index == len(sentence_storage):
-        for_index -= 1
-    sentence_storage.pop(index)
-    data.pop(index-1)
-    if index == len(sentence_storage):
-        return sentence_storage,data, for_index-1, dash.no_update
-    return sentence_storage,data, dash.no_update, sentence_storage[index]
-
-# Arrow key controls
-# event.key == 37 is for left arrow
-# event.key == 39 is for right arrow
-app.clientside_callback(
-    """
-        function(id) {
-            document.addEventListener("keydown", function(event) {
-                if (event.keyCode == '37') {
-                    document.getElementById('back-btn').click()
-                    event.stopPropogation()
-                }
-                if (event.keyCode == '39') {
-                    document.getElementById('next-btn').click()
-                    event.stopPropogation()
-                }
-            });
-            return window.dash_clientside.no_update       
-        }
-    """,
-    Output("back-btn", "id"),
-    Input("back-btn", "id"),
-
-)
-
-@app.callback(
-    Output("output2", "children", allow_duplicate=True),
-    Input("back-btn", "n_clicks"),
-    Input("next-btn", "n_clicks"),
-    State("all-relation-store","data"),
-    prevent_initial_call=True
-)
-def show_value(n1, n2,data):
-    index = int(n2)-int(n1)
-    if ctx.triggered_id == 'back-btn':
-        return f"Index: {index}, Total Passages: {len(data)}"
-    if index == 0: # without this, get caught in case 3 EOF at 0 index
-        if ctx.triggered_id == 'next-btn':
-            return f"Index: {index}, Total Passages: {len(data)}"
-    if len(data) == index:
-        return f"Index: {index}, Total Passages: {len(data)}, EOF"
-    elif len(data) < index:
-        return f"Index: {index}, Total Passages: {len(data)}, Past EOF"
-    return f"Index: {index}, Total Passages: {len(data)}"
-
-
-
-# Following function is used for up-arrow and down-arrow binding to increase and decrease for the current relation
-app.clientside_callback(
-    """
-        function(id) {
-            document.addEventListener("keydown", function(event) {
-                if (event.keyCode == '38' || event.keyCode == '107') {
-                    document.getElementById('increase-btn').click()
-                    event.stopPropogation()
-                }
-                if (event.shiftKey){
-                    if (event.keyCode == '61') {
-                        document.getElementById('increase-btn').click()
-                        event.stopPropogation()
-                    }
-                    if (event.keyCode == '173') {
-                        document.getElementById('decrease-btn').click()
-                        event.stopPropogation()
-                    }
-                }
-                if (event.keyCode == '40' || event.keyCode == '109') {
-                    document.getElementById('decrease-btn').click()
-                    event.stopPropogation()
-                }
-            });
-            return window.dash_clientside.no_update       
-        }
-    """,
-    Output("increase-btn", "id"),
-    Input("increase-btn", "id"),
-
-)
-
-@app.callback(
-    [Output("output2", "children", allow_duplicate=True)],
-    Input("increase-btn", "n_clicks"),
-    Input("decrease-btn", "n_clicks"),
-    State("all-relation-store","data"),
-    prevent_initial_call=True
-)
-def increase_decrease_keys(n1, n2,data): # don't know why we need an additional function and callback here,
-    # but it doesn't seem to work without it
-    return dash.no_update
-
-app.clientside_callback(
-    """
-        function(id) {
-            document.addEventListener("keydown", function(event) {
-                if (event.shiftKey){
-                    if (event.keyCode == '83'){
-                        document.getElementById('save-btn').click()
-                        event.stopPropogation()
-                    }
-                }
-                if (event.key == 's') {
-                    document.getElementById('source-btn').click()
-                    event.stopPropogation()
-                } 
-            });
-            return window.dash_clientside.no_update
-        }
-    """,
-    Output("source-btn", "id"),
-    Output("save-btn", "id"),
-    Input("source-btn", "id"),
-    Input("save-btn", "id"),
-
-)
-
-@app.callback(
-    [Output("output2", "children", allow_duplicate=True)],
-    Input("source-btn", "n_clicks"),
-    Input("save-btn", "n_clicks"),
-    State("all-relation-store","data"),
-    prevent_initial_call=True
-)
-def source_keybind(n1, n2, data): # don't know why we need an additional function and callback here,
-    # but it doesn't seem to work without it
-    return dash.no_update
-
-
-app.clientside_callback(
-    """
-        function(id) {
-            document.addEventListener("keydown", function(event) {
-                if (event.key == 't') {
-                    document.getElementById('target-btn').click()
-                    event.stopPropogation()
-                }
-            });
-            return window.dash_clientside.no_update
-        }
-    """,
-    Output("target-btn", "id"),
-    Input("target-btn", "id"),
-
-)
+def discard(n_clicks,index,session):
+    # The cursor stays in place, on the next sentence, or moves back if the last sentence was discarded
+    # (see assets/navigation.js)
+    length = corpus.length(session)
+    if length == 0 or not index or index > length:
+        return dash.no_update
+    corpus.pop(session, index-1)
+    return corpus.revision(session)
 
-@app.callback(
-    [Output("output2", "children", allow_duplicate=True)],
-    Input("target-btn", "n_clicks"),
-    State("all-relation-store","data"),
-    prevent_initial_call=True
-)
-def target_keybind(n1, data): # don't know why we need an additional function and callback here,
-    # but it doesn't seem to work without it
-    return dash.no_update
 
 @app.callback(
     [Output('datatable-metrics', 'data'),
      Output('datatable-metrics', 'columns'),],
-    Input('llm-metrics', 'data'),
+    Input('corpus-revision', 'data'),
     [State('datatable-metrics', 'columns'),
-     State('all-relation-store', 'data')]
+     State('session-id', 'data')]
 )
-def update_metrics(llmMetrics, cols, data):
+def update_metrics(revision, cols, session):
     """
-    This function is for updating the metrics table immediately after a file upload.
-    As a byproduct, it also updates the dropdown menu next to the metrics table.
-    :param llmMetrics:
+    This function is for updating the metrics table after a file upload or any edit of the ground truth.
+    The metrics are kept up to date by the corpus store, so this only reads them.
+    :param revision: Corpus revision
     :param cols:
-    :param backPass:
+    :param session: Session id
     :return:
     """
     cols = []
     row = {}
     rows = []
     i = 0
-    if data is None:
+    llmMetrics = corpus.metrics(session)
+    if not llmMetrics:
         return [], []
     for llm in llmMetrics.keys():
         cols.append({'name': [f'{llm}','F1'], 'id': f"{i}", 'hideable':'first'})
@@ -997,61 +859,24 @@ app.callback(Output("modal-xl","is_open"),
 @app.callback(Output("datatable-llm-output","data"),
               Output("datatable-llm-output","columns"),
               Input("llm-output-btn","n_clicks"),
-              State("llm-outputs","data"),
-              State("next-btn","n_clicks"),
-              State("back-btn","n_clicks"),
+              State("cursor","data"),
+              State("session-id", "data"),
 )
-def LLM_comparison(n_clicks, llm_outputs, next_btn, prev_btn):
-    index = int(next_btn)-int(prev_btn)-1
-    if index < 0:
-        return dash.no_update, dash.no_update
-    if llm_outputs is None:
+def LLM_comparison(n_clicks, cursor, session):
+    """
+    Shows the LLM outputs of the current sentence next to its ground truth. The table is aligned by the corpus store
+    when the sentence is added or its ground truth edited (see alignment.py), so opening the modal only looks it up.
+    :param n_clicks: LLM Output Comparison button
+    :param cursor: 1 based index of the current sentence
+    :param session: Session id
+    :return: [table rows, table columns]
+    """
+    index = cursor-1
+    if index < 0 or index >= corpus.length(session):
         return dash.no_update, dash.no_update
-    cols = []
-    row = {}
-    llm_rows = {}
-    rows = []
-    i = 0
-    llm_processed = 0
-    number_of_llms = len(llm_outputs.keys())
-    for llm in llm_outputs.keys():
-        current_sentence_data = llm_outputs[llm][index]
-        if type(current_sentence_data) is list:
-            cols.append({'name': [f'{llm}', 'Source'], 'id': f"{i}", 'hideable': 'first'})
-            cols.append({'name': [f'{llm}', 'Target'], 'id': f"{i+1}"})
-            cols.append({'name': [f'{llm}', 'Direction'], 'id': f"{i+2}"})
-            if llm_processed == 0:
-                for relation in current_sentence_data:
-                    row = {}
-                    row[llm_processed*3] = f"{relation['src']}"
-
-                    row[llm_processed*3+1] = f"{relation['tgt']}"
-
-                    row[llm_processed*3+2] = f"{relation['direction']}"
-                    rows.append(row)
-            else:
-                #if len(current_sentence_data)>
-                for relation, j in zip(current_sentence_data, range(len(current_sentence_data))):
-                    rows[j][llm_processed * 3] = f"{relation['src']}"
-
-                    rows[j][llm_processed * 3 + 1] = f"{relation['tgt']}"
-
-                    rows[j][llm_processed * 3 + 2] = f"{relation['direction']}"
-                    #rows.append(row)
-        else:
-            cols.append({'name': [f'{llm}','Source'], 'id': f"{i}", 'hideable':'first'})
-            row[i] = f"{current_sentence_data['src']}"
-
-            cols.append({'name': [f'{llm}', 'Target'], 'id': f"{i+1}"})
-            row[i+1] = f"{current_sentence_data['tgt']}"
-
-            cols.append({'name': [f'{llm}', 'Direction'], 'id': f"{i+2}"})
-            row[i+2] = f"{current_sentence_data['direction']}"
-        i += 3
-        llm_processed += 1
-    if type(current_sentence_data) is not list:
-        rows.append(row)
-    return rows, cols
+    table = corpus.alignment(session, index)
+    return table["rows"], table["columns"]
 
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    # Development server, see serve.py to serve a lab of annotators
+    app.run(debug=True)
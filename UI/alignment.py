@@ -0,0 +1,73 @@
+"""
+Alignment of the LLM outputs of a sentence with its ground truth, as shown in the LLM Output Comparison modal.
+
+Every relation of an LLM is paired with the ground truth relation it matches, the same way the scoring matches them
+(see matching.py), or marked as unmatched. The table has one row per ground truth relation, holding the relation each
+LLM matched to it (empty if the LLM missed it), followed by the rows of unmatched LLM relations. Each relation stays in
+the row of its match, however many relations every LLM output, so the columns of different LLMs never drift apart.
+
+The corpus store aligns every sentence when it is added, and aligns it again after its ground truth is edited (see
+CorpusStore.alignment in corpus_store.py).
+"""
+
+UNMATCHED = "Unmatched"
+GROUND_TRUTH = "Ground Truth"
+
+
+def match(passage, relations, matcher):
+    """
+    Pairs relations with the ground truth relations of a passage, each ground truth relation is matched at most once
+    :param passage: Passage (see corpus_model.py)
+    :param relations: Relations of one LLM
+    :param matcher: RelationMatcher (see matching.py)
+    :return: (list of (ground truth row, relation), list of unmatched relations)
+    """
+    pairs = matcher.pairs(matcher.keys(passage.relations), matcher.keys(relations))
+    matched = {j: row for row, j in pairs}
+    return ([(row, relations[j]) for j, row in matched.items()],
+            [relation for j, relation in enumerate(relations) if j not in matched])
+
+
+def columns(llms):
+    """
+    :param llms: Names of the LLMs
+    :return: DataTable columns, the ground truth first
+    """
+    cols = []
+    for i, name in enumerate((GROUND_TRUTH,) + tuple(llms)):
+        cols.append({'name': [name, 'Source'], 'id': f"{3*i}", 'hideable': 'first'})
+        cols.append({'name': [name, 'Target'], 'id': f"{3*i+1}"})
+        cols.append({'name': [name, 'Direction'], 'id': f"{3*i+2}"})
+    return cols
+
+
+def _cells(row, column, relation):
+    row[f"{3*column}"] = relation.src
+    row[f"{3*column+1}"] = relation.tgt
+    row[f"{3*column+2}"] = relation.direction
+
+
+def align(passage, matcher):
+    """
+    Builds the comparison table of a passage
+    :param passage: Passage
+    :param matcher: RelationMatcher
+    :return: {"columns": DataTable columns, "rows": DataTable rows}, no columns if the passage has no LLM outputs
+    """
+    if not passage.llm:
+        return {"columns": [], "rows": []}
+    rows = []
+    for relation in passage.relations:
+        row = {}
+        _cells(row, 0, relation)
+        rows.append(row)
+    extra = []  # Rows of unmatched relations, shared by the LLMs
+    for column, relations in enumerate(passage.llm.values(), start=1):
+        pairs, unmatched = match(passage, relations, matcher)
+        for row, relation in pairs:
+            _cells(rows[row], column, relation)
+        for i, relation in enumerate(unmatched):
+            if i == len(extra):
+                extra.append({"0": UNMATCHED})
+            _cells(extra[i], column, relation)
+    return {"columns": columns(passage.llm.keys()), "rows": rows + extra}
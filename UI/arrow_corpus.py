@@ -0,0 +1,212 @@
+import argparse
+import json
+from corpus_model import LLM_KEY, RELATIONS_KEY, as_passage
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow corpora are optional, see INSTALL.md
+    pa = None
+"""
+Columnar corpus files, in the Arrow IPC stream format, which are memory-mapped instead of parsed.
+
+Opening an Arrow corpus maps the file and reads the layout of its columns, so it takes milliseconds and almost no
+memory whatever the size of the corpus, and passages are only made into Python objects when they are read. The files
+are also datasets files: datasets.Dataset.from_file("corpus.arrow") opens them, memory-mapped as well, for training.
+
+Columns:
+- text: string
+- causal relations: list of {src, tgt, direction}
+- meta_data: JSON string, as the keys of the meta data differ between sources
+- LLM: list of {model, relations}, the outputs of every model in the order of the input
+- extra: JSON string of the other keys of the sentence, null if there are none
+
+Any corpus the conversion scripts read can be converted, and every reader of corpus_io.py, the conversion scripts,
+evaluate.py, dedup.py and Load from Server in the UI read Arrow corpora as they read JSON ones. Run from the UI folder:
+    python arrow_corpus.py ../Fine_Tuning/LLM_data/SIFT_data_2024_03.jsonl -o SIFT.arrow
+    python convert.py SIFT.arrow -o SIFT.jsonl              (and back)
+
+Requires pyarrow (pip install pyarrow).
+"""
+
+BATCH_SIZE = 4096
+# Arrow IPC streams start with a continuation marker, which can't start a JSON, gzip or xz file
+STREAM_MARKER = b"\xff\xff\xff\xff"
+
+if pa is not None:
+    RELATION = pa.struct([("src", pa.string()), ("tgt", pa.string()), ("direction", pa.string())])
+    SCHEMA = pa.schema([("text", pa.string()),
+                        (RELATIONS_KEY, pa.list_(RELATION)),
+                        ("meta_data", pa.string()),
+                        (LLM_KEY, pa.list_(pa.struct([("model", pa.string()), ("relations", pa.list_(RELATION))]))),
+                        ("extra", pa.string())])
+
+
+def arrow_support():
+    return pa is not None
+
+
+def is_arrow_stream(binary_stream):
+    """
+    :param binary_stream: Seekable binary stream, at its start
+    :return: True if it is an Arrow IPC stream, the stream is left at its start
+    """
+    head = binary_stream.read(len(STREAM_MARKER))
+    binary_stream.seek(0)
+    return head == STREAM_MARKER
+
+
+def is_arrow(path):
+    with open(path, "rb") as f:
+        return is_arrow_stream(f)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Arrow corpora need pyarrow, install it with: pip install pyarrow")
+
+
+def to_row(passage):
+    """
+    :param passage: Passage or sentence dictionary in our main JSON format
+    :return: Row of SCHEMA
+    """
+    passage = as_passage(passage)
+    return {"text": passage.text,
+            RELATIONS_KEY: [relation.to_dict() for relation in passage.relations],
+            "meta_data": json.dumps(passage.meta_data),
+            LLM_KEY: [{"model": model, "relations": [relation.to_dict() for relation in outputs]}
+                      for model, outputs in passage.llm.items()],
+            "extra": json.dumps(passage.extra) if passage.extra else None}
+
+
+def from_row(row):
+    """
+    :param row: Row of SCHEMA, as a dictionary
+    :return: Sentence dictionary in our main JSON format
+    """
+    sentence = {"text": row["text"],
+                RELATIONS_KEY: row[RELATIONS_KEY],
+                "meta_data": json.loads(row["meta_data"])}
+    if row[LLM_KEY]:
+        sentence[LLM_KEY] = {output["model"]: output["relations"] for output in row[LLM_KEY]}
+    if row["extra"] is not None:
+        sentence.update(json.loads(row["extra"]))
+    return sentence
+
+
+class ArrowWriter:
+    """
+    Writes passages to an Arrow corpus one at a time, a record batch every batch_size passages. It has the interface
+    of corpus_io.RecordWriter, so Arrow corpora are among the outputs filled in the same pass (see split.py).
+    :param path: Output path
+    :param batch_size: Number of passages per record batch
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        _require_pyarrow()
+        self.sink = pa.OSFile(path, "wb")
+        self.writer = pa.ipc.new_stream(self.sink, SCHEMA)
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+
+    def write(self, passage):
+        self.rows.append(to_row(passage))
+        self.count += 1
+        if len(self.rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            self.writer.write_batch(pa.RecordBatch.from_pylist(self.rows, schema=SCHEMA))
+            self.rows = []
+
+    def close(self):
+        if self.writer is None:
+            return
+        self._flush()
+        self.writer.close()
+        self.sink.close()
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_arrow(passages, path, batch_size=BATCH_SIZE):
+    """
+    Streams passages to an Arrow corpus, a batch at a time
+    :param passages: Iterable of Passages or sentence dictionaries in our main JSON format
+    :param path: Output path
+    :param batch_size: Number of passages per record batch
+    :return: Number of passages written
+    """
+    with ArrowWriter(path, batch_size) as writer:
+        for passage in passages:
+            writer.write(passage)
+    return writer.count
+
+
+class ArrowCorpus:
+    """
+    A memory-mapped Arrow corpus.
+    :param path: Path of the file
+    """
+
+    def __init__(self, path):
+        _require_pyarrow()
+        self.source = pa.memory_map(path, "r")
+        self.table = pa.ipc.open_stream(self.source).read_all()  # Zero-copy, the columns point into the mapping
+        self.position = 0  # Passages read so far by sentences(), for progress reports
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return from_row(self.table.slice(index, 1).to_pylist()[0])
+
+    def sentences(self):
+        """
+        :return: Generator of the sentence dictionaries, converted a record batch at a time
+        """
+        for batch in self.table.to_batches():
+            for row in batch.to_pylist():
+                yield from_row(row)
+                self.position += 1
+
+    def texts(self):
+        # Only the text column is converted
+        for chunk in self.table.column("text").chunks:
+            yield from chunk.to_pylist()
+
+    def close(self):
+        self.table = None
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    from pipeline import read_passages
+    parser = argparse.ArgumentParser(description="Converts corpora to Arrow corpora")
+    parser.add_argument("files", nargs="+", help="Input files, JSON or JSONL, in any format of corpus_io.py")
+    parser.add_argument("-o", "--output", required=True, help="Output .arrow file")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Passages per record batch")
+    args = parser.parse_args()
+    if not arrow_support():
+        parser.error("Arrow corpora need pyarrow, install it with: pip install pyarrow")
+    print(f"{write_arrow(read_passages(args.files), args.output, args.batch_size)} passages")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+/*
+Keyboard shortcuts of DashUI.py.
+
+One keydown listener is registered for the whole page, however many times this file is loaded, and every shortcut
+clicks the button it stands for, so a shortcut does exactly what the button does (see navigation.js) and sends
+nothing to the server by itself.
+
+The keymap is set in DashUI.py (KEYMAP) and read from the data-keymap attribute of the "keymap" element. It maps
+KeyboardEvent.key values to button ids. Shortcuts are ignored while typing in a text field.
+*/
+
+(function () {
+    if (window.twosixKeyboard) {
+        return;
+    }
+    window.twosixKeyboard = true;
+
+    let keymap = null;
+
+    function loadKeymap() {
+        // The layout is rendered after this file runs, so the keymap is read on the first key press
+        const element = document.getElementById("keymap");
+        if (!element) {
+            return null;
+        }
+        keymap = JSON.parse(element.dataset.keymap);
+        return keymap;
+    }
+
+    function isTyping(target) {
+        const tag = target.tagName;
+        return tag === "INPUT" || tag === "TEXTAREA" || tag === "SELECT" || target.isContentEditable;
+    }
+
+    document.addEventListener("keydown", function (event) {
+        if (event.ctrlKey || event.altKey || event.metaKey || isTyping(event.target)) {
+            return;
+        }
+        const buttonId = (keymap || loadKeymap() || {})[event.key];
+        const button = buttonId && document.getElementById(buttonId);
+        if (!button) {
+            return;
+        }
+        event.preventDefault();  // Arrow keys would also scroll the page
+        button.click();
+    });
+})();
@@ -0,0 +1,149 @@
+/*
+Clientside navigation and labeling for DashUI.py.
+
+The position in the paper is a single cursor (1 based index of the current sentence, 0 when there is no paper), and
+the relation being labeled is kept in current-relation-store. Moving, picking the source or target, and setting the
+direction only change these stores in the browser. The server is contacted when a relation is complete and has to
+be saved (through pending-relation), and when the cursor leaves the window of sentences the browser holds.
+
+sentence-cache is the window sent by the server (see load_window in DashUI.py):
+{"revision", "start", "length", "page_size", "sentences": [{"text", "causal relations"}]}
+where start is the 0 based index of the first sentence of the window and length the size of the corpus.
+*/
+
+window.dash_clientside = window.dash_clientside || {};
+
+(function () {
+    const no_update = window.dash_clientside.no_update;
+    const EMPTY_RELATION = {src: "", tgt: "", direction: ""};
+    // Pages of the sentence browser kept before the current one when a new window is requested
+    const PAGES_BEFORE = 2;
+
+    function inCache(cache, index) {
+        // index is 0 based
+        return Boolean(cache) && index >= cache.start && index < cache.start + cache.sentences.length;
+    }
+
+    function windowRequest(cache, index) {
+        const pageSize = cache ? cache.page_size : 10;
+        const page = Math.floor(index / pageSize);
+        return {start: Math.max(0, (page - PAGES_BEFORE) * pageSize), requested: Date.now()};
+    }
+
+    function isComplete(relation) {
+        return relation.src !== "" && relation.tgt !== "" && relation.src != null && relation.tgt != null;
+    }
+
+    function html(type, props) {
+        return {namespace: "dash_html_components", type: type, props: props};
+    }
+
+    window.dash_clientside.navigation = {
+        /*
+        State machine of the cursor and of the current relation.
+        Leaving a sentence (Next or Back) saves its relation if it is complete, and starts a new one.
+        Returns [cursor, current relation, pending relation, window request]
+        */
+        step: function (next, back, save, reset, increase, decrease, source, target, cache,
+                        cursor, relation, selected, modifierHidden) {
+            const trigger = window.dash_clientside.callback_context.triggered_id;
+            const length = cache ? cache.length : 0;
+            relation = Object.assign({}, EMPTY_RELATION, relation);
+            let pending = no_update;
+            let newCursor = cursor || 0;
+
+            if (trigger === "sentence-cache" || !trigger) {
+                // The corpus changed (upload, discard, download...) or the sentence browser moved the window, keep the
+                // cursor inside the corpus. The window is only brought back to the cursor when the cursor moves
+                newCursor = Math.min(Math.max(newCursor, length ? 1 : 0), length);
+                return [newCursor === cursor ? no_update : newCursor, no_update, no_update, no_update];
+            } else if (trigger === "reset-btn") {
+                return [no_update, EMPTY_RELATION, no_update, no_update];
+            } else if (!modifierHidden) {
+                // The inverse sentence editor is open, labeling keys are typed into it
+                return [no_update, no_update, no_update, no_update];
+            } else if (trigger === "increase-btn" || trigger === "decrease-btn") {
+                relation.direction = trigger === "increase-btn" ? "Increase" : "Decrease";
+                return [no_update, relation, no_update, no_update];
+            } else if (trigger === "source-btn" || trigger === "target-btn") {
+                relation[trigger === "source-btn" ? "src" : "tgt"] = selected || "";
+                return [no_update, relation, no_update, no_update];
+            } else if (trigger === "save-btn") {
+                if (!newCursor || !isComplete(relation)) {
+                    return [no_update, no_update, no_update, no_update];
+                }
+                return [no_update, no_update, {index: newCursor - 1, relation: relation, sent: Date.now()}, no_update];
+            } else if (length) {  // Next or Back
+                if (newCursor && isComplete(relation)) {
+                    pending = {index: newCursor - 1, relation: relation, sent: Date.now()};
+                }
+                relation = EMPTY_RELATION;
+                newCursor = trigger === "next-btn" ? Math.min(newCursor + 1, length) : Math.max(newCursor - 1, 1);
+            }
+            const request = newCursor && !inCache(cache, newCursor - 1) ? windowRequest(cache, newCursor - 1) : no_update;
+            return [newCursor, relation, pending, request];
+        },
+
+        /*
+        Shows the current sentence, its relations and its neighbours from the window held by the browser.
+        Returns [sentence, relation table rows, next passage, previous passage, index text]
+        */
+        render: function (cursor, cache) {
+            if (!cache || !cache.length || !cursor) {
+                return ["Please Insert RTF or JSON File", [], "", "", ""];
+            }
+            const index = cursor - 1;
+            if (!inCache(cache, index)) {
+                return [no_update, no_update, no_update, no_update, no_update];  // The window is being loaded
+            }
+            const text = (i) => inCache(cache, i) ? cache.sentences[i - cache.start].text : "[]";
+            const rows = cache.sentences[index - cache.start]["causal relations"].map(
+                (relation) => ({"1": relation.src, "2": relation.tgt, "3": relation.direction}));
+            let position = `Index: ${cursor}, Total Passages: ${cache.length}`;
+            if (cursor === cache.length) {
+                position += ", EOF";
+            }
+            return [text(index), rows,
+                    `Next Passage: ${index + 1 < cache.length ? text(index + 1) : "[]"}`,
+                    `Previous Passage: ${index > 0 ? text(index - 1) : "[]"}`,
+                    position];
+        },
+
+        // Shows the current relation. Returns [direction, source, target]
+        relation: function (relation) {
+            relation = Object.assign({}, EMPTY_RELATION, relation);
+            return [`Direction: ${relation.direction}`, `Source: ${relation.src}`, `Target: ${relation.tgt}`];
+        },
+
+        /*
+        Sentence browser, one page of the corpus at a time. It moves to the page of the cursor when the cursor moves,
+        and otherwise stays on the page picked in the pagination. Returns [sentence list, number of pages, shown page,
+        window request]
+        */
+        page: function (cursor, cache, activePage) {
+            if (!cache || !cache.length) {
+                return ["Current Sentences: []", 1, 1, no_update];
+            }
+            const trigger = window.dash_clientside.callback_context.triggered_id;
+            const pageSize = cache.page_size;
+            const pages = Math.ceil(cache.length / pageSize);
+            let page = activePage || 1;
+            if (trigger === "cursor") {
+                page = Math.floor((Math.min(Math.max(cursor, 1), cache.length) - 1) / pageSize) + 1;
+            }
+            page = Math.min(page, pages);
+            const start = (page - 1) * pageSize;
+            if (!inCache(cache, start)) {
+                return [no_update, pages, page, windowRequest(cache, start)];
+            }
+            const items = [];
+            const stop = Math.min(start + pageSize, cache.length);
+            for (let i = start; i < stop && inCache(cache, i); i++) {
+                const text = cache.sentences[i - cache.start].text;
+                items.push(html("Li", {children: i + 1 === cursor ? html("B", {children: text}) : text}));
+            }
+            return [[html("P", {children: `Current Sentences: ${start + 1}-${start + items.length} of ${cache.length}`}),
+                     html("Ol", {children: items, start: start + 1})], pages, page, no_update];
+        }
+    };
+})();
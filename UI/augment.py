@@ -0,0 +1,185 @@
+import argparse
+import random
+from corpus_model import Relation
+from pipeline import arguments, run
+"""
+Augmentation of the dialog training data: every passage of the corpus gives dialogs whose answer is its labels
+(positive samples) or a wrong labeling of it (negative samples), each with the eval_score and profile_match of its
+generator.
+
+Generators:
+- gold: the labels of the passage
+- shuffled: the labels in another order
+- flipped: every direction inverted, like the inverse sentences of the UI
+- swapped: source and target of every relation swapped
+- dropped: the labels without one of the relations, for passages with several
+- source, target, direction, keywords: degenerate answers repeating the label keywords
+
+An Augmenter makes one dialog per generator, or draws a number of dialogs per passage from the generators with
+weights. A passage never gets the same answer twice (shuffling a single relation gives the gold labels again), and a
+generator that can't make a different answer for a passage is skipped (flipping a passage without relations).
+Draws are seeded by the passage text, so the output doesn't depend on the workers or on the chunks they get.
+
+It runs on the conversion pipeline (see pipeline.py), so augmented sets many times the size of the corpus are
+streamed to the output file. Run from the UI folder:
+    python augment.py OSW_labeled_data.json -o Training_data.jsonl --samples 20
+    python augment.py OSW_labeled_data.json -o Training_data.jsonl --samples 50 --weights gold=1 flipped=4 swapped=4
+"""
+
+SEED = 495
+DIRECTIONS = {"increase": "decrease", "decrease": "increase"}
+MAX_ATTEMPTS = 4  # Draws per requested sample, before giving up on passages with few distinct answers
+
+
+def dialog(text, answer, eval_score, profile_match=None):
+    master = {"dialog_id": None,
+              "dialog": [{"id": 0, "sender": "participant1", "text": text},
+                         {"id": 1, "sender": "participant2", "text": answer}]}
+    master["eval_score"] = eval_score
+    if profile_match is not None:
+        master["profile_match"] = profile_match
+    return master
+
+
+def labels(relations):
+    answer = ""
+    for relation in relations:
+        answer += "source " + relation.src + " target " + relation.tgt + " direction " + relation.direction + "  "
+    return answer
+
+
+def gold(passage, rng):
+    return labels(passage.relations)
+
+
+def shuffled(passage, rng):
+    relations = list(passage.relations)
+    rng.shuffle(relations)
+    return labels(relations)
+
+
+def flipped(passage, rng):
+    if not passage.relations:
+        return None
+    return labels(Relation(relation.src, relation.tgt, DIRECTIONS.get(relation.direction, "increase"))
+                  for relation in passage.relations)
+
+
+def swapped(passage, rng):
+    if not passage.relations:
+        return None
+    return labels(Relation(relation.tgt, relation.src, relation.direction) for relation in passage.relations)
+
+
+def dropped(passage, rng):
+    if len(passage.relations) < 2:
+        return None  # Dropping the only relation would be the answer of a sentence without relations
+    relations = list(passage.relations)
+    del relations[rng.randrange(len(relations))]
+    return labels(relations)
+
+
+def repeated(words, times):
+    def generator(passage, rng):
+        return " ".join([words] * times)
+    return generator
+
+
+# name: (generator, eval_score, profile_match)
+GENERATORS = {
+    "gold": (gold, 10, 1),
+    "shuffled": (shuffled, 10, 1),
+    "flipped": (flipped, 0, 0),
+    "swapped": (swapped, 0, 0),
+    "dropped": (dropped, 5, 0),
+    "source": (repeated("source", 24), 0, 0),
+    "target": (repeated("target", 24), 0, 0),
+    "direction": (repeated("direction", 8), 0, 0),
+    "keywords": (repeated("source target direction", 5), 2, 0),
+}
+TRAINING_WEIGHTS = {"gold": 1, "source": 1, "target": 1, "direction": 1, "keywords": 1}
+DEFAULT_WEIGHTS = {"gold": 1, "shuffled": 1, "flipped": 2, "swapped": 2, "dropped": 2, "keywords": 1}
+
+
+class Augmenter:
+    """
+    Transform of the pipeline making the dialogs of a passage. Instances are sent to the workers, so they only hold
+    the names of the generators.
+    :param weights: {generator name: sampling weight}
+    :param samples: Number of dialogs per passage, None for one dialog per generator, in the order of the weights
+    :param seed: Seed of the draws
+    """
+
+    def __init__(self, weights=None, samples=None, seed=SEED):
+        weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        unknown = set(weights) - set(GENERATORS)
+        if unknown:
+            raise ValueError(f"Unknown generators {', '.join(sorted(unknown))}, expected some of {', '.join(GENERATORS)}")
+        self.names = [name for name, weight in weights.items() if weight > 0]
+        if not self.names:
+            raise ValueError("No generator has a positive weight")
+        self.weights = [weights[name] for name in self.names]
+        self.samples = samples
+        self.seed = seed
+
+    def _dialog(self, passage, name, rng, answers):
+        generator, eval_score, profile_match = GENERATORS[name]
+        answer = generator(passage, rng)
+        if answer is None or answer in answers:
+            return None
+        answers.add(answer)
+        return dialog(passage.text, answer, eval_score, profile_match)
+
+    def __call__(self, passage):
+        """
+        :param passage: Passage
+        :return: List of dialog records, their dialog_id is given by the pipeline
+        """
+        rng = random.Random(f"{self.seed}:{passage.text}")
+        answers = set()
+        if self.samples is None:
+            draws = self.names
+        else:
+            draws = rng.choices(self.names, self.weights, k=self.samples * MAX_ATTEMPTS)
+        dialogs = []
+        for name in draws:
+            record = self._dialog(passage, name, rng, answers)
+            if record is not None:
+                dialogs.append(record)
+                if len(dialogs) == self.samples:
+                    break
+        return dialogs
+
+
+def parse_weights(values):
+    """
+    :param values: List of "name=weight" strings
+    :return: {generator name: weight}
+    """
+    weights = {}
+    for value in values:
+        name, _, weight = value.partition("=")
+        try:
+            weights[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bad generator weight {value}, expected name=weight")
+    return weights
+
+
+def main():
+    parser = arguments("Makes positive and negative training dialogs out of our main JSON format")
+    parser.add_argument("--weights", nargs="+", metavar="NAME=WEIGHT",
+                        help=f"Sampling weights of the generators ({', '.join(GENERATORS)})")
+    parser.add_argument("--samples", type=int,
+                        help="Dialogs per passage, drawn with the weights. One per generator if not given")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the draws")
+    args = parser.parse_args()
+    try:
+        augmenter = Augmenter(parse_weights(args.weights) if args.weights else None, args.samples, args.seed)
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+    run(args.files, args.output, [augmenter], args.workers, compact=args.compact)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import random
+import time
+from striprtf.striprtf import rtf_to_text
+from segmenter import default_segmenter
+"""
+Benchmark of segmenter.py against the sentence splitting DashUI.py used before it.
+
+Run from the UI folder:
+    python bench_segmenter.py
+    python bench_segmenter.py --pages 500 --repeat 3
+
+Both segmenters are timed on Short_Test.rtf and on a synthetic document of the requested number of pages, made of
+sentences with citations, abbreviations and figure references. The previous splitter crashes on some inputs
+(empty trailing segments), in which case the crash is reported instead of a time.
+"""
+
+CHARACTERS_PER_PAGE = 3000
+
+SYNTHETIC_SENTENCES = [
+    "Offshore wind farms increase the abundance of reef fish around the turbines.",
+    "Smith et al. (2020) found that recreational fishing increased in the BIWF area.",
+    "As shown in Fig. 3, the catch per unit effort decreased after construction.",
+    "Fishermen reported fewer conflicts, e.g. over gear loss, once the cables were buried.",
+    "The noise of pile driving decreases the presence of harbour porpoises (Jones et al., 2019).",
+    "Dr. J. Brown measured an increase of 3.5 kg per trawl in the U.S. waters.",
+    "Is the effect on cod larger than the effect on plaice?",
+    "Compensation measures, i.e. artificial reefs, reduce the net ecological loss.",
+]
+
+
+def abbreviation_handler(sentences):
+    # The helper DashUI.py used before segmenter.py, kept here as the benchmark baseline
+    sentences_to_add = []
+    temp = sentences[0]
+    for i in range(len(sentences) - 1):
+        if sentences[i] == '':
+            continue
+        if not (sentences[i + 1].strip())[0].isupper():
+            temp = temp + '. ' + sentences[i + 1]
+        else:
+            sentences_to_add.append(temp)
+            temp = sentences[i + 1]
+    sentences_to_add.append(temp)
+    return sentences_to_add
+
+
+def legacy_segment(text):
+    # The RTF path of the upload callback before segmenter.py
+    period_split = text.split(". ")
+    sentences = []
+    for sentence in period_split:
+        for sen in sentence.split(".\n"):
+            if sen == "":
+                continue
+            sentences.append(sen)
+    output = []
+    for sentence in abbreviation_handler(sentences):
+        if sentence == '':
+            continue
+        output.append(sentence.replace("\n", "") + ".")
+    return output
+
+
+def synthetic_document(pages, seed=0):
+    # Returns the document and its true number of sentences
+    rng = random.Random(seed)
+    paragraphs = []
+    size = 0
+    count = 0
+    while size < pages * CHARACTERS_PER_PAGE:
+        sentences = [rng.choice(SYNTHETIC_SENTENCES) for _ in range(rng.randint(3, 8))]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+        count += len(sentences)
+    return "\n\n".join(paragraphs), count
+
+
+def time_segmenter(function, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = function(text)
+        except (IndexError, ValueError) as error:
+            return f"crashed ({type(error).__name__}: {error})", None
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return f"{best * 1000:.2f} ms", len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of segmenter.py against the previous sentence splitting")
+    parser.add_argument("--rtf", default="Short_Test.rtf", help="RTF file to segment")
+    parser.add_argument("--pages", type=int, default=500, help="Pages of the synthetic document")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best one is reported")
+    args = parser.parse_args()
+
+    with open(args.rtf) as f:
+        documents = [(args.rtf, rtf_to_text(f.read()), None)]
+    documents.append((f"synthetic {args.pages} pages", *synthetic_document(args.pages)))
+    segmenters = [("abbreviation_handler", legacy_segment),
+                  ("segmenter", lambda text: default_segmenter.spans(text))]
+    for name, text, expected in documents:
+        print(f"{name} ({len(text)} characters" + (f", {expected} sentences)" if expected else ")"))
+        for segmenter_name, function in segmenters:
+            elapsed, count = time_segmenter(function, text, args.repeat)
+            print(f"    {segmenter_name:<22}{elapsed:>14}    {count if count is not None else '-'} sentences")
+
+
+if __name__ == '__main__':
+    main()
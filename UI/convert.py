@@ -0,0 +1,39 @@
+from ConvJSONtoDashJSON import to_dash
+from ConvertCustomToJSON import to_testing_dialog, to_training_dialogs
+from ConvertJSONtoLLM import to_dialog
+from dedup import Deduplicator, add_arguments
+from pipeline import arguments, run
+"""
+Converts corpora between formats by chaining the transforms of the conversion scripts (see pipeline.py).
+
+The input files can be in our main JSON format, SIFT or habitus (see corpus_io.py), and the transforms given with
+--to are applied in order. Without --to, the files are merged into one file in our main JSON format. With --dedup,
+duplicate and near-duplicate passages are merged first (see dedup.py). Run from the UI folder:
+    python convert.py OSW_labeled_data.json -o Training_data.json --to dialog
+    python convert.py ../Fine_Tuning/LLM_data/SIFT_data_2024_03.jsonl -o SIFT.json
+    python convert.py big_corpus.jsonl -o big_dialogs.jsonl --to dialog --workers 8
+    python convert.py a.json b.json -o merged.json --dedup --dedup-report duplicates.json
+"""
+
+TRANSFORMS = {
+    "dash": to_dash,  # main JSON format, with the ground truth copied as LLM outputs
+    "dialog": to_dialog,  # triplet dialog format, one dialog per passage
+    "training-dialogs": to_training_dialogs,  # scored dialogs, five per passage
+    "testing-dialogs": to_testing_dialog,  # dialogs with the labeling prompt, one per passage
+}
+
+
+def main():
+    parser = arguments("Converts corpora between formats")
+    parser.add_argument("--to", nargs="+", choices=TRANSFORMS, default=[], help="Transforms applied in order")
+    parser.add_argument("--dedup", action="store_true", help="Merge duplicate passages before the transforms")
+    args = add_arguments(parser).parse_args()
+    passages = None
+    if args.dedup:
+        passages = Deduplicator(args.files, args.dedup_threshold, args.merge).passages(args.dedup_report)
+    run(args.files, args.output, [TRANSFORMS[name] for name in args.to], args.workers, passages=passages,
+        compact=args.compact)
+
+
+if __name__ == '__main__':
+    main()
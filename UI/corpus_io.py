@@ -0,0 +1,390 @@
+import gzip
+import io
+import json
+import lzma
+import re
+from arrow_corpus import ArrowCorpus, ArrowWriter, is_arrow
+from corpus_model import Passage
+try:
+    import orjson
+except ImportError:  # orjson only makes the writers faster, the standard json module is used without it
+    orjson = None
+"""
+Streaming readers and writers for corpus files.
+
+Files are read record by record instead of with a single json.load, so that large corpora never have to be in memory
+at once. Both line-delimited JSON (.jsonl, one record per line) and JSON arrays of records are supported, and the
+format is detected from the first non-whitespace character of the file. gzip and xz compressed files are detected
+from their first bytes, whatever their extension.
+
+Records can be in our main JSON format, in the SIFT format of Fine_Tuning/LLM_data/SIFT_data_2024_03.jsonl:
+{"premise": "", "hypotheses": [{"subj": "", "pred": "increase(s)", "obj": ""}], ...}
+or in the format of Fine_Tuning/LLM_data/habitus_p2_assets.json, which has the ground truth and the model outputs:
+{"passage": "", "rels": [{"model_name": "Ground truth", "rels": [{"head": "", "tail": "", "direction_head": "",
+                                                                 "direction_tail": ""}]}, ...]}
+to_sentence() converts all of them to our main JSON format.
+
+The writers stream records to a file as they come: JSONL if the file name ends with .jsonl, and a JSON array
+otherwise, indented like json.dumps(indent=2) or compact (one record per line, without whitespace, encoded with
+orjson if it is installed). A .gz or .xz extension after that compresses the file, e.g. corpus.jsonl.gz.
+
+iter_sentences() and write_records() also read and write the memory-mapped Arrow corpora of arrow_corpus.py.
+"""
+
+CHUNK_SIZE = 1 << 16
+# A record of a JSON array still incomplete after this many characters is taken for a malformed file
+MAX_RECORD_SIZE = 1 << 26
+TOKEN_LOOKAHEAD = 16  # Longer than any JSON token cut by the end of a chunk ("false", an escape, a number)
+
+_separators = re.compile(r"\s*,*\s*")
+
+
+def open_text(binary_stream):
+    """
+    Wraps a binary stream (file opened with "rb", io.BytesIO, ...) for the readers in this module
+    :param binary_stream: Binary stream
+    :return: Text stream, decoding UTF-8 with or without a byte order mark
+    """
+    return io.TextIOWrapper(binary_stream, encoding="utf-8-sig")
+
+
+COMPRESSIONS = {".gz": gzip.open, ".xz": lzma.open}
+MAGIC_NUMBERS = {b"\x1f\x8b": gzip.open, b"\xfd7zXZ\x00": lzma.open}
+WRITE_BUFFER = 1 << 20
+ARROW_EXTENSION = ".arrow"
+
+
+def strip_compression(path):
+    """
+    :param path: File name or path
+    :return: The path without its .gz or .xz extension
+    """
+    for extension in COMPRESSIONS:
+        if path.endswith(extension):
+            return path[:-len(extension)]
+    return path
+
+
+def decompress(binary_stream):
+    """
+    :param binary_stream: Seekable binary stream, at its start
+    :return: Uncompressed stream of a gzip or xz compressed stream, the stream itself otherwise. Closing the
+             uncompressed stream leaves the compressed one open
+    """
+    head = binary_stream.read(max(len(magic) for magic in MAGIC_NUMBERS))
+    binary_stream.seek(0)
+    for magic, opener in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return opener(binary_stream, "rb")
+    return binary_stream
+
+
+def open_corpus(path):
+    """
+    Opens a corpus file for the readers in this module, uncompressing it if it is gzip or xz compressed
+    :param path: Path of the file
+    :return: Text stream
+    """
+    with open(path, "rb") as f:
+        head = f.read(max(len(magic) for magic in MAGIC_NUMBERS))
+    for magic, opener in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return open_text(opener(path, "rb"))
+    return open_text(open(path, "rb"))
+
+
+def iter_sentences(path):
+    """
+    Streams the sentences of a corpus file, in any of the formats of this module or an Arrow corpus
+    :param path: Path of the file
+    :return: Generator of sentence dictionaries in our main JSON format
+    """
+    if is_arrow(path):
+        with ArrowCorpus(path) as corpus:
+            yield from corpus.sentences()
+        return
+    with open_corpus(path) as stream:
+        for record in iter_records(stream):
+            yield to_sentence(record)
+
+
+def iter_texts(path):
+    # Texts of the sentences of a corpus file, only the text column is read from Arrow corpora
+    if is_arrow(path):
+        with ArrowCorpus(path) as corpus:
+            yield from corpus.texts()
+        return
+    for sentence in iter_sentences(path):
+        yield sentence["text"]
+
+
+def iter_records(stream, chunk_size=CHUNK_SIZE):
+    """
+    Yields the records of a JSONL file or of a JSON array, one at a time
+    :param stream: Text stream
+    :param chunk_size: Number of characters read at a time
+    :return: Generator of records
+    """
+    head = stream.read(chunk_size)
+    while head and not head.strip():  # Leading whitespace longer than a chunk
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        head += chunk
+    stripped = head.lstrip()
+    if stripped.startswith("["):
+        yield from _iter_array(stream, stripped[1:], chunk_size)
+    else:
+        yield from _iter_lines(stream, head, chunk_size)
+
+
+def _iter_lines(stream, buffer, chunk_size):
+    # Only the new chunk is searched for line ends, and a line cut by the end of a chunk is kept as a list of parts,
+    # joined once its end is read, so a long line costs its length once
+    partial = []
+    partial_size = 0
+    chunk = buffer
+    while True:
+        lines = chunk.split("\n")
+        if len(lines) > 1 and partial:
+            lines[0] = "".join(partial) + lines[0]
+            partial = []
+            partial_size = 0
+        last = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        if last:
+            partial.append(last)
+            partial_size += len(last)
+            if partial_size > MAX_RECORD_SIZE:
+                raise ValueError(f"Line of more than {MAX_RECORD_SIZE} characters in JSONL file")
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            line = "".join(partial)
+            if line.strip():
+                yield json.loads(line)
+            return
+
+
+def _iter_array(stream, buffer, chunk_size):
+    # Records are decoded in place from an offset into the buffer, which is only trimmed when a chunk is added
+    decoder = json.JSONDecoder()
+    position = 0
+    eof = False
+    while True:
+        position = _separators.match(buffer, position).end()
+        if buffer.startswith("]", position):
+            return
+        try:
+            if position == len(buffer):
+                raise json.JSONDecodeError("Expecting value", buffer, position)
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if not _incomplete(e):
+                raise ValueError(f"Malformed record in JSON array: {e}")
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            if len(buffer) - position > MAX_RECORD_SIZE:
+                raise ValueError(f"Record of more than {MAX_RECORD_SIZE} characters in JSON array")
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield record
+
+
+def _incomplete(error):
+    # Decoding errors that more data can fix: an open string, or an error close to the end of what was read
+    return error.msg.startswith("Unterminated string") or len(error.doc) - error.pos <= TOKEN_LOOKAHEAD
+
+
+def sift_direction(pred):
+    """
+    Removes the "(s)" suffix of a SIFT predicate, so "increase(s)" and "decrease(s)" become the directions
+    "increase" and "decrease". The other predicates ("harm(s)", "type-of", ...) have no direction of ours, and are
+    kept as they are without their suffix ("harm", "type-of")
+    :param pred: SIFT predicate
+    :return: The predicate without its "(s)" suffix
+    """
+    if pred.endswith("(s)"):
+        pred = pred[:-3]
+    return pred
+
+
+HABITUS_GROUND_TRUTH = "Ground truth"
+
+
+def _sign(direction):
+    direction = direction.strip().lower()
+    if direction.startswith("inc"):
+        return 1
+    if direction.startswith("dec"):  # "decrease", "decreases", and the "decease" typo of the files
+        return -1
+    return 0
+
+
+def habitus_direction(direction_head, direction_tail):
+    """
+    Converts the directions of the head and tail of a habitus relation to a direction: the tail increases when it
+    moves the same way as the head
+    :param direction_head: Direction of the head
+    :param direction_tail: Direction of the tail
+    :return: "increase", "decrease", or the tail direction as it is if either direction is not one of those
+    """
+    sign = _sign(direction_head) * _sign(direction_tail)
+    if sign == 0:
+        return direction_tail
+    return "increase" if sign > 0 else "decrease"
+
+
+def habitus_relations(relations):
+    return [{"src": relation["head"], "tgt": relation["tail"],
+             "direction": habitus_direction(relation["direction_head"], relation["direction_tail"])}
+            for relation in relations]
+
+
+def to_sentence(record):
+    """
+    Converts a record to our main JSON format
+    :param record: Record in our main JSON format, in the SIFT format or in the habitus format
+    :return: Sentence dictionary, with the model outputs under "LLM" for the habitus format
+    """
+    if "passage" in record:
+        models = {model["model_name"]: habitus_relations(model["rels"]) for model in record.get("rels", [])}
+        sentence = {"text": record["passage"],
+                    "causal relations": models.pop(HABITUS_GROUND_TRUTH, []),
+                    "meta_data": {"title": "", "authors": "", "year": ""}}
+        if models:
+            sentence["LLM"] = models
+        return sentence
+    if "premise" in record:
+        relations = [{"src": hypothesis["subj"], "tgt": hypothesis["obj"],
+                      "direction": sift_direction(hypothesis["pred"])}
+                     for hypothesis in record.get("hypotheses", [])]
+        return {"text": record["premise"],
+                "causal relations": relations,
+                "meta_data": {"title": "", "authors": "", "year": ""}}
+    sentence = {"text": record["text"],
+                "causal relations": record.get("causal relations", []),
+                "meta_data": record.get("meta_data", {"title": "", "authors": "", "year": ""})}
+    if "LLM" in record:
+        sentence["LLM"] = record["LLM"]
+    return sentence
+
+
+def _as_json(record):
+    return record.to_dict() if isinstance(record, Passage) else record
+
+
+def encode(record, indent=False):
+    """
+    :param record: JSON serializable record or Passage
+    :param indent: Indent like json.dumps(indent=2), otherwise compact
+    :return: UTF-8 JSON bytes
+    """
+    record = _as_json(record)
+    if indent:  # Same bytes as the json.dumps(indent=2) files made so far
+        return json.dumps(record, indent=2).encode("utf-8")
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RecordWriter:
+    """
+    Writes records to a binary stream one at a time, so that several outputs can be filled in the same pass (see
+    split.py). finish() ends the JSON array, close() also closes the stream.
+    :param f: Binary stream
+    :param jsonl: JSONL instead of a JSON array
+    :param compact: One compact record per line in JSON arrays, otherwise indented like json.dumps(indent=2)
+    """
+
+    def __init__(self, f, jsonl=False, compact=False):
+        self.f = f
+        self.jsonl = jsonl
+        self.compact = compact
+        self.count = 0
+        self.finished = False
+
+    def write(self, record):
+        if self.jsonl:
+            self.f.write(encode(record) + b"\n")
+        elif self.compact:
+            self.f.write((b",\n" if self.count else b"[\n") + encode(record))
+        else:
+            self.f.write((b",\n  " if self.count else b"[\n  ") + encode(record, True).replace(b"\n", b"\n  "))
+        self.count += 1
+
+    def finish(self):
+        if not self.jsonl and not self.finished:
+            self.f.write(b"\n]" if self.count else b"[]")
+        self.finished = True
+
+    def close(self):
+        self.finish()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_json_array(records, f, compact=False):
+    """
+    :param records: Records or Passages
+    :param f: Binary stream
+    :param compact: One compact record per line, otherwise indented like json.dumps(indent=2)
+    """
+    writer = RecordWriter(f, compact=compact)
+    for record in records:
+        writer.write(record)
+    writer.finish()
+
+
+def write_jsonl(records, f):
+    writer = RecordWriter(f, jsonl=True)
+    for record in records:
+        writer.write(record)
+
+
+def open_output(path):
+    """
+    :param path: Output path, compressed if it ends with one of COMPRESSIONS
+    :return: (buffered binary stream, path without the compression extension)
+    """
+    for extension, opener in COMPRESSIONS.items():
+        if path.endswith(extension):
+            return io.BufferedWriter(opener(path, "wb"), WRITE_BUFFER), path[:-len(extension)]
+    return open(path, "wb", buffering=WRITE_BUFFER), path
+
+
+def open_writer(path, compact=False):
+    """
+    :param path: Output path, JSONL if its name ends with .jsonl and a JSON array otherwise, compressed if it ends
+                 with .gz or .xz. Passages can also be written to an Arrow corpus (.arrow), which can't be compressed
+    :param compact: Compact JSON array instead of an indented one
+    :return: RecordWriter of the file, or ArrowWriter
+    """
+    if strip_compression(path).endswith(ARROW_EXTENSION):
+        if strip_compression(path) != path:
+            raise ValueError(f"Arrow corpora can't be compressed: {path}")
+        return ArrowWriter(path)
+    f, name = open_output(path)
+    return RecordWriter(f, name.endswith(".jsonl"), compact)
+
+
+def write_records(records, path, compact=False):
+    """
+    Streams records to a file, JSONL if its name ends with .jsonl and a JSON array otherwise, compressed if it ends
+    with .gz or .xz. Passages can also be written to an Arrow corpus (.arrow)
+    :param records: Records or Passages
+    :param path: Output path
+    :param compact: Compact JSON array instead of an indented one
+    """
+    with open_writer(path, compact) as writer:
+        for record in records:
+            writer.write(record)
@@ -0,0 +1,205 @@
+import json
+import sys
+try:
+    import orjson
+except ImportError:  # orjson only makes the codecs faster, the standard json module is used without it
+    orjson = None
+"""
+Data model of a labeled corpus, used by the UI and by the conversion scripts.
+
+A Corpus is a list of Passages (the sentences of our main JSON format), and every Passage has a list of Relations.
+Records use __slots__, and the source, target and direction strings of relations are interned, so a relation costs
+one small object pointing at strings shared by the whole corpus (the same entities appear in many sentences).
+Every passage also keeps the set of its relation keys, so checking whether it already has a relation, or adding a
+relation without duplicating it, takes constant time.
+
+Our main JSON format is:
+[{"text": "", "causal relations": [{"src": "", "tgt": "", "direction": ""}], "meta_data": {...}, "LLM": {...}}]
+where "LLM" is optional and maps model names to lists of relations. Any other key of a sentence is kept as it is.
+Corpus.load() and Corpus.dump() read and write it, with orjson if it is installed (pip install orjson).
+"""
+
+RELATIONS_KEY = "causal relations"
+LLM_KEY = "LLM"
+EMPTY_META_DATA = {"title": "", "authors": "", "year": ""}
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Relation:
+    """
+    A causal relation, hashable and compared on (src, tgt, direction).
+    """
+    __slots__ = ("src", "tgt", "direction")
+
+    def __init__(self, src, tgt, direction):
+        self.src = _intern(src)
+        self.tgt = _intern(tgt)
+        self.direction = _intern(direction)
+
+    @property
+    def key(self):
+        return self.src, self.tgt, self.direction
+
+    def __eq__(self, other):
+        return isinstance(other, Relation) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Relation({self.src!r}, {self.tgt!r}, {self.direction!r})"
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["src"], data["tgt"], data["direction"])
+
+    def to_dict(self):
+        return {"src": self.src, "tgt": self.tgt, "direction": self.direction}
+
+
+def as_relation(relation):
+    return relation if isinstance(relation, Relation) else Relation.from_dict(relation)
+
+
+class Passage:
+    """
+    A sentence and its causal relations.
+    Relations are kept in the order they were labeled. A passage loaded from a file keeps the relations the file
+    has, duplicates included, while add() never adds a relation the passage already has.
+    :param text: Sentence text
+    :param relations: Relations or relation dictionaries
+    :param meta_data: Meta data dictionary, defaults to empty meta data
+    :param llm: {LLM: list of relations or relation dictionaries}
+    :param extra: Other keys of the sentence, written back as they are
+    """
+    __slots__ = ("text", "relations", "keys", "meta_data", "llm", "extra")
+
+    def __init__(self, text, relations=(), meta_data=None, llm=None, extra=None):
+        self.text = text
+        self.meta_data = meta_data if meta_data is not None else dict(EMPTY_META_DATA)
+        self.llm = {name: [as_relation(relation) for relation in outputs] for name, outputs in (llm or {}).items()}
+        self.extra = extra or {}
+        self.set_relations(relations)
+
+    def __contains__(self, relation):
+        return as_relation(relation).key in self.keys
+
+    def add(self, relation):
+        """
+        Adds a relation, unless the passage already has it
+        :param relation: Relation or relation dictionary
+        :return: True if the relation was added
+        """
+        relation = as_relation(relation)
+        if relation.key in self.keys:
+            return False
+        self.relations.append(relation)
+        self.keys.add(relation.key)
+        return True
+
+    def set_relations(self, relations):
+        # keys is replaced rather than cleared, so holders of the previous set keep the keys before the edit
+        self.relations = [as_relation(relation) for relation in relations]
+        self.keys = {relation.key for relation in self.relations}
+
+    def copy(self):
+        return Passage(self.text, self.relations, dict(self.meta_data), self.llm, json.loads(json.dumps(self.extra)))
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {key: value for key, value in data.items()
+                 if key not in ("text", RELATIONS_KEY, "meta_data", LLM_KEY)}
+        meta_data = data.get("meta_data")
+        return cls(data["text"], data.get(RELATIONS_KEY, ()), dict(meta_data) if meta_data is not None else None,
+                   data.get(LLM_KEY), extra)
+
+    def to_dict(self):
+        data = {"text": self.text,
+                RELATIONS_KEY: [relation.to_dict() for relation in self.relations],
+                "meta_data": dict(self.meta_data)}
+        if self.llm:
+            data[LLM_KEY] = {name: [relation.to_dict() for relation in outputs] for name, outputs in self.llm.items()}
+        data.update(self.extra)
+        return data
+
+
+def as_passage(passage):
+    return passage if isinstance(passage, Passage) else Passage.from_dict(passage)
+
+
+class Corpus:
+    """
+    An ordered list of passages.
+    :param passages: Passages or sentence dictionaries
+    """
+    __slots__ = ("passages",)
+
+    def __init__(self, passages=()):
+        self.passages = [as_passage(passage) for passage in passages]
+
+    def __len__(self):
+        return len(self.passages)
+
+    def __iter__(self):
+        return iter(self.passages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Corpus(self.passages[index])
+        return self.passages[index]
+
+    def append(self, passage):
+        self.passages.append(as_passage(passage))
+
+    def extend(self, passages):
+        self.passages.extend(as_passage(passage) for passage in passages)
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        :param data: List of sentences in our main JSON format
+        """
+        return cls(data)
+
+    def to_json(self):
+        return [passage.to_dict() for passage in self.passages]
+
+    @classmethod
+    def loads(cls, text):
+        """
+        :param text: str or bytes of a JSON file in our main JSON format
+        """
+        return cls.from_json(orjson.loads(text) if orjson is not None else json.loads(text))
+
+    def dumps(self, indent=None):
+        """
+        :param indent: Indentation of the JSON, orjson only supports 2
+        :return: JSON string
+        """
+        if orjson is not None and indent in (None, 2):
+            return orjson.dumps(self.to_json(), option=orjson.OPT_INDENT_2 if indent else 0).decode()
+        return json.dumps(self.to_json(), indent=indent)
+
+    @classmethod
+    def load(cls, file):
+        """
+        :param file: Path or open file of a JSON file in our main JSON format
+        """
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                return cls.loads(f.read())
+        return cls.loads(file.read())
+
+    def dump(self, file, indent=2):
+        """
+        :param file: Path or open text file
+        :param indent: Indentation of the JSON
+        """
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                f.write(self.dumps(indent))
+        else:
+            file.write(self.dumps(indent))
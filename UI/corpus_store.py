@@ -0,0 +1,422 @@
+import threading
+from contextlib import contextmanager
+from corpus_model import EMPTY_META_DATA, Passage, as_passage, as_relation
+from alignment import align
+from matching import RelationMatcher
+from scoring import ScoringEngine, relation_sets
+"""
+Server-side storage for the labeled corpus.
+
+Before this module existed, the whole corpus lived in a dcc.Store in the browser and was a State or Output of almost
+every callback, meaning every Next/Back keypress uploaded and downloaded the entire paper. Now the corpus lives on
+the server, keyed by a session id that the browser keeps in localStorage, and callbacks only read or write the
+sentence they are working on.
+
+Every sentence is stored as a Passage (see corpus_model.py), which knows the set of its relation keys. Writes take
+sentences as Passages or as dictionaries in our main JSON format, and reads return dictionaries, so callbacks never
+hold a reference to a stored Passage.
+Next to the sentences, each session keeps their relations prepared for matching (see matching.py) and a
+ScoringEngine, so the LLM metrics follow every edit of the ground truth without rescoring the corpus, and the LLM
+comparison table of every sentence (see alignment.py), which is built when the sentence is added and dropped when its
+ground truth is edited.
+
+With a backend (see state_backend.py), the store is a cache of the backend's sessions. Every write is applied to the
+cached session and written through to the backend, as a change of the sentence it touches, while holding the
+backend's lock, and the change is also logged with the new revision. When another worker wrote to a session, the
+cached copy replays the logged changes since its revision, so following an edit made elsewhere costs what the edit
+cost. The session is only reloaded as a whole when its copy is further behind than the log goes back (see
+CHANGE_LOG_LENGTH in state_backend.py), e.g. the first time a worker sees a session with a long history. The cached
+session keeps the backend id of every sentence for that purpose.
+Each session has its own lock, so the threads of a worker only wait for each other on the same session (the SQLite
+backend still has one writer at a time, for the short transaction of each write).
+
+Cost of an edit of one sentence (its relations, or the sentence itself), for a session of N sentences:
+- in the worker making it: the size of the sentence, for the rescoring and the backend write. Inserting or removing a
+  sentence before the end also shifts the lists of the session, a memmove of N pointers
+- in every other worker, on its next callback for the session: the same, as it replays the change. After an insert
+  or a removal before the end, the first change it replays by sentence id also rebuilds the map of ids to indexes,
+  O(N) once
+- O(N), a reload, only for a copy more than CHANGE_LOG_LENGTH revisions behind
+Every callback also reads the revision of the session from the backend, one indexed query.
+"""
+
+def new_sentence(text, relations=None, meta_data=None):
+    """
+    Builds a sentence
+    :param text: Sentence text
+    :param relations: List of causal relations, defaults to no relations
+    :param meta_data: Meta data dictionary, defaults to empty meta data
+    :return: Passage
+    """
+    return Passage(text, relations or (), meta_data)
+
+
+class CorpusStore:
+    """
+    Corpus storage shared by every callback of the Dash app.
+
+    Each session has a list of passages, their prepared ground truth and LLM relations, their comparison tables, a
+    scoring engine and a revision counter. The revision is bumped on every write, and is what the browser receives
+    instead of the corpus itself, so that callbacks depending on the corpus still get triggered.
+    Indexes follow python list semantics (-1 is the last sentence).
+    :param backend: State backend (see state_backend.py), None to keep sessions in memory only
+    :param matcher: RelationMatcher used to score and align the LLM outputs (see matching.py), normalized by default
+    """
+
+    def __init__(self, backend=None, matcher=None):
+        self.backend = backend
+        self.matcher = matcher if matcher is not None else RelationMatcher()
+        self._sessions = {}
+        self._locks = {}  # One lock per session, so sessions never wait for each other
+        self._locks_lock = threading.Lock()
+
+    def _session_lock(self, session_id):
+        with self._locks_lock:
+            if session_id not in self._locks:
+                self._locks[session_id] = threading.RLock()
+            return self._locks[session_id]
+
+    def _session(self, session_id):
+        if session_id not in self._sessions:
+            self._sessions[session_id] = {"sentences": [], "ids": [], "positions": {}, "gold": [], "outputs": [],
+                                          "alignments": [], "scoring": ScoringEngine(self.matcher),
+                                          "revision": 0, "changes": [], "status": None}
+        return self._sessions[session_id]
+
+    def _reload(self, session_id):
+        # Loads the whole session from the backend, the relation sets and scores are rebuilt from the sentences
+        session = self._session(session_id)
+        revision, ids, sentences = self.backend.load(session_id)
+        self._reset(session)
+        self._place(session, 0, [Passage.from_dict(sentence) for sentence in sentences], ids, aligned=False)
+        session["revision"] = revision
+
+    def _refresh(self, session_id):
+        # Brings the cached session up to the backend's revision, replaying the changes other workers logged since
+        if self.backend is None:
+            return
+        session = self._session(session_id)
+        revision = self.backend.revision(session_id)
+        if session["revision"] == revision:
+            return
+        log = self.backend.changes(session_id, session["revision"]) if session["revision"] < revision else None
+        if log is None:  # The log doesn't go back to the cached revision
+            self._reload(session_id)
+            return
+        try:
+            for revision, changes in log:
+                for change in changes:
+                    self._apply(session, change)
+                session["revision"] = revision
+        except (KeyError, IndexError):  # A change the cached session can't follow, start over from the backend
+            self._reload(session_id)
+
+    def _apply(self, session, change):
+        # Applies a change logged by another worker (see the write methods) to the cached session
+        kind = change["change"]
+        if kind == "insert":
+            before = change["before"]
+            index = len(session["sentences"]) if before is None else self._index(session, before)
+            self._place(session, index, [Passage.from_dict(sentence) for sentence in change["sentences"]],
+                        change["ids"], aligned=False)
+        elif kind == "delete":
+            self._remove(session, self._index(session, change["id"]))
+        elif kind == "relations":
+            index = self._index(session, change["id"])
+            session["sentences"][index].set_relations(change["relations"])
+            self._rescore(session, index)
+        elif kind == "meta_data":
+            for sentence_id in change["ids"]:
+                session["sentences"][self._index(session, sentence_id)].meta_data = dict(change["meta_data"])
+        elif kind == "clear":
+            self._reset(session)
+        else:
+            raise KeyError(kind)
+
+    def _index(self, session, sentence_id):
+        # Index of a sentence from its backend id. The map is rebuilt after sentences were inserted or removed before
+        # the end of the corpus, appends keep it up to date
+        if session["positions"] is None:
+            session["positions"] = {sentence_id: i for i, sentence_id in enumerate(session["ids"])}
+        return session["positions"][sentence_id]
+
+    def _place(self, session, index, passages, ids, aligned=True):
+        # Inserts passages at an index, with their relation sets, scores, comparison tables and backend ids
+        prepared = [relation_sets(passage, self.matcher) for passage in passages]
+        session["scoring"].add_sentences(prepared)
+        appended = index == len(session["sentences"])
+        session["sentences"][index:index] = passages
+        session["gold"][index:index] = [gold for gold, _ in prepared]
+        session["outputs"][index:index] = [outputs for _, outputs in prepared]
+        # Sentences added by another worker are aligned when they are looked at
+        session["alignments"][index:index] = [align(passage, self.matcher) if aligned else None
+                                              for passage in passages]
+        if self.backend is None:
+            return
+        session["ids"][index:index] = ids
+        if not appended:
+            session["positions"] = None
+        elif session["positions"] is not None:
+            session["positions"].update((sentence_id, index + i) for i, sentence_id in enumerate(ids))
+
+    def _remove(self, session, index):
+        # Removes the sentence at an index, returns its Passage
+        passage = session["sentences"].pop(index)
+        session["scoring"].remove_sentence(session["gold"].pop(index), session["outputs"].pop(index))
+        session["alignments"].pop(index)
+        if self.backend is not None:
+            last = index in (-1, len(session["ids"]) - 1)
+            sentence_id = session["ids"].pop(index)
+            if not last:
+                session["positions"] = None
+            elif session["positions"] is not None:
+                del session["positions"][sentence_id]
+        return passage
+
+    def _reset(self, session):
+        session["sentences"] = []
+        session["ids"] = []
+        session["positions"] = {}
+        session["gold"] = []
+        session["outputs"] = []
+        session["alignments"] = []
+        session["scoring"].clear()
+
+    def _rescore(self, session, index):
+        # Updates the scores and drops the comparison table of a sentence whose ground truth was edited
+        gold = self.matcher.prepare(session["sentences"][index].relations)
+        session["scoring"].replace_gold(session["gold"][index], gold, session["outputs"][index])
+        session["gold"][index] = gold
+        session["alignments"][index] = None
+
+    def _log(self, session, kind, **change):
+        # Change of the current write, written to the backend's change log with the new revision (see _writing)
+        if self.backend is not None:
+            session["changes"].append(dict(change, change=kind))
+
+    @contextmanager
+    def _reading(self, session_id):
+        with self._session_lock(session_id):
+            self._refresh(session_id)
+            yield self._session(session_id)
+
+    @contextmanager
+    def _writing(self, session_id):
+        with self._session_lock(session_id):
+            if self.backend is None:
+                yield self._session(session_id)
+                return
+            with self.backend.locked(session_id):
+                self._refresh(session_id)
+                session = self._session(session_id)
+                revision = session["revision"]
+                session["changes"] = []
+                try:
+                    yield session
+                except BaseException:
+                    del self._sessions[session_id]  # The cached copy may be half written, reload it next time
+                    raise
+                if session["revision"] != revision:
+                    self.backend.set_revision(session_id, session["revision"], session["changes"])
+
+    def _bump(self, session_id):
+        session = self._session(session_id)
+        session["revision"] += 1
+        return session["revision"]
+
+    def revision(self, session_id):
+        with self._reading(session_id) as session:
+            return session["revision"]
+
+    def length(self, session_id):
+        with self._reading(session_id) as session:
+            return len(session["sentences"])
+
+    def sentence(self, session_id, index):
+        with self._reading(session_id) as session:
+            return session["sentences"][index].to_dict()
+
+    def text(self, session_id, index):
+        with self._reading(session_id) as session:
+            return session["sentences"][index].text
+
+    def texts(self, session_id, start, stop):
+        """
+        Texts of a slice of the corpus, for views that only show part of it
+        :param session_id: Session id
+        :param start: First index
+        :param stop: Index after the last one
+        :return: List of texts
+        """
+        with self._reading(session_id) as session:
+            return [passage.text for passage in session["sentences"][start:stop]]
+
+    def window(self, session_id, start, stop):
+        """
+        Texts and relations of a slice of the corpus, what the browser needs to navigate it (see load_window)
+        :param session_id: Session id
+        :param start: First index
+        :param stop: Index after the last one
+        :return: List of {"text", "causal relations"}
+        """
+        with self._reading(session_id) as session:
+            return [{"text": passage.text, "causal relations": [relation.to_dict() for relation in passage.relations]}
+                    for passage in session["sentences"][start:stop]]
+
+    def relations(self, session_id, index):
+        with self._reading(session_id) as session:
+            return [relation.to_dict() for relation in session["sentences"][index].relations]
+
+    def add_relation(self, session_id, index, relation):
+        """
+        Adds a relation to a sentence, unless the sentence already has it
+        :param session_id: Session id
+        :param index: Sentence index
+        :param relation: Relation dictionary
+        :return: True if the relation was added
+        """
+        with self._writing(session_id) as session:
+            passage = session["sentences"][index]
+            relation = as_relation(relation)
+            if relation in passage:  # checking if it's a duplicate
+                return False
+            passage.add(relation)
+            self._rescore(session, index)
+            if self.backend is not None:
+                sentence_id = session["ids"][index]
+                self.backend.add_relation(session_id, sentence_id, relation.to_dict())
+                self._log(session, "relations", id=sentence_id,
+                          relations=[relation.to_dict() for relation in passage.relations])
+            self._bump(session_id)
+            return True
+
+    def set_relations(self, session_id, index, relations):
+        with self._writing(session_id) as session:
+            passage = session["sentences"][index]
+            passage.set_relations(relations)
+            self._rescore(session, index)
+            relations = [relation.to_dict() for relation in passage.relations]
+            if self.backend is not None:
+                sentence_id = session["ids"][index]
+                self.backend.set_relations(session_id, sentence_id, relations)
+                self._log(session, "relations", id=sentence_id, relations=relations)
+            return self._bump(session_id)
+
+    def extend(self, session_id, sentences):
+        with self._writing(session_id) as session:
+            passages = [as_passage(sentence).copy() for sentence in sentences]
+            if not passages:
+                return session["revision"]
+            ids = []
+            if self.backend is not None:
+                data = [passage.to_dict() for passage in passages]
+                ids = self.backend.insert_sentences(session_id, None, data)
+                self._log(session, "insert", before=None, ids=ids, sentences=data)
+            self._place(session, len(session["sentences"]), passages, ids)
+            return self._bump(session_id)
+
+    def insert(self, session_id, index, sentence):
+        with self._writing(session_id) as session:
+            length = len(session["sentences"])
+            index = max(0, min(index + length if index < 0 else index, length))  # Same as list.insert
+            passage = as_passage(sentence).copy()
+            ids = []
+            if self.backend is not None:
+                before = session["ids"][index] if index < length else None
+                data = [passage.to_dict()]
+                ids = self.backend.insert_sentences(session_id, before, data)
+                self._log(session, "insert", before=before, ids=ids, sentences=data)
+            self._place(session, index, [passage], ids)
+            return self._bump(session_id)
+
+    def pop(self, session_id, index):
+        with self._writing(session_id) as session:
+            if self.backend is not None:
+                sentence_id = session["ids"][index]
+                self.backend.delete_sentence(session_id, sentence_id)
+                self._log(session, "delete", id=sentence_id)
+            passage = self._remove(session, index)
+            self._bump(session_id)
+            return passage.to_dict()
+
+    def metrics(self, session_id):
+        """
+        Precision, recall, F1 and accuracy of every LLM in the session's corpus
+        :param session_id: Session id
+        :return: {LLM: {"precision": float, "recall": float, "F1": float, "accuracy": float}}
+        """
+        with self._reading(session_id) as session:
+            return session["scoring"].metrics()
+
+    def alignment(self, session_id, index):
+        """
+        LLM comparison table of a sentence, aligned again only if its ground truth changed since it was last built
+        :param session_id: Session id
+        :param index: Sentence index
+        :return: {"columns", "rows"} of the table, see alignment.align
+        """
+        with self._reading(session_id) as session:
+            table = session["alignments"][index]
+            if table is None:
+                table = session["alignments"][index] = align(session["sentences"][index], self.matcher)
+            return {"columns": [dict(column) for column in table["columns"]],
+                    "rows": [dict(row) for row in table["rows"]]}
+
+    def fill_meta_data(self, session_id, meta_data):
+        """
+        Sets the meta data of every sentence that does not have any yet (newly uploaded sentences)
+        :param session_id: Session id
+        :param meta_data: Meta data dictionary
+        :return: New revision, or the current one if every sentence already had meta data
+        """
+        with self._writing(session_id) as session:
+            filled = []
+            for i, passage in enumerate(session["sentences"]):
+                if passage.meta_data == EMPTY_META_DATA:
+                    passage.meta_data = dict(meta_data)
+                    filled.append(i)
+            if not filled:  # Nothing written, other workers and clients have nothing to update
+                return session["revision"]
+            if self.backend is not None:
+                ids = [session["ids"][i] for i in filled]
+                self.backend.set_meta_data(session_id, ids, meta_data)
+                self._log(session, "meta_data", ids=ids, meta_data=dict(meta_data))
+            return self._bump(session_id)
+
+    def set_status(self, session_id, status):
+        """
+        Saves the status of the session's background job (see ingest.py)
+        :param session_id: Session id
+        :param status: JSON serializable status dictionary
+        """
+        if self.backend is not None:
+            self.backend.set_status(session_id, dict(status))
+            return
+        with self._session_lock(session_id):
+            self._session(session_id)["status"] = dict(status)
+
+    def status(self, session_id):
+        if self.backend is not None:
+            return self.backend.status(session_id)
+        with self._session_lock(session_id):
+            status = self._session(session_id)["status"]
+            return dict(status) if status is not None else None
+
+    def export(self, session_id):
+        if self.backend is not None:
+            return self.backend.export(session_id)
+        with self._session_lock(session_id):
+            return [passage.to_dict() for passage in self._session(session_id)["sentences"]]
+
+    def clear(self, session_id):
+        """
+        Starts a new, empty corpus for a session. With a backend, the previous corpus is kept there
+        :param session_id: Session id
+        :return: New revision
+        """
+        with self._writing(session_id) as session:
+            self._reset(session)
+            if self.backend is not None:
+                self.backend.clear(session_id)
+                self._log(session, "clear")
+            return self._bump(session_id)
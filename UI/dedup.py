@@ -0,0 +1,267 @@
+import argparse
+import json
+import re
+import zlib
+from itertools import islice
+import numpy as np
+from corpus_io import iter_texts
+from pipeline import read_passages, run
+"""
+Detection and merging of duplicate and near-duplicate passages, within and across corpora.
+
+Corpora repeat passages: SIFT_data_2024_03.jsonl of Fine_Tuning/LLM_data has a passage twice, word for word, and
+"OSW_Copping et al 2020 labelled.json" has one both with and without its section heading in front. Training on such a
+corpus trains twice on the same passages, and a split can leak them between the training and testing sets. Passages
+that differ by a single word reach the default threshold too (the Winograd style pairs of
+habitus_p2_assets_sift.json, "... because it's too small" / "... too large"), check the report before merging those.
+
+Every passage gets a MinHash signature of the word trigrams of its normalized text (lowercased, punctuation and
+repeated whitespace removed), whose agreement with another signature estimates the Jaccard similarity of their
+trigrams. Signatures are cut in bands, and passages sharing a band are candidates (locality sensitive hashing):
+candidates are found by sorting the band hashes, so the cost grows with N log N rather than with the number of pairs.
+Candidates whose estimated similarity reaches the threshold are duplicates, and clusters of duplicates are kept as
+their first passage, with the relations of the cluster merged by the merge policy:
+- union: the relations of every copy, without repeats
+- first: the relations of the first copy only
+- most: the relations of the copy that has the most
+
+The input files are streamed three times: to compute the signatures, to collect the passages of the clusters, and to
+write the output. Only the signatures (num_perm 32 bit integers per passage) and the clusters stay in memory.
+
+Run from the UI folder:
+    python dedup.py ../Fine_Tuning/LLM_data/habitus_p2_assets.json ../Fine_Tuning/LLM_data/habitus_p2_assets_sift.json
+        -o habitus.json --dedup-report habitus_duplicates.json
+convert.py --dedup does the same before its transforms.
+"""
+
+NUM_PERM = 64
+BANDS = 16
+DEFAULT_THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+MERGE_POLICIES = ("union", "first", "most")
+CHUNK_SIZE = 1024
+SEED = 495
+PRIME = 4294967291  # Largest prime below 2 ** 32, so that a * x + b fits in 64 bits
+
+_word = re.compile(r"\w+")
+
+
+def shingles(text):
+    """
+    :param text: Passage text
+    :return: Set of the word trigrams of the normalized text, the whole text for shorter passages
+    """
+    words = _word.findall(text.casefold())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures, computed for batches of passages with NumPy.
+    :param num_perm: Length of the signatures
+    :param seed: Seed of the hash functions, signatures are only comparable with the same seed
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=SEED):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signatures(self, texts):
+        """
+        :param texts: Passage texts
+        :return: (len(texts), num_perm) uint32 array
+        """
+        hashes = [np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)), dtype=np.uint64)
+                  for text in texts]
+        if not hashes:
+            return np.zeros((0, self.num_perm), dtype=np.uint32)
+        starts = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+        permuted = (np.concatenate(hashes)[:, None] * self.a + self.b) % PRIME
+        return np.minimum.reduceat(permuted, starts, axis=0).astype(np.uint32)
+
+
+def similarity(signatures, first, second):
+    # Estimated Jaccard similarity of the passages of every (first[i], second[i]) pair
+    return (signatures[first] == signatures[second]).mean(axis=1)
+
+
+def candidate_pairs(signatures, bands=BANDS):
+    """
+    Pairs of passages that share a band of their signatures, each passage is paired with the first passage sharing
+    the band
+    :param signatures: (N, num_perm) array
+    :param bands: Number of bands, num_perm must be a multiple of it
+    :return: (first, second) arrays of passage indexes, first < second
+    """
+    rows = signatures.shape[1] // bands
+    firsts, seconds = [], []
+    for band in range(bands):
+        key = np.zeros(len(signatures), dtype=np.uint64)
+        for column in signatures[:, band * rows:(band + 1) * rows].T.astype(np.uint64):
+            key = key * np.uint64(1000003) ^ column  # Wraps around, which is fine for a hash
+        order = np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        new_group = np.concatenate(([True], sorted_key[1:] != sorted_key[:-1]))
+        group_first = order[np.flatnonzero(new_group)][np.cumsum(new_group) - 1]
+        duplicate = ~new_group
+        firsts.append(group_first[duplicate])
+        seconds.append(order[duplicate])
+    # Duplicates usually share several bands, every pair is kept once
+    pairs = np.unique(np.concatenate(firsts) * len(signatures) + np.concatenate(seconds))
+    return pairs // len(signatures), pairs % len(signatures)
+
+
+def clusters(signatures, threshold=DEFAULT_THRESHOLD, bands=BANDS):
+    """
+    Groups near-duplicate passages
+    :param signatures: (N, num_perm) array
+    :param threshold: Lowest estimated similarity of duplicates
+    :param bands: Number of LSH bands
+    :return: Array of the cluster of every passage, the index of its first passage
+    """
+    first, second = candidate_pairs(signatures, bands)
+    keep = np.concatenate([similarity(signatures, first[i:i + CHUNK_SIZE], second[i:i + CHUNK_SIZE]) >= threshold
+                           for i in range(0, len(first), CHUNK_SIZE)] or [np.zeros(0, dtype=bool)])
+    parent = list(range(len(signatures)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in zip(first[keep].tolist(), second[keep].tolist()):
+        i, j = root(i), root(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)  # The first passage is the root of its cluster
+    return np.array([root(i) for i in range(len(signatures))], dtype=np.int64)
+
+
+def merge(passages, policy="union"):
+    """
+    :param passages: Passages of a cluster, the first one is kept
+    :param policy: One of MERGE_POLICIES
+    :return: Merged passage
+    """
+    kept = passages[0].copy()
+    if policy == "union":
+        for passage in passages[1:]:
+            for relation in passage.relations:
+                kept.add(relation)
+    elif policy == "most":
+        kept.set_relations(max(passages, key=lambda passage: len(passage.relations)).relations)
+    elif policy != "first":
+        raise ValueError(f"Unknown merge policy {policy}, expected one of {', '.join(MERGE_POLICIES)}")
+    return kept
+
+
+class Deduplicator:
+    """
+    Finds the duplicates of a set of files, then streams their merged passages.
+    :param paths: Paths of the input files
+    :param threshold: Lowest estimated similarity of duplicates
+    :param policy: Merge policy of the relations, one of MERGE_POLICIES
+    :param num_perm: Length of the signatures
+    :param bands: Number of LSH bands
+    """
+
+    def __init__(self, paths, threshold=DEFAULT_THRESHOLD, policy="union", num_perm=NUM_PERM, bands=BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.paths = paths
+        self.policy = policy
+        self.files = []  # (path, number of passages)
+        hasher = MinHasher(num_perm)
+        chunks = []
+        for path in paths:
+            count = 0
+            texts = iter_texts(path)
+            while True:
+                chunk = list(islice(texts, CHUNK_SIZE))
+                if not chunk:
+                    break
+                chunks.append(hasher.signatures(chunk))
+                count += len(chunk)
+            self.files.append((path, count))
+        self.signatures = np.concatenate(chunks) if chunks else np.zeros((0, num_perm), dtype=np.uint32)
+        self.cluster = clusters(self.signatures, threshold, bands)
+        sizes = np.bincount(self.cluster, minlength=len(self.cluster))
+        self.members = np.flatnonzero(sizes[self.cluster] > 1)  # Passages of clusters of duplicates
+
+    def __len__(self):
+        return int((self.cluster == np.arange(len(self.cluster))).sum())
+
+    def _cluster_passages(self):
+        # Second pass over the files, the passages of every cluster of duplicates in input order
+        wanted = set(self.members.tolist())
+        grouped = {}
+        for ordinal, passage in enumerate(read_passages(self.paths)):
+            if ordinal in wanted:
+                grouped.setdefault(int(self.cluster[ordinal]), []).append((ordinal, passage))
+        return grouped
+
+    def passages(self, report=None):
+        """
+        Streams the passages without their duplicates
+        :param report: Path of the JSON report of the duplicates, None for no report
+        :return: Generator of Passages
+        """
+        grouped = self._cluster_passages()
+        if report is not None:
+            self.write_report(grouped, report)
+        for ordinal, passage in enumerate(read_passages(self.paths)):
+            cluster = int(self.cluster[ordinal])
+            if cluster != ordinal:
+                continue  # A later copy, merged into the first one
+            if cluster in grouped:
+                passage = merge([member for _, member in grouped[cluster]], self.policy)
+            yield passage
+
+    def location(self, ordinal):
+        for path, count in self.files:
+            if ordinal < count:
+                return path, ordinal
+            ordinal -= count
+        raise IndexError(ordinal)
+
+    def write_report(self, grouped, path):
+        report = {"passages": len(self.cluster), "kept": len(self), "duplicates": len(self.cluster) - len(self),
+                  "clusters": []}
+        for cluster, members in grouped.items():
+            entries = []
+            for ordinal, passage in members:
+                file, index = self.location(ordinal)
+                entries.append({"file": file, "index": index, "text": passage.text,
+                                "relations": len(passage.relations),
+                                "similarity": round(float(similarity(self.signatures, [cluster], [ordinal])[0]), 3)})
+            report["clusters"].append({"kept": entries[0], "duplicates": entries[1:]})
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def add_arguments(parser):
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Lowest estimated Jaccard similarity of duplicate passages")
+    parser.add_argument("--merge", choices=MERGE_POLICIES, default="union", help="How relations of copies are merged")
+    parser.add_argument("--dedup-report", help="JSON report of the duplicates")
+    return parser
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Removes duplicate and near-duplicate passages")
+    parser.add_argument("files", nargs="+", help="Input files, JSON or JSONL")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Output file, JSONL if it ends with .jsonl, compressed if it ends with .gz or .xz")
+    parser.add_argument("--compact", action="store_true", help="Compact JSON array, without indentation")
+    args = add_arguments(parser).parse_args()
+    deduplicator = Deduplicator(args.files, args.dedup_threshold, args.merge)
+    run(args.files, args.output, [], passages=deduplicator.passages(args.dedup_report), compact=args.compact)
+    print(f"{len(deduplicator.cluster)} passages, {len(deduplicator)} kept")
+
+
+if __name__ == '__main__':
+    main()
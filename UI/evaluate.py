@@ -0,0 +1,177 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+from corpus_io import iter_sentences
+from corpus_model import Passage
+from matching import DEFAULT_THRESHOLD, MODES, SIMILARITIES, RelationMatcher
+from scoring import ScoringEngine, compute_metrics, relation_sets
+"""
+Evaluates LLM outputs against the ground truth from the command line, without the UI.
+
+Every input file is a document, in our main JSON format with an "LLM" key, or in the habitus format of
+Fine_Tuning/LLM_data/habitus_p2_assets.json (JSON arrays and JSONL both work, see corpus_io.py), and a file given
+twice is evaluated once. Files are streamed in shards of sentences, which are scored on a pool of worker processes with
+the same matching as the UI (see matching.py), with at most two shards per worker in flight, and the confusion counts
+of the shards are summed.
+
+The metrics of every model, over all documents and per document, are written as JSON, or as CSV if the output file
+ends with .csv. Run from the UI folder:
+    python evaluate.py DashTest.json ../Fine_Tuning/LLM_data/habitus_p2_assets.json
+    python evaluate.py outputs/*.json --matching fuzzy --threshold 0.6 -o metrics.csv
+"""
+
+SHARD_SIZE = 1000
+ALL_DOCUMENTS = "ALL"
+CSV_COUNTS = ("TP", "FP", "TN", "FN")
+CSV_METRICS = ("precision", "recall", "F1", "accuracy")
+
+_matcher = None
+
+
+def _start_worker(mode, similarity, threshold):
+    global _matcher
+    _matcher = RelationMatcher(mode, similarity, threshold)
+
+
+def score_shard(shard):
+    """
+    Scores a shard of sentences, in a worker process
+    :param shard: (document, list of sentence dictionaries)
+    :return: (document, {model: confusion counts}, number of sentences)
+    """
+    document, sentences = shard
+    engine = ScoringEngine(_matcher)
+    engine.add_sentences([relation_sets(Passage.from_dict(sentence), _matcher) for sentence in sentences])
+    return document, engine.scores, len(sentences)
+
+
+def shards(paths, shard_size=SHARD_SIZE):
+    """
+    Streams the sentences of the input files in shards
+    :param paths: Paths of the input files
+    :param shard_size: Number of sentences per shard
+    :return: Generator of (document, list of sentence dictionaries)
+    """
+    for path in paths:
+        sentences = iter_sentences(path)
+        while True:
+            shard = list(islice(sentences, shard_size))
+            if not shard:
+                break
+            yield path, shard
+
+
+def add_counts(total, counts):
+    for model, scores in counts.items():
+        model_total = total.setdefault(model, {name: 0 for name in CSV_COUNTS})
+        for name in CSV_COUNTS:
+            model_total[name] += scores[name]
+
+
+def unique_paths(paths):
+    """
+    :param paths: Paths of the input files
+    :return: The paths without the ones naming a file given before
+    """
+    unique = {}
+    for path in paths:
+        unique.setdefault(os.path.abspath(path), path)
+    return list(unique.values())
+
+
+def score_shards(paths, matcher_args, workers, shard_size=SHARD_SIZE):
+    """
+    Scores the shards of the input files, on a process pool if workers > 1
+    :param paths: Paths of the input files
+    :param matcher_args: (mode, similarity, threshold) of the RelationMatcher
+    :param workers: Number of worker processes
+    :param shard_size: Number of sentences per shard
+    :return: Generator of the results of score_shard, in the order of the shards
+    """
+    if workers <= 1:
+        _start_worker(*matcher_args)
+        yield from map(score_shard, shards(paths, shard_size))
+        return
+    with Pool(workers, initializer=_start_worker, initargs=matcher_args) as pool:
+        pending = deque()
+        for shard in shards(paths, shard_size):
+            pending.append(pool.apply_async(score_shard, (shard,)))
+            if len(pending) >= 2 * workers:  # Reading waits for the workers, so memory stays bounded
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def evaluate(paths, matcher_args=("normalized", "jaccard", DEFAULT_THRESHOLD), workers=None, shard_size=SHARD_SIZE):
+    """
+    Evaluates every model of the input files
+    :param paths: Paths of the input files, a file given twice is evaluated once
+    :param matcher_args: (mode, similarity, threshold) of the RelationMatcher
+    :param workers: Number of worker processes, defaults to the number of CPUs, 1 to score in this process
+    :param shard_size: Number of sentences sent to a worker at a time
+    :return: {"sentences": int, "models": {model: counts and metrics},
+              "documents": {document: {"sentences": int, "models": {model: counts and metrics}}}}
+    """
+    paths = unique_paths(paths)
+    totals = {}
+    documents = {path: {"sentences": 0, "models": {}} for path in paths}
+    for document, counts, sentences in score_shards(paths, matcher_args, workers or os.cpu_count() or 1, shard_size):
+        add_counts(totals, counts)
+        add_counts(documents[document]["models"], counts)
+        documents[document]["sentences"] += sentences
+    for counts in [totals] + [document["models"] for document in documents.values()]:
+        for scores in counts.values():
+            scores.update(compute_metrics(scores))
+    return {"sentences": sum(document["sentences"] for document in documents.values()),
+            "models": totals,
+            "documents": documents}
+
+
+def to_csv(results):
+    """
+    :param results: Return value of evaluate
+    :return: CSV text, one row per document and model, the totals first with document ALL
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(("document", "model", "sentences") + CSV_COUNTS + CSV_METRICS)
+    rows = [(ALL_DOCUMENTS, results["sentences"], results["models"])]
+    rows += [(path, document["sentences"], document["models"]) for path, document in results["documents"].items()]
+    for document, sentences, models in rows:
+        for model, scores in models.items():
+            writer.writerow((document, model, sentences) + tuple(scores[name] for name in CSV_COUNTS) +
+                            tuple(round(scores[name], 4) for name in CSV_METRICS))
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluates LLM outputs against the ground truth")
+    parser.add_argument("files", nargs="+", help="Files in our main JSON format or in the habitus format")
+    parser.add_argument("--matching", choices=MODES, default="normalized", help="How relations are matched")
+    parser.add_argument("--similarity", choices=SIMILARITIES, default="jaccard", help="Span similarity of fuzzy matching")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Lowest similarity of a fuzzy match")
+    parser.add_argument("--workers", type=int, help="Number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Sentences sent to a worker at a time")
+    parser.add_argument("-o", "--output", help="Output .json or .csv file, JSON is printed if not given")
+    args = parser.parse_args()
+
+    results = evaluate(args.files, (args.matching, args.similarity, args.threshold), args.workers, args.shard_size)
+    if args.output is not None and args.output.endswith(".csv"):
+        data = to_csv(results)
+    else:
+        data = json.dumps(results, indent=2)
+    if args.output is None:
+        sys.stdout.write(data + "\n")
+    else:
+        with open(args.output, "w", newline="") as f:
+            f.write(data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import time
+from corpus_io import write_records
+from state_backend import SQLiteBackend
+"""
+Exports labeled corpora from the state database of the UI (see state_backend.py).
+
+Every edit made in the UI is saved in the database, and saving a download starts a new corpus without deleting the
+previous one, so any corpus can be exported again, even one whose download was lost.
+
+Run from the UI folder:
+    python export_annotations.py                        (lists the corpora)
+    python export_annotations.py --corpus 3 -o paper.json
+    python export_annotations.py --session <session id> -o current.json
+    python export_annotations.py --corpus 3 -o paper.jsonl.gz       (JSONL, gzip compressed, see corpus_io.py)
+"""
+
+
+def format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp)) if timestamp else "open"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports labeled corpora from the UI's state database")
+    parser.add_argument("--db", default="twosix_state.db", help="Path of the state database")
+    parser.add_argument("--corpus", type=int, help="Id of the corpus to export")
+    parser.add_argument("--session", help="Session whose current corpus is exported")
+    parser.add_argument("-o", "--output", help="Output JSON or JSONL file, .gz or .xz compressed, printed if not given")
+    parser.add_argument("--compact", action="store_true", help="Compact JSON array, without indentation")
+    args = parser.parse_args()
+
+    backend = SQLiteBackend(args.db)
+    if args.corpus is None and args.session is None:
+        print(f"{'id':>5}  {'session':<32}  {'created':<16}  {'closed':<16}  {'sentences':>9}  {'relations':>9}")
+        for corpus in backend.corpora():
+            print(f"{corpus['id']:>5}  {corpus['session']:<32}  {format_time(corpus['created']):<16}  "
+                  f"{format_time(corpus['closed']):<16}  {corpus['sentences']:>9}  {corpus['relations']:>9}")
+        return
+    if args.corpus is not None:
+        sentences = backend.export_corpus(args.corpus)
+    else:
+        sentences = backend.export(args.session)
+    if args.output is None:
+        print(json.dumps(sentences, indent=2))
+    else:
+        write_records(sentences, args.output, args.compact)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from arrow_corpus import ArrowCorpus
+from corpus_io import decompress, iter_records, open_text, to_sentence
+"""
+Background ingestion of large corpus files into the corpus store.
+
+A browser upload is decoded and parsed in one go inside the upload callback, which does not scale to corpora such as
+the SIFT data. Ingestion jobs instead consume a generator of sentences (a file read record by record, or the pages of
+PDFs being extracted, see pdf_ingest.py) in a background thread, appending sentences to the session's corpus in small
+batches and recording their progress in the store. The first batch is flushed as soon
+as the first record is parsed, so the first sentence can be labeled while the rest of the file is still loading.
+"""
+
+BATCH_SIZE = 500
+FLUSH_SECONDS = 0.5
+
+# Server-side files can only be loaded from inside this directory
+DATA_DIR = os.path.abspath(os.environ.get("TWOSIX_DATA_DIR", os.getcwd()))
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class IngestJob(threading.Thread):
+    """
+    Thread appending a stream of sentences to the corpus of one session.
+    Progress is saved with store.set_status() as {"name", "records", "progress", "done", "error", "size"}, where
+    progress is the fraction of the input processed so far.
+    :param sentences: Iterable of sentences in our main JSON format
+    :param progress: Function returning the fraction of the input processed so far
+    :param close: Function releasing the input, called once the job is done
+    :param size: Function returning the size of the input as text (e.g. "12 pages"), None while it is unknown
+    """
+
+    def __init__(self, store, session_id, sentences, name, progress, close=None, size=None):
+        super().__init__(daemon=True)
+        self.store = store
+        self.session_id = session_id
+        self.sentences = sentences
+        self.progress = progress
+        self.close = close
+        self.size = size
+        self.status = {"name": name, "records": 0, "progress": 0.0, "done": False, "error": None, "size": None}
+
+    def _flush(self, batch):
+        if batch:
+            self.store.extend(self.session_id, batch)
+        self.status["records"] += len(batch)
+        self.status["progress"] = 1.0 if self.status["done"] and not self.status["error"] else self.progress()
+        if self.size is not None:
+            self.status["size"] = self.size()
+        self.store.set_status(self.session_id, dict(self.status))
+
+    def run(self):
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            for sentence in self.sentences:
+                batch.append(sentence)
+                if (len(batch) >= BATCH_SIZE or self.status["records"] == 0
+                        or time.monotonic() - last_flush > FLUSH_SECONDS):
+                    self._flush(batch)
+                    batch = []
+                    last_flush = time.monotonic()
+        except (ValueError, KeyError, TypeError, OSError) as error:  # Malformed input, keep what was loaded so far
+            self.status["error"] = f"{type(error).__name__}: {error}"
+        finally:
+            self.status["done"] = True
+            self._flush(batch)
+            if self.close is not None:
+                self.close()
+
+
+def start_job(store, session_id, sentences, name, progress, close=None, size=None):
+    """
+    Starts appending sentences to a session's corpus in the background, unless that session is already loading some
+    :param store: CorpusStore
+    :param session_id: Session id
+    :param sentences: Iterable of sentences in our main JSON format, usually a generator reading a file
+    :param name: Name of the input, for the progress report
+    :param progress: Function returning the fraction of the input processed so far
+    :param close: Function releasing the input, called once the job is done or if it cannot start
+    :param size: Function returning the size of the input as text, None while it is unknown
+    :return: The started IngestJob, or None if the session already has a running job
+    """
+    with _jobs_lock:
+        if session_id in _jobs and _jobs[session_id].is_alive():
+            if close is not None:
+                close()
+            return None
+        job = IngestJob(store, session_id, sentences, name, progress, close, size)
+        _jobs[session_id] = job
+        store.set_status(session_id, dict(job.status))
+        job.start()
+        return job
+
+
+def start_ingest(store, session_id, binary_stream, total_bytes, name):
+    """
+    Starts streaming a JSONL or JSON array file, gzip or xz compressed or not, into a session's corpus
+    :param store: CorpusStore
+    :param session_id: Session id
+    :param binary_stream: Binary stream of the file, closed when the job is done
+    :param total_bytes: Size of the file, for the progress report
+    :param name: File name, for the progress report
+    :return: The started IngestJob, or None if the session already has a running job
+    """
+    stream = open_text(decompress(binary_stream))
+    sentences = (to_sentence(record) for record in iter_records(stream))
+    # The text stream reads ahead of the records, so this is an estimate. It is the position in the compressed file
+    # for compressed files
+    progress = lambda: min(binary_stream.tell() / total_bytes, 1.0) if total_bytes else 1.0
+
+    def close():
+        stream.close()
+        binary_stream.close()
+    return start_job(store, session_id, sentences, name, progress, close)
+
+
+def start_arrow_ingest(store, session_id, path, name):
+    """
+    Starts streaming a memory-mapped Arrow corpus (see arrow_corpus.py) into a session's corpus
+    :param store: CorpusStore
+    :param session_id: Session id
+    :param path: Path of the file
+    :param name: File name, for the progress report
+    :return: The started IngestJob, or None if the session already has a running job
+    """
+    corpus = ArrowCorpus(path)
+    progress = lambda: corpus.position / len(corpus) if len(corpus) else 1.0
+    return start_job(store, session_id, corpus.sentences(), name, progress, corpus.close)
+
+
+def open_server_file(path):
+    """
+    Opens a file of DATA_DIR for ingestion
+    :param path: Path, absolute or relative to DATA_DIR
+    :return: (binary stream, size in bytes)
+    """
+    path = os.path.abspath(os.path.join(DATA_DIR, path))
+    if os.path.commonpath([DATA_DIR, path]) != DATA_DIR:
+        raise PermissionError(f"{path} is outside of {DATA_DIR}")
+    return open(path, "rb"), os.path.getsize(path)
+
+
+def progress_text(status):
+    """
+    Formats an ingestion status for the UI
+    :param status: Status dictionary saved by an IngestJob
+    :return: Progress string
+    """
+    name = f"{status['name']} ({status['size']})" if status.get("size") else status["name"]
+    text = f"Loading {name}: {status['records']} sentences ({100 * status['progress']:.0f}%)"
+    if status["error"]:
+        return text + f", stopped: {status['error']}"
+    if status["done"]:
+        return f"Loaded {name}: {status['records']} sentences"
+    return text
@@ -0,0 +1,160 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from flask import Response, g, request
+"""
+Latency and payload instrumentation of the Dash callbacks.
+
+Every server callback is one POST to /_dash-update-component, so timing that request measures the callback. For
+every callback, the wall time of the request and the sizes of its JSON body (the inputs and states) and of its
+response (the outputs) are recorded in histograms, along with how often each component triggered it.
+
+The histograms are served in the Prometheus text format on /metrics, to local requests only:
+    curl http://127.0.0.1:8050/metrics
+Callbacks slower than TWOSIX_SLOW_CALLBACK_MS milliseconds are logged with their trigger and sizes, to the file
+TWOSIX_SLOW_CALLBACK_LOG if it is set, otherwise to stderr.
+
+With several worker processes (see serve.py), every worker keeps its own histograms, and /metrics reports the ones of
+the worker that answered, labeled with its pid.
+"""
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SIZE_BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+LOCAL_ADDRESSES = ("127.0.0.1", "::1", "localhost")
+
+slow_log = logging.getLogger("twosix.slow_callbacks")
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds, as Prometheus expects them.
+    :param bounds: Upper bounds of the buckets, in increasing order
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last bucket is +Inf
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.total}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+
+class CallbackMetrics:
+    """
+    Latency, input size and output size histograms of every callback, and trigger counts.
+    """
+
+    def __init__(self):
+        self.latency = {}
+        self.input_bytes = {}
+        self.output_bytes = {}
+        self.triggers = {}
+        self._lock = threading.Lock()
+
+    def record(self, callback, trigger, milliseconds, input_bytes, output_bytes):
+        with self._lock:
+            if callback not in self.latency:
+                self.latency[callback] = Histogram(LATENCY_BUCKETS_MS)
+                self.input_bytes[callback] = Histogram(SIZE_BUCKETS_BYTES)
+                self.output_bytes[callback] = Histogram(SIZE_BUCKETS_BYTES)
+            self.latency[callback].observe(milliseconds)
+            self.input_bytes[callback].observe(input_bytes)
+            self.output_bytes[callback].observe(output_bytes)
+            self.triggers[callback, trigger] = self.triggers.get((callback, trigger), 0) + 1
+
+    def render(self):
+        """
+        :return: Every metric in the Prometheus text format
+        """
+        pid = os.getpid()
+        lines = []
+        with self._lock:
+            for name, histograms, description in (
+                    ("dash_callback_latency_ms", self.latency, "Wall time of the callback request"),
+                    ("dash_callback_input_bytes", self.input_bytes, "Size of the serialized inputs and states"),
+                    ("dash_callback_output_bytes", self.output_bytes, "Size of the serialized outputs")):
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+                for callback, histogram in sorted(histograms.items()):
+                    lines += histogram.lines(name, f'callback="{callback}",pid="{pid}"')
+            lines += ["# HELP dash_callback_triggers_total Callback calls by triggering property",
+                      "# TYPE dash_callback_triggers_total counter"]
+            for (callback, trigger), count in sorted(self.triggers.items()):
+                lines.append(f'dash_callback_triggers_total{{callback="{callback}",trigger="{trigger}",'
+                             f'pid="{pid}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def callback_name(app, body):
+    # The body of an update request names the outputs of the callback, which is how Dash finds it
+    output = body.get("output", "")
+    callback = app.callback_map.get(output, {}).get("callback")
+    return getattr(callback, "__name__", output)
+
+
+def instrument(app, slow_ms=None):
+    """
+    Records the metrics of every callback of a Dash app and serves them on /metrics
+    :param app: Dash app, its layout and callbacks can be defined before or after
+    :param slow_ms: Callbacks slower than this many milliseconds are logged, None to log nothing
+    :return: CallbackMetrics of the app
+    """
+    metrics = CallbackMetrics()
+    update_path = app.config.routes_pathname_prefix + "_dash-update-component"
+    server = app.server
+
+    @server.before_request
+    def start_timer():
+        if request.path == update_path:
+            g.callback_start = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response):
+        if request.path != update_path or "callback_start" not in g:
+            return response
+        milliseconds = (time.perf_counter() - g.callback_start) * 1000
+        body = request.get_json(silent=True) or {}
+        name = callback_name(app, body)
+        trigger = ",".join(body.get("changedPropIds", [])) or "initial"
+        input_bytes = request.content_length or 0
+        output_bytes = response.calculate_content_length() or 0
+        metrics.record(name, trigger, milliseconds, input_bytes, output_bytes)
+        if slow_ms is not None and milliseconds >= slow_ms:
+            slow_log.warning("%s took %.1f ms (trigger %s, %d bytes in, %d bytes out)",
+                             name, milliseconds, trigger, input_bytes, output_bytes)
+        return response
+
+    @server.route(app.config.routes_pathname_prefix + "metrics")
+    def serve_metrics():
+        if request.remote_addr not in LOCAL_ADDRESSES:
+            return Response("Metrics are only served locally\n", status=403, mimetype="text/plain")
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    return metrics
+
+
+def instrument_from_env(app):
+    """
+    Instruments an app, with the slow callback log configured by TWOSIX_SLOW_CALLBACK_MS and TWOSIX_SLOW_CALLBACK_LOG
+    :param app: Dash app
+    :return: CallbackMetrics of the app
+    """
+    slow_ms = os.environ.get("TWOSIX_SLOW_CALLBACK_MS")
+    if slow_ms is not None and not slow_log.handlers:
+        log_file = os.environ.get("TWOSIX_SLOW_CALLBACK_LOG")
+        handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s [pid %(process)d] %(message)s"))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.WARNING)
+    return instrument(app, float(slow_ms) if slow_ms is not None else None)
@@ -0,0 +1,240 @@
+import os
+import re
+from functools import lru_cache
+import numpy as np
+"""
+Matching of LLM relations with ground truth relations, used by the scoring (scoring.py) and by the LLM comparison
+tables (alignment.py).
+
+There are three modes:
+- exact: src, tgt and direction must be equal
+- normalized: equal once every span is lowercased, its whitespace collapsed and its surrounding punctuation stripped,
+  so "Increase" matches "increase" and " Fish  stocks" matches "fish stocks"
+- fuzzy: the normalized directions must be equal, and the similarity of the src spans and of the tgt spans must both
+  reach a threshold. The similarity is the Jaccard index of the word sets of the spans ("jaccard"), or of their
+  character trigrams ("ngram"). Every LLM relation is matched with at most one ground truth relation, best pairs first
+
+Fuzzy matching is done in batches: every candidate pair of relations of every given sentence is scored at once with
+NumPy, so a whole corpus is rescored in one call (see ScoringEngine.add_sentences).
+
+The mode of the UI is set with TWOSIX_MATCHING (normalized by default), TWOSIX_MATCH_SIMILARITY and
+TWOSIX_MATCH_THRESHOLD.
+"""
+
+MODES = ("exact", "normalized", "fuzzy")
+SIMILARITIES = ("jaccard", "ngram")
+DEFAULT_THRESHOLD = 0.5
+NGRAM = 3
+SPAN_CACHE_SIZE = 1 << 16  # A few tens of MB of trigram hashes at most
+
+_whitespace = re.compile(r"\s+")
+PUNCTUATION = " .,;:!?\"'()[]{}"
+
+
+def normalize_span(span):
+    return _whitespace.sub(" ", str(span).casefold()).strip(PUNCTUATION)
+
+
+def normalize_key(relation):
+    """
+    :param relation: Relation (see corpus_model.py)
+    :return: (src, tgt, direction), normalized
+    """
+    return normalize_span(relation.src), normalize_span(relation.tgt), normalize_span(relation.direction)
+
+
+@lru_cache(maxsize=SPAN_CACHE_SIZE)
+def span_features(span, similarity):
+    """
+    Features of a span, cached for the most recently used spans. The cache is bounded, as the matcher of the UI is
+    shared by every session and lives as long as the server
+    :param span: Normalized span
+    :param similarity: One of SIMILARITIES
+    :return: Tuple of the distinct hashes of its words ("jaccard") or character trigrams ("ngram")
+    """
+    if similarity == "jaccard":
+        grams = span.split()
+    else:
+        padded = f" {span} "
+        grams = [padded[i:i + NGRAM] for i in range(max(len(padded) - NGRAM + 1, 1))]
+    return tuple({hash(gram) for gram in grams})
+
+
+def _gather(indptr, flat, rows):
+    # Concatenates the rows of a CSR layout, in the order given
+    lengths = indptr[rows + 1] - indptr[rows]
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return flat[np.repeat(indptr[rows], lengths) + offsets], lengths
+
+
+class RelationMatcher:
+    """
+    Matches relations in one of the MODES.
+    Sentences are given to the matcher as their prepared relations (see prepare), which is what the scoring engine
+    keeps for every sentence.
+    :param mode: One of MODES
+    :param similarity: One of SIMILARITIES, for the fuzzy mode
+    :param threshold: Lowest similarity of a fuzzy match, between 0 and 1
+    """
+
+    def __init__(self, mode="normalized", similarity="jaccard", threshold=DEFAULT_THRESHOLD):
+        if mode not in MODES:
+            raise ValueError(f"Unknown matching mode {mode}, expected one of {', '.join(MODES)}")
+        if similarity not in SIMILARITIES:
+            raise ValueError(f"Unknown similarity {similarity}, expected one of {', '.join(SIMILARITIES)}")
+        self.mode = mode
+        self.similarity = similarity
+        self.threshold = threshold
+
+    def keys(self, relations):
+        """
+        :param relations: Relations
+        :return: List of their keys, normalized unless the mode is exact
+        """
+        if self.mode == "exact":
+            return [relation.key for relation in relations]
+        return [normalize_key(relation) for relation in relations]
+
+    def prepare(self, relations):
+        """
+        :param relations: Relations of a sentence
+        :return: Set of keys, or tuple of distinct keys in the fuzzy mode
+        """
+        if self.mode == "fuzzy":
+            return tuple(dict.fromkeys(self.keys(relations)))
+        return set(self.keys(relations))
+
+    def true_positives(self, gold, predicted):
+        """
+        :param gold: Prepared ground truth relations
+        :param predicted: Prepared LLM relations
+        :return: Number of LLM relations matched with a ground truth relation
+        """
+        if self.mode != "fuzzy":
+            return len(gold & predicted)
+        return int(self.true_positives_many([(gold, predicted)])[0])
+
+    def true_positives_many(self, sentences):
+        """
+        :param sentences: List of (prepared ground truth relations, prepared LLM relations)
+        :return: Array of true positive counts, one per sentence
+        """
+        if self.mode != "fuzzy":
+            return np.array([len(gold & predicted) for gold, predicted in sentences], dtype=np.int64)
+        sentence, _, _ = self._assign(sentences)
+        return np.bincount(sentence, minlength=len(sentences))
+
+    def pairs(self, gold, predicted):
+        """
+        Matches the relations of one sentence
+        :param gold: Keys of the ground truth relations (see keys), duplicates allowed
+        :param predicted: Keys of the LLM relations
+        :return: List of (ground truth index, LLM index), every index appears at most once
+        """
+        if self.mode == "fuzzy":
+            _, gold_index, predicted_index = self._assign([(gold, predicted)])
+            return sorted(zip(gold_index.tolist(), predicted_index.tolist()), key=lambda pair: pair[1])
+        rows = {}
+        for i, key in reversed(list(enumerate(gold))):
+            rows.setdefault(key, []).append(i)  # The first of duplicated relations is matched first
+        matched = []
+        for j, key in enumerate(predicted):
+            if rows.get(key):
+                matched.append((rows[key].pop(), j))
+        return matched
+
+    def _feature_table(self, spans):
+        # Feature ids of the spans of one batch, in CSR layout, numbered from 0 for that batch, and how many there are
+        features = [span_features(span, self.similarity) for span in spans]
+        lengths = np.array([len(f) for f in features], dtype=np.int64)
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        if not features:
+            return (indptr, np.zeros(0, dtype=np.int64)), 0
+        hashes = np.fromiter((h for f in features for h in f), dtype=np.int64, count=int(indptr[-1]))
+        distinct, flat = np.unique(hashes, return_inverse=True)
+        return (indptr, flat.astype(np.int64)), len(distinct)
+
+    def _similarities(self, table, size, a, b):
+        # Jaccard index of the feature sets of the span pairs (a[i], b[i]), all pairs at once
+        a_features, a_lengths = _gather(*table, a)
+        b_features, b_lengths = _gather(*table, b)
+        pair = np.arange(len(a), dtype=np.int64)
+        stride = size + 1
+        # The spans of a pair have distinct features each, so a feature they share shows up twice once sorted
+        tagged = np.sort(np.concatenate((np.repeat(pair, a_lengths) * stride + a_features,
+                                         np.repeat(pair, b_lengths) * stride + b_features)))
+        shared = tagged[1:][tagged[1:] == tagged[:-1]]
+        intersection = np.bincount(shared // stride, minlength=len(a))
+        union = a_lengths + b_lengths - intersection
+        return np.where(union > 0, intersection / np.maximum(union, 1), 1.0)
+
+    def _assign(self, sentences):
+        """
+        Fuzzy matching of a batch of sentences
+        :param sentences: List of (ground truth keys, LLM keys)
+        :return: (sentence, ground truth index, LLM index) arrays of the matched pairs
+        """
+        spans = {}
+        sentence_of = []
+        gold_rows = []  # (sentence, local index, src span, tgt span, direction span) of every relation
+        predicted_rows = []
+        for s, (gold, predicted) in enumerate(sentences):
+            for rows, keys in ((gold_rows, gold), (predicted_rows, predicted)):
+                for i, (src, tgt, direction) in enumerate(keys):
+                    rows.append((s, i, spans.setdefault(src, len(spans)), spans.setdefault(tgt, len(spans)),
+                                 spans.setdefault(direction, len(spans))))
+            sentence_of.append((len(gold), len(predicted)))
+        empty = np.zeros(0, dtype=np.int64)
+        if not gold_rows or not predicted_rows:
+            return empty, empty, empty
+        gold_rows = np.array(gold_rows, dtype=np.int64)
+        predicted_rows = np.array(predicted_rows, dtype=np.int64)
+        counts = np.array(sentence_of, dtype=np.int64)
+
+        # Every (ground truth, LLM) pair of relations of the same sentence
+        gold_start = np.concatenate(([0], np.cumsum(counts[:, 0])[:-1]))
+        predicted_start = np.concatenate(([0], np.cumsum(counts[:, 1])[:-1]))
+        per_sentence = counts[:, 0] * counts[:, 1]
+        sentence = np.repeat(np.arange(len(sentences)), per_sentence)
+        local = np.arange(per_sentence.sum()) - np.repeat(np.cumsum(per_sentence) - per_sentence, per_sentence)
+        g = gold_start[sentence] + local // counts[sentence, 1]
+        p = predicted_start[sentence] + local % counts[sentence, 1]
+        same_direction = gold_rows[g, 4] == predicted_rows[p, 4]
+        g, p, sentence = g[same_direction], p[same_direction], sentence[same_direction]
+
+        # Every distinct pair of spans is scored once
+        table, size = self._feature_table(spans)
+        span_pairs = np.stack((gold_rows[g, 2:4], predicted_rows[p, 2:4]), axis=2).reshape(-1, 2)  # src pair, tgt pair
+        span_pairs = span_pairs[:, 0] * len(spans) + span_pairs[:, 1]
+        distinct, inverse = np.unique(span_pairs, return_inverse=True)
+        similarity = self._similarities(table, size, distinct // len(spans),
+                                        distinct % len(spans))[inverse].reshape(-1, 2)
+        score = similarity.min(axis=1)
+        keep = score >= self.threshold
+        g, p, sentence, score = g[keep], p[keep], sentence[keep], score[keep]
+
+        # Greedy one to one assignment, best pairs of every sentence first
+        order = np.lexsort((p, g, -score, sentence))
+        g_list, p_list = g.tolist(), p.tolist()
+        used_gold = set()
+        used_predicted = set()
+        matched = []
+        for k in order.tolist():
+            if g_list[k] in used_gold or p_list[k] in used_predicted:
+                continue
+            used_gold.add(g_list[k])
+            used_predicted.add(p_list[k])
+            matched.append(k)
+        matched = np.array(matched, dtype=np.int64)
+        if not len(matched):
+            return empty, empty, empty
+        return sentence[matched], gold_rows[g[matched], 1], predicted_rows[p[matched], 1]
+
+
+def matcher_from_env():
+    """
+    :return: RelationMatcher configured by TWOSIX_MATCHING, TWOSIX_MATCH_SIMILARITY and TWOSIX_MATCH_THRESHOLD
+    """
+    return RelationMatcher(os.environ.get("TWOSIX_MATCHING", "normalized"),
+                           os.environ.get("TWOSIX_MATCH_SIMILARITY", "jaccard"),
+                           float(os.environ.get("TWOSIX_MATCH_THRESHOLD", DEFAULT_THRESHOLD)))
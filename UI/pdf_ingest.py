@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from corpus_store import new_sentence
+from segmenter import default_segmenter
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF uploads are optional, see requirements.txt
+    PdfReader = None
+"""
+PDF ingestion for the uploader.
+
+Text extraction and sentence segmentation run in a pool of worker processes, so the Dash callback thread never
+blocks on a PDF and several PDFs are parsed in parallel across cores. The upload callback only saves the PDFs and
+submits the first chunk of pages of each, which also counts its pages. The other chunks are submitted once the page
+count is known, and PdfBatch.sentences() yields the sentences of each chunk, in document order, as soon as that chunk
+is done. It is meant to be consumed by an ingestion job (see ingest.py), so the first page of a paper can be labeled
+while the rest is still being extracted.
+
+Every process serving the UI has its own pool, of TWOSIX_PDF_WORKERS processes, by default the cores divided by the
+number of web workers of serve.py (at least one), so the pools of all the web workers don't add up to cores squared.
+
+Requires pypdf (pip install pypdf).
+"""
+
+PAGES_PER_TASK = 4
+# Endings of a chunk of text that finish a sentence, anything else is joined with the start of the next chunk
+SENTENCE_ENDINGS = tuple(".!?\"'’”)]")
+
+_pool = None
+
+
+def pdf_support():
+    return PdfReader is not None
+
+
+def pool_size():
+    """
+    :return: TWOSIX_PDF_WORKERS, or the number of cores divided by the number of web workers (TWOSIX_WEB_WORKERS, set
+             by serve.py), at least 1
+    """
+    if os.environ.get("TWOSIX_PDF_WORKERS"):
+        return max(int(os.environ["TWOSIX_PDF_WORKERS"]), 1)
+    return max((os.cpu_count() or 1) // int(os.environ.get("TWOSIX_WEB_WORKERS", 1)), 1)
+
+
+def get_pool():
+    # The pool is created on first use, with spawn so that it behaves the same on Windows and Linux
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def extract_sentences(path, first_page, last_page):
+    """
+    Worker task extracting and segmenting a range of pages
+    :param path: Path of the PDF
+    :param first_page: First page (0 based)
+    :param last_page: Page after the last one, past the end of the PDF for its last chunk
+    :return: (number of pages of the PDF, list of sentences of the pages)
+    """
+    reader = PdfReader(path)
+    pages = len(reader.pages)
+    text = "\n".join(reader.pages[page].extract_text() or "" for page in range(first_page, min(last_page, pages)))
+    return pages, list(default_segmenter.sentences(text))
+
+
+class PdfBatch:
+    """
+    PDFs of one upload being extracted by the pool.
+    :param files: List of (file name, PDF bytes)
+    """
+
+    def __init__(self, files):
+        self.names = [name for name, _ in files]
+        self.paths = []
+        for name, content in files:
+            handle, path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(handle, "wb") as f:
+                f.write(content)
+            self.paths.append(path)
+        self.pool = get_pool()
+        # The first chunk of every PDF counts its pages, pages[i] stays None until it is done
+        self.futures = [[self.pool.submit(extract_sentences, path, 0, PAGES_PER_TASK)] for path in self.paths]
+        self.pages = [None] * len(self.paths)
+
+    def _submit_rest(self):
+        # Submits the other chunks of the PDFs whose first chunk is done
+        for index, futures in enumerate(self.futures):
+            if self.pages[index] is not None or not futures[0].done() or futures[0].exception() is not None:
+                continue
+            self.pages[index] = futures[0].result()[0]
+            futures += [self.pool.submit(extract_sentences, self.paths[index], first, first + PAGES_PER_TASK)
+                        for first in range(PAGES_PER_TASK, self.pages[index], PAGES_PER_TASK)]
+
+    def progress(self):
+        # PDFs whose pages are not counted yet are one chunk
+        total = sum(len(futures) for futures in self.futures)
+        if not total:
+            return 1.0
+        return sum(future.done() for futures in self.futures for future in futures) / total
+
+    def size(self):
+        """
+        :return: Number of pages of the PDFs, as text, None until every PDF is counted
+        """
+        if None in self.pages:
+            return None
+        return f"{sum(self.pages)} pages"
+
+    def sentences(self, on_file=None):
+        """
+        Sentences of every PDF in our main JSON format, in document order
+        :param on_file: Function called with (file index, list of sentences) once a PDF is fully extracted
+        :return: Generator of sentences
+        """
+        for index, futures in enumerate(self.futures):
+            extracted = []
+            pending = ""  # Sentence cut by the end of a chunk
+            position = 0
+            while position < len(futures):  # Grows once the first chunk has counted the pages
+                try:
+                    _, chunk = futures[position].result()
+                except Exception as error:  # Raised in the worker, by pypdf or by the pool
+                    raise ValueError(f"Could not read {self.names[index]}: {error}") from error
+                position += 1
+                self._submit_rest()
+                if pending and chunk:
+                    chunk[0] = pending + " " + chunk[0]
+                elif pending:
+                    chunk = [pending]
+                pending = ""
+                if chunk and not chunk[-1].endswith(SENTENCE_ENDINGS):
+                    pending = chunk.pop()
+                for sentence in chunk:
+                    extracted.append(new_sentence(sentence))
+                    yield extracted[-1]
+            if pending:
+                extracted.append(new_sentence(pending))
+                yield extracted[-1]
+            if on_file is not None:
+                on_file(index, extracted)
+
+    def close(self):
+        for futures in self.futures:
+            for future in futures:
+                future.cancel()
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except OSError:  # Still open in a worker on Windows, the temporary folder will be cleaned eventually
+                pass
@@ -0,0 +1,124 @@
+import argparse
+import os
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+from corpus_io import iter_sentences, write_records
+from corpus_model import Passage
+from record_ids import assign_ids, source_namespace
+"""
+Streaming conversion pipeline shared by the conversion scripts (ConvertJSONtoLLM.py, ConvJSONtoDashJSON.py,
+ConvertCustomToJSON.py) and by convert.py.
+
+A conversion is a reader, a list of transforms and a writer, connected as generators, so only a few records are in
+memory at any time whatever the size of the corpus:
+- the reader streams the passages of the input files (our main JSON format, SIFT or habitus, see corpus_io.py)
+- every transform turns a passage or record into a list of records (none, one or several), and the transforms run
+  one after the other. A transform can be a Passage -> Passage step (ConvJSONtoDashJSON.to_dash) or produce output
+  records (ConvertJSONtoLLM.to_dialog)
+- records with an empty dialog_id get a stable id, namespaced by the names of the input files (see record_ids.py),
+  then the writer streams them to a JSON array (indented like json.dumps(indent=2), or compact) or to JSONL,
+  depending on the extension of the output file, and compressed if it ends with .gz or .xz (see corpus_io.py)
+
+With workers > 1, the transforms run on a process pool, on chunks of passages, with at most two chunks per worker in
+flight, and the output keeps the order of the input. Transforms have to be module level functions, or instances of
+module level classes (augment.Augmenter), for that.
+"""
+
+CHUNK_SIZE = 256
+
+
+def read_passages(paths):
+    """
+    Streams the passages of the input files
+    :param paths: Paths of JSON, JSONL or Arrow files
+    :return: Generator of Passages
+    """
+    for path in paths:
+        for sentence in iter_sentences(path):
+            yield Passage.from_dict(sentence)
+
+
+def apply_transforms(transforms, items, start=0, namespace=""):
+    """
+    :param transforms: List of transforms, each returning a list of records for a passage or record
+    :param items: Passages or records
+    :param start: Position of the first item in the input, for the ids of the records
+    :param namespace: Namespace of the ids (see record_ids.source_namespace)
+    :return: List of the output records of all items, with their ids
+    """
+    records = []
+    for ordinal, item in enumerate(items, start):
+        outputs = [item]
+        for transform in transforms:
+            outputs = [output for record in outputs for output in transform(record)]
+        records += assign_ids(outputs, ordinal, namespace)
+    return records
+
+
+def _chunks(items, size):
+    # Yields (position of the first item, chunk)
+    items = iter(items)
+    start = 0
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def transform_stream(transforms, items, workers=1, chunk_size=CHUNK_SIZE, namespace=""):
+    """
+    Applies the transforms to a stream, on a process pool if workers > 1
+    :param transforms: List of transforms
+    :param items: Passages or records
+    :param workers: Number of worker processes
+    :param chunk_size: Number of items sent to a worker at a time
+    :param namespace: Namespace of the ids
+    :return: Generator of output records, in the order of the input
+    """
+    if workers <= 1:
+        for start, chunk in _chunks(items, chunk_size):
+            yield from apply_transforms(transforms, chunk, start, namespace)
+        return
+    with Pool(workers) as pool:
+        pending = deque()
+        for start, chunk in _chunks(items, chunk_size):
+            pending.append(pool.apply_async(apply_transforms, (transforms, chunk, start, namespace)))
+            if len(pending) >= 2 * workers:  # Reading waits for the workers, so memory stays bounded
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def run(paths, output, transforms, workers=1, chunk_size=CHUNK_SIZE, passages=None, compact=False):
+    """
+    Converts files
+    :param paths: Paths of the input files
+    :param output: Path of the output file
+    :param transforms: List of transforms
+    :param workers: Number of worker processes
+    :param chunk_size: Number of passages sent to a worker at a time
+    :param passages: Passages to convert instead of the ones of the input files
+    :param compact: Compact JSON array output instead of an indented one
+    """
+    if passages is None:
+        passages = read_passages(paths)
+    records = transform_stream(transforms, passages, workers, chunk_size, source_namespace(paths))
+    write_records(records, output, compact)
+
+
+def arguments(description):
+    """
+    Command line arguments shared by the conversion scripts
+    :param description: Description of the script
+    :return: ArgumentParser with the input files, -o, --compact and --workers
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("files", nargs="+", help="Input files, JSON or JSONL")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Output file, JSONL if it ends with .jsonl, compressed if it ends with .gz or .xz")
+    parser.add_argument("--compact", action="store_true", help="Compact JSON array, without indentation")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    return parser
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+"""
+Stable ids of the records made by the conversion pipeline (see pipeline.py).
+
+The id of a record is made of a hash of its content and of its position in the output: the ordinal of the passage it
+was made from, and its index among the records made from that passage, e.g. "3f9a0c1e-41-0". The position makes ids
+unique within a conversion, without keeping the ids given so far. Ordinals restart at 0 in every conversion, so the
+hash also covers the namespace of the conversion, made from the names of its input files (see source_namespace):
+shards of a corpus converted one at a time get different ids even for identical records at the same position, and
+ids of different corpora are unlikely to meet. Converting the same files again gives the same ids, wherever the
+files are, and workers give ids to their chunks independently.
+"""
+
+HASH_LENGTH = 8
+ID_KEY = "dialog_id"
+
+
+def source_namespace(paths):
+    """
+    :param paths: Paths of the input files of a conversion
+    :return: Namespace of its ids, from the names of the files without their directories
+    """
+    names = "\0".join(os.path.basename(path) for path in paths)
+    return hashlib.blake2b(names.encode("utf-8"), digest_size=HASH_LENGTH // 2).hexdigest()
+
+
+def content_hash(record, namespace=""):
+    """
+    :param record: JSON serializable record, its id is left out
+    :param namespace: Namespace of the conversion
+    :return: Hexadecimal hash of the record's content
+    """
+    content = {key: value for key, value in record.items() if key != ID_KEY}
+    data = json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    if namespace:
+        data = namespace.encode("utf-8") + b"\0" + data
+    return hashlib.blake2b(data, digest_size=HASH_LENGTH // 2).hexdigest()
+
+
+def record_id(record, ordinal, index=0, namespace=""):
+    """
+    :param record: JSON serializable record
+    :param ordinal: Position of the passage the record was made from, in the input of the conversion
+    :param index: Position of the record among the records made from that passage
+    :param namespace: Namespace of the conversion, see source_namespace
+    :return: Id of the record
+    """
+    return f"{content_hash(record, namespace)}-{ordinal}-{index}"
+
+
+def assign_ids(records, ordinal, namespace=""):
+    """
+    Gives an id to the records made from one passage that have an empty id field
+    :param records: Records made from the passage
+    :param ordinal: Position of the passage in the input
+    :param namespace: Namespace of the conversion, see source_namespace
+    :return: The records
+    """
+    for index, record in enumerate(records):
+        if isinstance(record, dict) and ID_KEY in record and record[ID_KEY] is None:
+            record[ID_KEY] = record_id(record, ordinal, index, namespace)
+    return records
@@ -0,0 +1,107 @@
+from matching import RelationMatcher
+"""
+Incremental scoring of LLM outputs against the ground truth causal relations.
+
+Every sentence is reduced to its prepared relations (see matching.py), one for the ground truth and one per LLM. The
+engine keeps running TP/FP/FN/TN totals per LLM, so that adding a sentence, removing one, or editing its ground truth
+only costs the size of that sentence, and the metrics can be read at any time without going over the corpus again.
+Each worker of the UI has its own engine per session, which follows the edits of the other workers as they are
+replayed (see corpus_store.py).
+How an LLM relation matches a ground truth relation (exactly, normalized or fuzzy) is up to the engine's matcher.
+"""
+
+
+def relation_sets(passage, matcher):
+    """
+    Prepares the relations of a passage for scoring
+    :param passage: Passage (see corpus_model.py)
+    :param matcher: RelationMatcher
+    :return: (prepared ground truth, {LLM: prepared relations})
+    """
+    outputs = {llm: matcher.prepare(relations) for llm, relations in passage.llm.items()}
+    return matcher.prepare(passage.relations), outputs
+
+
+def sentence_scores(gold, predicted, tp):
+    """
+    Confusion counts of one sentence for one LLM
+    :param gold: Prepared ground truth
+    :param predicted: Prepared LLM relations
+    :param tp: Number of LLM relations matched with the ground truth
+    :return: {"TP": int, "FP": int, "TN": int, "FN": int}
+    """
+    return {"TP": tp,
+            "FP": len(predicted) - tp,
+            "TN": 1 if not gold and not predicted else 0,  # Nothing to find, and nothing found
+            "FN": len(gold) - tp}
+
+
+def compute_metrics(scores):
+    """
+    Precision, recall, F1 and accuracy from confusion counts, 0 where undefined
+    :param scores: {"TP": int, "FP": int, "TN": int, "FN": int}
+    :return: {"precision": float, "recall": float, "F1": float, "accuracy": float}
+    """
+    tp, fp, tn, fn = scores["TP"], scores["FP"], scores["TN"], scores["FN"]
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    total = tp + fp + tn + fn
+    accuracy = (tp + tn) / total if total else 0.0
+    return {"precision": precision, "recall": recall, "F1": f1, "accuracy": accuracy}
+
+
+class ScoringEngine:
+    """
+    Running confusion counts per LLM.
+    Sentences are given as the prepared relations returned by relation_sets(), and the engine never looks at the
+    corpus itself.
+    :param matcher: RelationMatcher the relations were prepared with, normalized matching by default
+    """
+
+    def __init__(self, matcher=None):
+        self.matcher = matcher if matcher is not None else RelationMatcher()
+        self.scores = {}
+
+    def _counts(self, llm):
+        if llm not in self.scores:
+            self.scores[llm] = {"TP": 0, "FP": 0, "TN": 0, "FN": 0}
+        return self.scores[llm]
+
+    def add_sentence(self, gold, outputs, sign=1):
+        for llm, predicted in outputs.items():
+            counts = self._counts(llm)
+            tp = self.matcher.true_positives(gold, predicted)
+            for name, value in sentence_scores(gold, predicted, tp).items():
+                counts[name] += sign * value
+
+    def add_sentences(self, sentences):
+        """
+        Adds many sentences at once, matching all of their relations in one batch
+        :param sentences: List of (prepared ground truth, {LLM: prepared relations})
+        """
+        pairs = [(llm, gold, predicted) for gold, outputs in sentences for llm, predicted in outputs.items()]
+        tps = self.matcher.true_positives_many([(gold, predicted) for _, gold, predicted in pairs])
+        for (llm, gold, predicted), tp in zip(pairs, tps.tolist()):
+            counts = self._counts(llm)
+            for name, value in sentence_scores(gold, predicted, tp).items():
+                counts[name] += value
+
+    def remove_sentence(self, gold, outputs):
+        self.add_sentence(gold, outputs, sign=-1)
+
+    def replace_gold(self, old_gold, new_gold, outputs):
+        """
+        Updates the counts after the ground truth of a sentence was edited
+        :param old_gold: Prepared ground truth before the edit
+        :param new_gold: Prepared ground truth after the edit
+        :param outputs: {LLM: prepared relations} of the sentence
+        """
+        self.remove_sentence(old_gold, outputs)
+        self.add_sentence(new_gold, outputs)
+
+    def metrics(self):
+        return {llm: compute_metrics(counts) for llm, counts in self.scores.items()}
+
+    def clear(self):
+        self.scores = {}
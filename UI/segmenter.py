@@ -0,0 +1,99 @@
+import re
+"""
+Sentence segmentation for RTF and TXT uploads.
+
+The text is scanned once for candidate boundaries (., ! or ? followed by whitespace), and each candidate is checked
+in constant time against an abbreviation lexicon and the case of the next word, so segmentation is linear in the
+length of the text. Sentences are returned as (start, end) offsets into the text instead of copies, so callers only
+copy the sentences they keep.
+
+A period does not end a sentence when the word it ends is in the abbreviation lexicon ("et al.", "Fig.", "e.g.", ...),
+when it ends a single letter initial ("J. Smith"), or when the next word does not start with an uppercase letter,
+which is the rule the previous abbreviation_handler used. Blank lines always end a sentence.
+"""
+
+DEFAULT_ABBREVIATIONS = (
+    # Citations and references
+    "et al.", "al.", "cf.", "ibid.", "ed.", "eds.", "vol.", "no.", "pp.", "p.", "ch.", "sec.", "ref.", "refs.",
+    "fig.", "figs.", "tab.", "eq.", "eqs.", "app.",
+    # Latin and common abbreviations
+    "e.g.", "i.e.", "etc.", "vs.", "viz.", "approx.", "ca.", "incl.", "resp.",
+    # Titles
+    "dr.", "mr.", "mrs.", "ms.", "prof.", "st.", "jr.", "sr.",
+    # Organisations
+    "dept.", "univ.", "inc.", "ltd.", "co.", "corp.", "u.s.", "u.k.",
+    # Months
+    "jan.", "feb.", "mar.", "apr.", "jun.", "jul.", "aug.", "sep.", "sept.", "oct.", "nov.", "dec.",
+)
+
+# A terminator, any closing quotes or brackets, and the whitespace before a word that does not start with a lowercase
+# letter or a digit; or a blank line
+_BOUNDARY = re.compile(r"(?P<terminator>[.!?])[\"'’”)\]]*(?P<space>\s+)(?=[\"'‘“(\[]*[^\W\d_a-z])|\n[ \t]*\n\s*")
+_OPENERS = "\"'‘“(["
+
+
+class Segmenter:
+    """
+    Splits text into sentences.
+    :param abbreviations: Abbreviations that do not end a sentence, matched on their last word and case-insensitively
+    """
+
+    def __init__(self, abbreviations=DEFAULT_ABBREVIATIONS):
+        self.abbreviations = {abbreviation.split()[-1].lower() for abbreviation in abbreviations}
+        # Words longer than the longest abbreviation never need to be looked at
+        self._lookback = max((len(abbreviation) for abbreviation in self.abbreviations), default=2) + 1
+
+    def _is_boundary(self, text, match):
+        space = match.group("space")
+        if space is None or space.count("\n") > 1:  # Blank line
+            return True
+        if match.group("terminator") != ".":
+            return True
+        end = match.start() + 1
+        window = text[max(0, end - self._lookback):end].split()
+        word = window[-1].lstrip(_OPENERS) if window else ""
+        if word.lower() in self.abbreviations:
+            return False
+        if len(word) == 2 and word[0].isupper():  # Initials such as "J."
+            return False
+        following = match.end()
+        while text[following] in _OPENERS:
+            following += 1
+        return text[following].isupper()  # The regex already excluded ASCII lowercase letters
+
+    def spans(self, text):
+        """
+        Finds the sentences of a text
+        :param text: Text to segment
+        :return: List of (start, end) offsets of the sentences, without surrounding whitespace
+        """
+        spans = []
+        start = 0
+        for match in _BOUNDARY.finditer(text):
+            if not self._is_boundary(text, match):
+                continue
+            end = match.start("space") if match.group("space") is not None else match.start()
+            spans.append((start, end))
+            start = match.end()
+        spans.append((start, len(text)))
+        stripped = []
+        for start, end in spans:
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if start < end:
+                stripped.append((start, end))
+        return stripped
+
+    def sentences(self, text):
+        """
+        Sentences of a text, with line breaks inside a sentence replaced by spaces
+        :param text: Text to segment
+        :return: Generator of sentences
+        """
+        for start, end in self.spans(text):
+            yield " ".join(text[start:end].split())
+
+
+default_segmenter = Segmenter()
@@ -0,0 +1,62 @@
+import argparse
+import multiprocessing
+import os
+from state_backend import DEFAULT_URL
+"""
+Production entry point of the UI.
+
+python DashUI.py runs Dash's development server: one process, with the debug reloader. This script serves the same
+app with gunicorn, under several worker processes, so that a lab of annotators can label on one machine and
+throughput grows with the number of cores. The corpus of every session is kept in a shared state backend
+(see state_backend.py), so any worker can answer any request and restarting a worker loses nothing.
+
+Run from the UI folder:
+    python serve.py
+    python serve.py --workers 8 --bind 0.0.0.0:8050 --backend sqlite:///annotations.db
+    python serve.py --backend redis://localhost:6379/0
+
+Requires gunicorn (pip install gunicorn), which does not run on Windows. On Windows, waitress serves the app in a
+single process with several threads, and the SQLite backend still keeps the sessions across restarts:
+    waitress-serve --threads 8 --listen 0.0.0.0:8050 DashUI:server
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves the labeling UI with several worker processes")
+    parser.add_argument("--bind", default="0.0.0.0:8050", help="Address and port to listen on")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count() * 2 + 1,
+                        help="Worker processes, 2 per core plus 1 by default")
+    parser.add_argument("--threads", type=int, default=2, help="Threads per worker")
+    parser.add_argument("--backend", default=os.environ.get("TWOSIX_STATE_BACKEND", DEFAULT_URL),
+                        help="Shared state backend, sqlite:///path or redis://host:port/db")
+    parser.add_argument("--timeout", type=int, default=120, help="Seconds before a stuck worker is restarted")
+    args = parser.parse_args()
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("serve.py needs gunicorn, install it with: pip install gunicorn")
+
+    # Read by DashUI.py when each worker imports it
+    os.environ["TWOSIX_STATE_BACKEND"] = args.backend
+    # The PDF pools of the workers share the cores (see pdf_ingest.py)
+    os.environ["TWOSIX_WEB_WORKERS"] = str(args.workers)
+
+    class DashApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", args.bind)
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("timeout", args.timeout)
+
+        def load(self):
+            # Imported in every worker, not before forking, so that no worker shares a database connection or a
+            # PDF process pool with another
+            from DashUI import server
+            return server
+
+    DashApplication().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import os
+from arrow_corpus import arrow_support
+from corpus_io import ARROW_EXTENSION, open_writer, strip_compression
+from corpus_model import as_passage
+from matching import normalize_span
+from pipeline import read_passages
+"""
+Train, validation and test splits of corpora, decided passage by passage from a hash.
+
+A passage goes to the split its hash falls in: the hash of its normalized text (casefolded, repeated whitespace and
+surrounding punctuation removed, see matching.py), or of the title in its meta data when splitting by title, so that
+all the sentences of a paper are in the same split (passages without a title fall back to their text). The split of a
+passage never depends on the other passages, so:
+- the files are split in one streaming pass, whatever their size
+- adding data to a corpus leaves the passages it had in their splits, as long as the fractions and the seed are kept
+- the same passage in two corpora is in the same split, so it can't leak from the training set into the test set
+
+Run from the UI folder:
+    python split.py OSW_labeled_data.json ../Fine_Tuning/LLM_data/SIFT_data_2024_03.jsonl -o corpus.jsonl
+        (corpus.train.jsonl, corpus.validation.jsonl and corpus.test.jsonl, 80/10/10)
+    python split.py OSW_labeled_data.json -o osw.json --fractions train=0.75 test=0.25 --by title
+    python split.py SIFT.arrow -o SIFT.arrow        (Arrow corpora, see arrow_corpus.py)
+"""
+
+DEFAULT_FRACTIONS = {"train": 0.8, "validation": 0.1, "test": 0.1}
+KEYS = ("text", "title")
+SEED = ""
+HASH_BYTES = 8
+
+
+def split_key(passage, by="text"):
+    """
+    :param passage: Passage or sentence dictionary
+    :param by: One of KEYS
+    :return: Normalized string the split is decided from
+    """
+    passage = as_passage(passage)
+    if by == "title":
+        title = normalize_span(passage.meta_data.get("title") or "")
+        if title:
+            return "title:" + title
+    elif by != "text":
+        raise ValueError(f"Unknown split key {by}, expected one of {', '.join(KEYS)}")
+    return "text:" + normalize_span(passage.text)
+
+
+def unit_hash(key, seed=SEED):
+    """
+    :param key: String
+    :param seed: Seed of the hash, other seeds give other splits
+    :return: Float in [0, 1), uniform over keys
+    """
+    digest = hashlib.blake2b(f"{seed}\0{key}".encode("utf-8"), digest_size=HASH_BYTES).digest()
+    return int.from_bytes(digest, "big") / 2 ** (8 * HASH_BYTES)
+
+
+class Splitter:
+    """
+    Assigns passages to splits.
+    :param fractions: {split name: fraction of the passages}, normalized to sum to 1. Changing the fractions moves
+        passages between splits
+    :param by: Split by passage "text" or by paper "title"
+    :param seed: Seed of the hash
+    """
+
+    def __init__(self, fractions=None, by="text", seed=SEED):
+        fractions = dict(DEFAULT_FRACTIONS if fractions is None else fractions)
+        total = sum(fractions.values())
+        if total <= 0 or any(fraction < 0 for fraction in fractions.values()):
+            raise ValueError("Split fractions must be positive")
+        if by not in KEYS:
+            raise ValueError(f"Unknown split key {by}, expected one of {', '.join(KEYS)}")
+        self.names = list(fractions)
+        self.bounds = []
+        cumulative = 0
+        for name in self.names:
+            cumulative += fractions[name] / total
+            self.bounds.append(cumulative)
+        self.by = by
+        self.seed = seed
+
+    def __call__(self, passage):
+        """
+        :param passage: Passage or sentence dictionary
+        :return: Name of its split
+        """
+        value = unit_hash(split_key(passage, self.by), self.seed)
+        for name, bound in zip(self.names, self.bounds):
+            if value < bound:
+                return name
+        return self.names[-1]  # Rounding of the bounds
+
+    def select(self, passages, name):
+        """
+        :param passages: Iterable of passages
+        :param name: Split name
+        :return: Generator of the passages of that split
+        """
+        return (passage for passage in passages if self(passage) == name)
+
+
+def split_path(path, name):
+    """
+    :param path: Output path, e.g. corpus.jsonl.gz
+    :param name: Split name
+    :return: Path of the split, e.g. corpus.train.jsonl.gz
+    """
+    uncompressed = strip_compression(path)
+    root, extension = os.path.splitext(uncompressed)
+    return f"{root}.{name}{extension}{path[len(uncompressed):]}"
+
+
+def split_files(paths, output, splitter, compact=False):
+    """
+    Writes the passages of the input files to one file per split, in one pass
+    :param paths: Paths of the input files
+    :param output: Output path, see split_path. The splits of a .arrow output are Arrow corpora
+    :param splitter: Splitter
+    :param compact: Compact JSON arrays instead of indented ones
+    :return: {split name: number of passages}
+    """
+    writers = {}
+    try:
+        for name in splitter.names:
+            writers[name] = open_writer(split_path(output, name), compact)
+        for passage in read_passages(paths):
+            writers[splitter(passage)].write(passage)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {name: writer.count for name, writer in writers.items()}
+
+
+def parse_fractions(values):
+    """
+    :param values: List of "name=fraction" strings
+    :return: {split name: fraction}
+    """
+    fractions = {}
+    for value in values:
+        name, _, fraction = value.partition("=")
+        try:
+            fractions[name] = float(fraction)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bad split fraction {value}, expected name=fraction")
+    return fractions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Splits corpora into train, validation and test files")
+    parser.add_argument("files", nargs="+", help="Input files, JSON or JSONL")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Output file, the split name is added before its extension (corpus.json -> "
+                             "corpus.train.json), JSONL if it ends with .jsonl, an Arrow corpus if it ends with .arrow")
+    parser.add_argument("--fractions", nargs="+", metavar="NAME=FRACTION",
+                        help="Splits and their fractions, train=0.8 validation=0.1 test=0.1 if not given")
+    parser.add_argument("--by", choices=KEYS, default="text", help="Keep passages with the same text or title together")
+    parser.add_argument("--seed", default=SEED, help="Seed of the hash, other seeds give other splits")
+    parser.add_argument("--compact", action="store_true", help="Compact JSON arrays, without indentation")
+    args = parser.parse_args()
+    try:
+        splitter = Splitter(parse_fractions(args.fractions) if args.fractions else None, args.by, args.seed)
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+    if strip_compression(args.output).endswith(ARROW_EXTENSION):
+        if strip_compression(args.output) != args.output:
+            parser.error(f"Arrow corpora can't be compressed: {args.output}")
+        if not arrow_support():
+            parser.error("Arrow corpora need pyarrow, install it with: pip install pyarrow")
+    for name, count in split_files(args.files, args.output, splitter, args.compact).items():
+        print(f"{split_path(args.output, name)}: {count} passages")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+try:
+    import redis
+except ImportError:  # The Redis backend is optional, see requirements.txt
+    redis = None
+"""
+Durable, shared state backends for the corpus store.
+
+Every edit made in the UI (a saved relation, a table edit, a discarded sentence, an inserted inverse sentence, ...) is
+written through to the backend as a small transaction touching only the rows of that sentence (and the change log
+below), so the cost of writing an edit does not grow with the corpus (see corpus_store.py for what it costs the
+workers) and no work is lost when the browser is closed or a worker restarts. When the UI is served by several worker
+processes (see serve.py), the backend is also how they share sessions: every worker keeps a cached copy of a session,
+and every write logs its changes with the revision it made, so the other workers catch up by replaying the changes
+after their revision. The log keeps the last CHANGE_LOG_LENGTH revisions of a session, a copy further behind is
+reloaded as a whole.
+
+Three backends are available, chosen with the TWOSIX_STATE_BACKEND environment variable:
+- sqlite:///path/to/file.db, a local SQLite database, the default (twosix_state.db in the working directory)
+- redis://host:port/db, a Redis server (requires the redis package)
+- memory, to keep sessions in the memory of the process only
+
+In the SQLite database, each session has a current corpus made of sentences (ordered by a position) and their causal
+relations, one row per relation. Saving a download closes the corpus and starts a new one, closed corpora are kept and
+can be exported again with export_annotations.py.
+
+Sentences are identified by row ids, which the corpus store keeps next to its cached sentences. Writes happen inside
+locked(session_id), which serializes the writers of a session across processes.
+"""
+
+DEFAULT_URL = "sqlite:///twosix_state.db"
+LOCK_TIMEOUT = 30
+CHANGE_LOG_LENGTH = 100
+# Distance between appended sentences, sentences inserted in between take the middle position
+POSITION_STEP = 1.0
+MIN_POSITION_GAP = 1e-9
+
+_SENTENCE_KEYS = ("text", "causal relations", "meta_data")
+
+
+def _extra(sentence):
+    # Keys other than the main ones (usually "LLM"), kept as they are
+    extra = {key: value for key, value in sentence.items() if key not in _SENTENCE_KEYS}
+    return json.dumps(extra) if extra else None
+
+
+def _relation_row(relation):
+    return relation["src"], relation["tgt"], relation["direction"]
+
+
+def _contiguous(since, log):
+    # The log entries after a revision, None unless they are all there
+    if not log or [revision for revision, _ in log] != list(range(since + 1, since + 1 + len(log))):
+        return None
+    return log
+
+
+def _positions(low, high, count):
+    # count positions evenly spread between low and high (both excluded), None if they are too close
+    gap = (high - low) / (count + 1)
+    if gap < MIN_POSITION_GAP:
+        return None
+    return [low + gap * (i + 1) for i in range(count)]
+
+
+class SQLiteBackend:
+    """
+    Sessions in a SQLite database, in WAL mode so that readers never wait for a writer.
+    :param path: Path of the database file, created if it does not exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()  # sqlite3 connections cannot be shared between threads
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS corpora (
+                id INTEGER PRIMARY KEY, session TEXT NOT NULL, created REAL NOT NULL, closed REAL);
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY, revision INTEGER NOT NULL, corpus INTEGER NOT NULL REFERENCES corpora (id));
+            CREATE TABLE IF NOT EXISTS sentences (
+                id INTEGER PRIMARY KEY, corpus INTEGER NOT NULL REFERENCES corpora (id), position REAL NOT NULL,
+                text TEXT NOT NULL, meta_data TEXT NOT NULL, extra TEXT);
+            CREATE INDEX IF NOT EXISTS sentences_position ON sentences (corpus, position);
+            CREATE TABLE IF NOT EXISTS relations (
+                id INTEGER PRIMARY KEY, sentence INTEGER NOT NULL REFERENCES sentences (id) ON DELETE CASCADE,
+                src TEXT NOT NULL, tgt TEXT NOT NULL, direction TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS relations_sentence ON relations (sentence);
+            CREATE TABLE IF NOT EXISTS statuses (id TEXT PRIMARY KEY, status TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS changes (
+                session TEXT NOT NULL, revision INTEGER NOT NULL, changes TEXT NOT NULL,
+                PRIMARY KEY (session, revision));
+        """)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode, transactions are opened explicitly by locked()
+            connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+        return connection
+
+    def _corpus(self, session_id):
+        # Current corpus of a session, created on its first write
+        connection = self._connection()
+        row = connection.execute("SELECT corpus FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row:
+            return row[0]
+        corpus = connection.execute("INSERT INTO corpora (session, created) VALUES (?, ?)",
+                                    (session_id, time.time())).lastrowid
+        connection.execute("INSERT INTO sessions (id, revision, corpus) VALUES (?, 0, ?)", (session_id, corpus))
+        return corpus
+
+    def revision(self, session_id):
+        row = self._connection().execute("SELECT revision FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def set_revision(self, session_id, revision, changes=()):
+        """
+        Sets the revision of a session, and logs the changes that made it
+        :param session_id: Session id
+        :param revision: New revision
+        :param changes: JSON serializable list of the changes of the write (see CorpusStore._apply)
+        """
+        self._corpus(session_id)
+        connection = self._connection()
+        connection.execute("UPDATE sessions SET revision = ? WHERE id = ?", (revision, session_id))
+        connection.execute("INSERT OR REPLACE INTO changes (session, revision, changes) VALUES (?, ?, ?)",
+                           (session_id, revision, json.dumps(list(changes))))
+        connection.execute("DELETE FROM changes WHERE session = ? AND revision <= ?",
+                           (session_id, revision - CHANGE_LOG_LENGTH))
+
+    def changes(self, session_id, since):
+        """
+        :param session_id: Session id
+        :param since: Revision of a cached copy of the session
+        :return: List of (revision, list of changes) of the revisions after it, None if the log does not go back to it
+        """
+        rows = self._connection().execute(
+            "SELECT revision, changes FROM changes WHERE session = ? AND revision > ? ORDER BY revision",
+            (session_id, since)).fetchall()
+        return _contiguous(since, [(revision, json.loads(changes)) for revision, changes in rows])
+
+    def load(self, session_id):
+        """
+        :return: (revision, list of sentence ids, list of sentences in our main JSON format)
+        """
+        row = self._connection().execute("SELECT revision, corpus FROM sessions WHERE id = ?",
+                                         (session_id,)).fetchone()
+        if not row:
+            return 0, [], []
+        ids, sentences = self._sentences(row[1])
+        return row[0], ids, sentences
+
+    def _sentences(self, corpus):
+        connection = self._connection()
+        ids = []
+        sentences = {}
+        for sentence_id, text, meta_data, extra in connection.execute(
+                "SELECT id, text, meta_data, extra FROM sentences WHERE corpus = ? ORDER BY position", (corpus,)):
+            ids.append(sentence_id)
+            sentences[sentence_id] = {"text": text, "causal relations": [], "meta_data": json.loads(meta_data)}
+            if extra:
+                sentences[sentence_id].update(json.loads(extra))
+        for sentence_id, src, tgt, direction in connection.execute(
+                "SELECT relations.sentence, src, tgt, direction FROM relations "
+                "JOIN sentences ON sentences.id = relations.sentence WHERE corpus = ? ORDER BY relations.id",
+                (corpus,)):
+            sentences[sentence_id]["causal relations"].append({"src": src, "tgt": tgt, "direction": direction})
+        return ids, [sentences[sentence_id] for sentence_id in ids]
+
+    def _renumber(self, corpus):
+        # Spreads the positions of a corpus again, once repeated inserts at the same place used up the gap
+        connection = self._connection()
+        ids = [row[0] for row in connection.execute(
+            "SELECT id FROM sentences WHERE corpus = ? ORDER BY position", (corpus,))]
+        connection.executemany("UPDATE sentences SET position = ? WHERE id = ?",
+                               [((i + 1) * POSITION_STEP, sentence_id) for i, sentence_id in enumerate(ids)])
+
+    def insert_sentences(self, session_id, before, sentences):
+        """
+        Inserts sentences in the current corpus of a session
+        :param session_id: Session id
+        :param before: Id of the sentence they go before, None to append them
+        :param sentences: List of sentences in our main JSON format
+        :return: Ids of the inserted sentences
+        """
+        connection = self._connection()
+        corpus = self._corpus(session_id)
+        positions = None
+        while positions is None:
+            if before is None:
+                last = connection.execute("SELECT MAX(position) FROM sentences WHERE corpus = ?",
+                                          (corpus,)).fetchone()[0] or 0.0
+                positions = [last + POSITION_STEP * (i + 1) for i in range(len(sentences))]
+            else:
+                high = connection.execute("SELECT position FROM sentences WHERE id = ?", (before,)).fetchone()[0]
+                low = connection.execute("SELECT MAX(position) FROM sentences WHERE corpus = ? AND position < ?",
+                                         (corpus, high)).fetchone()[0]
+                positions = _positions(high - POSITION_STEP if low is None else low, high, len(sentences))
+                if positions is None:
+                    self._renumber(corpus)
+        ids = []
+        for position, sentence in zip(positions, sentences):
+            sentence_id = connection.execute(
+                "INSERT INTO sentences (corpus, position, text, meta_data, extra) VALUES (?, ?, ?, ?, ?)",
+                (corpus, position, sentence["text"], json.dumps(sentence["meta_data"]), _extra(sentence))).lastrowid
+            connection.executemany("INSERT INTO relations (sentence, src, tgt, direction) VALUES (?, ?, ?, ?)",
+                                   [(sentence_id, *_relation_row(relation))
+                                    for relation in sentence["causal relations"]])
+            ids.append(sentence_id)
+        return ids
+
+    def delete_sentence(self, session_id, sentence_id):
+        self._connection().execute("DELETE FROM sentences WHERE id = ?", (sentence_id,))
+
+    def add_relation(self, session_id, sentence_id, relation):
+        self._connection().execute("INSERT INTO relations (sentence, src, tgt, direction) VALUES (?, ?, ?, ?)",
+                                   (sentence_id, *_relation_row(relation)))
+
+    def set_relations(self, session_id, sentence_id, relations):
+        connection = self._connection()
+        connection.execute("DELETE FROM relations WHERE sentence = ?", (sentence_id,))
+        connection.executemany("INSERT INTO relations (sentence, src, tgt, direction) VALUES (?, ?, ?, ?)",
+                               [(sentence_id, *_relation_row(relation)) for relation in relations])
+
+    def set_meta_data(self, session_id, sentence_ids, meta_data):
+        self._connection().executemany("UPDATE sentences SET meta_data = ? WHERE id = ?",
+                                       [(json.dumps(meta_data), sentence_id) for sentence_id in sentence_ids])
+
+    def clear(self, session_id):
+        # The corpus is closed, not deleted, so it can still be exported
+        connection = self._connection()
+        now = time.time()
+        connection.execute("UPDATE corpora SET closed = ? WHERE id = ?", (now, self._corpus(session_id)))
+        corpus = connection.execute("INSERT INTO corpora (session, created) VALUES (?, ?)",
+                                    (session_id, now)).lastrowid
+        connection.execute("UPDATE sessions SET corpus = ? WHERE id = ?", (corpus, session_id))
+
+    def export(self, session_id):
+        row = self._connection().execute("SELECT corpus FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return self.export_corpus(row[0]) if row else []
+
+    def export_corpus(self, corpus):
+        """
+        Sentences of a corpus, current or closed, in our main JSON format
+        :param corpus: Corpus id, see corpora()
+        :return: List of sentences
+        """
+        return self._sentences(corpus)[1]
+
+    def corpora(self):
+        """
+        Every corpus of the database, oldest first
+        :return: List of {"id", "session", "created", "closed", "sentences", "relations"}
+        """
+        rows = self._connection().execute(
+            "SELECT corpora.id, session, created, closed, COUNT(DISTINCT sentences.id), COUNT(relations.id) "
+            "FROM corpora LEFT JOIN sentences ON sentences.corpus = corpora.id "
+            "LEFT JOIN relations ON relations.sentence = sentences.id GROUP BY corpora.id ORDER BY corpora.id")
+        return [dict(zip(("id", "session", "created", "closed", "sentences", "relations"), row)) for row in rows]
+
+    @contextmanager
+    def locked(self, session_id):
+        # SQLite only has one writer at a time, so this locks every session, which is fine for a lab of annotators
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def set_status(self, session_id, status):
+        self._connection().execute(
+            "INSERT INTO statuses (id, status) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET status = excluded.status",
+            (session_id, json.dumps(status)))
+
+    def status(self, session_id):
+        row = self._connection().execute("SELECT status FROM statuses WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class RedisBackend:
+    """
+    Sessions in Redis, for workers spread over several machines.
+    Each sentence is a JSON string, and each session has a sorted set of its sentence ids, scored by position.
+    An edit rewrites the one sentence it changes. Cleared corpora are renamed, not deleted.
+    :param url: Redis URL, redis://host:port/db
+    :param prefix: Prefix of every key
+    """
+
+    def __init__(self, url, prefix="twosix:"):
+        if redis is None:
+            raise ImportError("The Redis backend needs the redis package, install it with: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, session_id, name):
+        return f"{self.prefix}{session_id}:{name}"
+
+    def _sentence_key(self, sentence_id):
+        return f"{self.prefix}sentence:{sentence_id}"
+
+    def revision(self, session_id):
+        return int(self.client.get(self._key(session_id, "revision")) or 0)
+
+    def set_revision(self, session_id, revision, changes=()):
+        changes_key = self._key(session_id, "changes")
+        pipeline = self.client.pipeline()
+        pipeline.set(self._key(session_id, "revision"), revision)
+        pipeline.zremrangebyscore(changes_key, revision, revision)
+        pipeline.zadd(changes_key, {json.dumps([revision, list(changes)]): revision})
+        pipeline.zremrangebyscore(changes_key, "-inf", revision - CHANGE_LOG_LENGTH)
+        pipeline.execute()
+
+    def changes(self, session_id, since):
+        entries = self.client.zrangebyscore(self._key(session_id, "changes"), f"({since}", "+inf")
+        return _contiguous(since, [tuple(json.loads(entry)) for entry in entries])
+
+    def load(self, session_id):
+        revision = self.revision(session_id)
+        ids, sentences = self._sentences(self._key(session_id, "order"))
+        return revision, ids, sentences
+
+    def _sentences(self, order_key):
+        ids = [int(sentence_id) for sentence_id in self.client.zrange(order_key, 0, -1)]
+        if not ids:
+            return [], []
+        return ids, [json.loads(sentence) for sentence in
+                     self.client.mget([self._sentence_key(sentence_id) for sentence_id in ids])]
+
+    def _edit(self, sentence_id, edit):
+        key = self._sentence_key(sentence_id)
+        sentence = json.loads(self.client.get(key))
+        edit(sentence)
+        self.client.set(key, json.dumps(sentence))
+
+    def _renumber(self, order_key):
+        ids = self.client.zrange(order_key, 0, -1)
+        self.client.zadd(order_key, {sentence_id: (i + 1) * POSITION_STEP for i, sentence_id in enumerate(ids)})
+
+    def insert_sentences(self, session_id, before, sentences):
+        order_key = self._key(session_id, "order")
+        positions = None
+        while positions is None:
+            if before is None:
+                last = self.client.zrevrange(order_key, 0, 0, withscores=True)
+                start = last[0][1] if last else 0.0
+                positions = [start + POSITION_STEP * (i + 1) for i in range(len(sentences))]
+            else:
+                high = self.client.zscore(order_key, before)
+                low = self.client.zrevrangebyscore(order_key, f"({high}", "-inf", start=0, num=1, withscores=True)
+                positions = _positions(low[0][1] if low else high - POSITION_STEP, high, len(sentences))
+                if positions is None:
+                    self._renumber(order_key)
+        last_id = self.client.incrby(f"{self.prefix}next_sentence", len(sentences))
+        ids = list(range(last_id - len(sentences) + 1, last_id + 1))
+        pipeline = self.client.pipeline()
+        for sentence_id, position, sentence in zip(ids, positions, sentences):
+            pipeline.set(self._sentence_key(sentence_id), json.dumps(sentence))
+            pipeline.zadd(order_key, {sentence_id: position})
+        pipeline.execute()
+        return ids
+
+    def delete_sentence(self, session_id, sentence_id):
+        pipeline = self.client.pipeline()
+        pipeline.zrem(self._key(session_id, "order"), sentence_id)
+        pipeline.delete(self._sentence_key(sentence_id))
+        pipeline.execute()
+
+    def add_relation(self, session_id, sentence_id, relation):
+        self._edit(sentence_id, lambda sentence: sentence["causal relations"].append(dict(relation)))
+
+    def set_relations(self, session_id, sentence_id, relations):
+        self._edit(sentence_id, lambda sentence: sentence.update({"causal relations": relations}))
+
+    def set_meta_data(self, session_id, sentence_ids, meta_data):
+        for sentence_id in sentence_ids:
+            self._edit(sentence_id, lambda sentence: sentence.update({"meta_data": meta_data}))
+
+    def clear(self, session_id):
+        order_key = self._key(session_id, "order")
+        if self.client.exists(order_key):
+            self.client.rename(order_key, self._key(session_id, f"closed:{time.time()}"))
+
+    def export(self, session_id):
+        return self._sentences(self._key(session_id, "order"))[1]
+
+    @contextmanager
+    def locked(self, session_id):
+        with self.client.lock(self._key(session_id, "lock"), timeout=LOCK_TIMEOUT, blocking_timeout=LOCK_TIMEOUT):
+            yield
+
+    def set_status(self, session_id, status):
+        self.client.set(self._key(session_id, "status"), json.dumps(status))
+
+    def status(self, session_id):
+        status = self.client.get(self._key(session_id, "status"))
+        return json.loads(status) if status is not None else None
+
+
+def backend_from_url(url):
+    """
+    Creates the backend of a URL
+    :param url: sqlite:///path, redis://..., or memory for no backend
+    :return: Backend, or None
+    """
+    if url == "memory":
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown state backend {url}, expected sqlite:///path, redis://host:port/db or memory")
+
+
+def backend_from_env():
+    return backend_from_url(os.environ.get("TWOSIX_STATE_BACKEND", DEFAULT_URL))
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+"""
+Content-addressed cache of parsed uploads.
+
+Parsed uploads are kept under the SHA-256 of the uploaded bytes, so opening the same paper again (under any file
+name) skips RTF conversion, segmentation, JSON parsing and PDF extraction. Entries are evicted least recently used
+first once their total size goes over the bound, which is set in megabytes by TWOSIX_UPLOAD_CACHE_MB (256 by default).
+The size of an entry is the size of the uploaded file, which is a good enough estimate of its parsed size.
+
+Cached values are shared between sessions and must not be modified, the corpus store copies what it is given.
+"""
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("TWOSIX_UPLOAD_CACHE_MB", 256)) * 1024 * 1024)
+
+
+def content_key(content):
+    """
+    Key of an upload
+    :param content: Uploaded bytes
+    :return: SHA-256 hex digest
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+class UploadCache:
+    """
+    LRU cache of parsed uploads, bounded by the total size of the uploads it holds.
+    :param max_bytes: Size bound, 0 disables the cache
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, size):
+        """
+        Caches a parsed upload, evicting the least recently used ones if needed
+        :param key: content_key() of the upload
+        :param value: Parsed upload
+        :param size: Size of the upload in bytes
+        """
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
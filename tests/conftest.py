@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The UI and fine-tuning modules are scripts run from their own folders, not an installed package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ("UI", "Fine_Tuning"):
+    sys.path.insert(0, os.path.join(ROOT, folder))
@@ -0,0 +1,91 @@
+import json
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from arrow_corpus import ArrowCorpus, ArrowWriter, is_arrow, write_arrow  # noqa: E402
+from corpus_io import iter_sentences, iter_texts, write_records  # noqa: E402
+from corpus_store import CorpusStore  # noqa: E402
+from ingest import start_arrow_ingest  # noqa: E402
+
+FISH = {"src": "fishing", "tgt": "fish stocks", "direction": "decrease"}
+WIND = {"src": "wind farms", "tgt": "seabirds", "direction": "increase"}
+
+
+def sentence(text, relations=(), llm=None, **extra):
+    data = {"text": text, "causal relations": list(relations), "meta_data": {"title": "Paper", "authors": "",
+                                                                              "year": "2020"}}
+    if llm:
+        data["LLM"] = llm
+    data.update(extra)
+    return data
+
+
+CORPUS = [sentence("Fishing reduces fish stocks.", [FISH], {"a": [FISH], "b": []}),
+          sentence("Wind farms kill seabirds.", [WIND], source="SIFT", score=0.5),
+          sentence("Nothing happens here.")] + [sentence(f"Sentence {i}.", [FISH, WIND]) for i in range(20)]
+
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    path = str(tmp_path / "corpus.arrow")
+    assert write_arrow(CORPUS, path, batch_size=7) == len(CORPUS)  # Several record batches
+    return path
+
+
+def test_round_trip(corpus_path):
+    assert is_arrow(corpus_path)
+    with ArrowCorpus(corpus_path) as corpus:
+        assert len(corpus) == len(CORPUS)
+        assert list(corpus.sentences()) == CORPUS
+        assert corpus.position == len(CORPUS)
+        assert list(corpus.texts()) == [s["text"] for s in CORPUS]
+        assert corpus[1] == CORPUS[1]
+        assert corpus[-1] == CORPUS[-1]
+        with pytest.raises(IndexError):
+            corpus[len(CORPUS)]
+
+
+def test_empty_corpus(tmp_path):
+    path = str(tmp_path / "empty.arrow")
+    assert write_arrow([], path) == 0
+    with ArrowCorpus(path) as corpus:
+        assert len(corpus) == 0
+        assert list(corpus.sentences()) == []
+
+
+def test_writer_counts_passages(tmp_path):
+    path = str(tmp_path / "corpus.arrow")
+    with ArrowWriter(path, batch_size=2) as writer:
+        for s in CORPUS[:5]:
+            writer.write(s)
+    assert writer.count == 5
+    assert list(iter_sentences(path)) == CORPUS[:5]
+
+
+def test_corpus_io_reads_and_writes_arrow(tmp_path, corpus_path):
+    # Arrow corpora are detected from their first bytes, whatever their name
+    renamed = tmp_path / "corpus.json"
+    renamed.write_bytes(open(corpus_path, "rb").read())
+    assert list(iter_sentences(str(renamed))) == CORPUS
+    assert list(iter_texts(corpus_path)) == [s["text"] for s in CORPUS]
+
+    source = tmp_path / "corpus.jsonl"
+    source.write_text("\n".join(json.dumps(s) for s in CORPUS))
+    output = str(tmp_path / "converted.arrow")
+    write_records(iter_sentences(str(source)), output)
+    assert is_arrow(output)
+    assert list(iter_sentences(output)) == list(iter_sentences(str(source)))
+    write_records(CORPUS, output)
+    assert list(iter_sentences(output)) == CORPUS
+
+
+def test_ingest(corpus_path):
+    store = CorpusStore()
+    job = start_arrow_ingest(store, "session", corpus_path, "corpus.arrow")
+    job.join(10)
+    status = store.status("session")
+    assert status["done"] and status["error"] is None
+    assert status["records"] == len(CORPUS) and status["progress"] == 1.0
+    assert store.texts("session", 0, len(CORPUS)) == [s["text"] for s in CORPUS]
+    assert store.relations("session", 1) == [WIND]
@@ -0,0 +1,44 @@
+import pytest
+from augment import Augmenter, GENERATORS, TRAINING_WEIGHTS, parse_weights
+from corpus_model import Passage
+
+FISH = {"src": "fishing", "tgt": "fish stocks", "direction": "decrease"}
+WIND = {"src": "wind farms", "tgt": "fish stocks", "direction": "increase"}
+
+
+def answers(dialogs):
+    return [dialog["dialog"][1]["text"] for dialog in dialogs]
+
+
+def test_one_dialog_per_generator():
+    passage = Passage("Fishing and wind farms", [FISH, WIND])
+    dialogs = Augmenter({name: 1 for name in GENERATORS})(passage)
+    assert len(set(answers(dialogs))) == len(dialogs)
+    gold = dialogs[0]
+    assert gold["eval_score"] == 10 and gold["profile_match"] == 1
+    assert answers([gold]) == ["source fishing target fish stocks direction decrease  "
+                               "source wind farms target fish stocks direction increase  "]
+    assert ("source fishing target fish stocks direction increase  "
+            "source wind farms target fish stocks direction decrease  ") in answers(dialogs)  # flipped
+
+
+def test_generators_without_a_different_answer_are_skipped():
+    passage = Passage("Nothing causal here")
+    names = ["gold", "shuffled", "flipped", "swapped", "dropped"]
+    assert len(Augmenter({name: 1 for name in names})(passage)) == 1
+
+
+def test_samples_are_seeded_by_the_passage():
+    passage = Passage("Fishing and wind farms", [FISH, WIND])
+    augmenter = Augmenter(samples=4)
+    assert answers(augmenter(passage)) == answers(Augmenter(samples=4)(passage.copy()))
+    assert len(augmenter(passage)) == 4
+
+
+def test_training_weights_and_parsing():
+    assert len(Augmenter(TRAINING_WEIGHTS)(Passage("a", [FISH]))) == 5
+    assert parse_weights(["gold=2", "flipped"]) == {"gold": 2.0, "flipped": 1.0}
+    with pytest.raises(ValueError):
+        Augmenter({"mirrored": 1})
+    with pytest.raises(ValueError):
+        Augmenter({"gold": 0})
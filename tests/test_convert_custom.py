@@ -0,0 +1,40 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import ConvertCustomToJSON  # noqa: E402
+from ConvertCustomToJSON import SHEET_COLUMNS, kuldeep_excel  # noqa: E402
+
+
+def sheet(rows):
+    df = pd.DataFrame([dict(zip(SHEET_COLUMNS, row)) for row in rows], columns=SHEET_COLUMNS)
+    df["Year"] = pd.to_numeric(df["Year"], errors="coerce")
+    return df
+
+
+def convert(monkeypatch, df):
+    monkeypatch.setattr(ConvertCustomToJSON, "read_sheet", lambda path, cache=True: df)
+    return [(p.text, p.meta_data.get("year"), [r.key for r in p.relations]) for p in kuldeep_excel("sheet.xlsx")]
+
+
+def row(paper, claim, src, direction, tgt, year=2020):
+    return [paper, "Author", year, "Title", "", claim, src, direction, tgt]
+
+
+def test_rows_of_a_claim_are_one_passage(monkeypatch):
+    df = sheet([row("1", "Claim a", "Fishing", "Decrease", "Stocks"), row("2", "Claim b", "Wind", "increase", "birds"),
+                row("1", "Claim a", "Wind", "increase", "Noise", None)])
+    assert convert(monkeypatch, df) == [("Claim a", 2020, [("fishing", "stocks", "decrease"),
+                                                           ("wind", "noise", "increase")]),
+                                        ("Claim b", 2020, [("wind", "birds", "increase")])]
+
+
+def test_rows_without_an_id_are_grouped_by_claim(monkeypatch):
+    df = sheet([row(None, "Claim a", "a", "increase", "b"), row(None, "Claim b", "c", "increase", "d"),
+                row(None, "Claim a", "e", "decrease", "f")])
+    assert [(text, len(relations)) for text, _, relations in convert(monkeypatch, df)] == [("Claim a", 2),
+                                                                                          ("Claim b", 1)]
+
+
+def test_empty_sheet(monkeypatch):
+    assert convert(monkeypatch, sheet([])) == []
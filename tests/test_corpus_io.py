@@ -0,0 +1,100 @@
+import gzip
+import io
+import json
+import lzma
+import pytest
+import corpus_io
+from corpus_io import (decompress, iter_records, iter_sentences, open_corpus, sift_direction, strip_compression,
+                       to_sentence, write_records)
+
+RECORDS = [{"text": f"Sentence {i}, with \"quotes\" and ] brackets", "causal relations": [],
+            "meta_data": {"title": "", "authors": "", "year": ""}} for i in range(20)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_iter_records_of_arrays_and_lines(chunk_size):
+    array = json.dumps(RECORDS, indent=2)
+    lines = "\n".join(json.dumps(record) for record in RECORDS) + "\n"
+    assert list(iter_records(io.StringIO(array), chunk_size)) == RECORDS
+    assert list(iter_records(io.StringIO(lines), chunk_size)) == RECORDS
+    assert list(iter_records(io.StringIO("  [ ]"), chunk_size)) == []
+
+
+def test_truncated_array():
+    with pytest.raises(ValueError, match="Unexpected end"):
+        list(iter_records(io.StringIO(json.dumps(RECORDS)[:-40]), 16))
+
+
+def test_malformed_array_fails_without_reading_the_rest():
+    stream = io.StringIO('[{"text": x}, ' + '{"text": "padding"}, ' * 100000 + "]")
+    with pytest.raises(ValueError, match="Malformed"):
+        list(iter_records(stream, 64))
+    assert stream.tell() < 1000
+
+
+def test_record_size_cap(monkeypatch):
+    monkeypatch.setattr(corpus_io, "MAX_RECORD_SIZE", 1000)
+    stream = io.StringIO('[{"text": "' + "x" * 100000 + '"}]')
+    with pytest.raises(ValueError, match="more than 1000"):
+        list(iter_records(stream, 64))
+    assert stream.tell() < 2000
+    stream = io.StringIO('{"text": "a"}\n{"text": "' + "x" * 100000 + '"}\n')
+    with pytest.raises(ValueError, match="more than 1000"):
+        list(iter_records(stream, 64))
+    assert stream.tell() < 2000
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+def test_long_lines_cut_by_chunks(chunk_size):
+    records = [{"text": "x" * 5000}, {"text": "short"}, {"text": "y" * 300}]
+    lines = "\n\n".join(json.dumps(record) for record in records)  # Blank lines, no newline at the end
+    assert list(iter_records(io.StringIO(lines), chunk_size)) == records
+
+
+@pytest.mark.parametrize("name", ["corpus.json", "corpus.jsonl", "corpus.json.gz", "corpus.jsonl.xz"])
+@pytest.mark.parametrize("compact", [False, True])
+def test_write_and_read_back(tmp_path, name, compact):
+    path = str(tmp_path / name)
+    write_records(RECORDS, path, compact)
+    assert list(iter_sentences(path)) == RECORDS
+    if name == "corpus.json" and not compact:
+        with open(path) as f:
+            assert f.read() == json.dumps(RECORDS, indent=2)
+
+
+def test_compression_is_detected_from_the_content(tmp_path):
+    data = json.dumps(RECORDS).encode()
+    for opener, name in ((gzip.open, "gzipped.json"), (lzma.open, "xz.txt")):
+        with opener(tmp_path / name, "wb") as f:
+            f.write(data)
+        with open_corpus(str(tmp_path / name)) as stream:
+            assert list(iter_records(stream)) == RECORDS
+    assert decompress(io.BytesIO(gzip.compress(data))).read() == data
+    assert decompress(io.BytesIO(data)).read() == data
+
+
+def test_strip_compression():
+    assert strip_compression("corpus.jsonl.gz") == "corpus.jsonl"
+    assert strip_compression("data/corpus.json.xz") == "data/corpus.json"
+    assert strip_compression("paper.pdf") == "paper.pdf"
+
+
+def test_sift_direction():
+    assert sift_direction("increase(s)") == "increase"
+    assert sift_direction("decrease(s)") == "decrease"
+    assert sift_direction("harm(s)") == "harm"
+    assert sift_direction("type-of") == "type-of"
+
+
+def test_to_sentence():
+    sift = {"premise": "Fishing lowers stocks", "hypotheses": [{"subj": "fishing", "pred": "decrease(s)",
+                                                               "obj": "stocks"}]}
+    assert to_sentence(sift)["causal relations"] == [{"src": "fishing", "tgt": "stocks", "direction": "decrease"}]
+    habitus = {"passage": "Fishing lowers stocks",
+               "rels": [{"model_name": "Ground truth", "rels": [{"head": "fishing", "tail": "stocks",
+                                                                 "direction_head": "increase",
+                                                                 "direction_tail": "decease"}]},
+                        {"model_name": "model", "rels": []}]}
+    sentence = to_sentence(habitus)
+    assert sentence["causal relations"] == [{"src": "fishing", "tgt": "stocks", "direction": "decrease"}]
+    assert sentence["LLM"] == {"model": []}
@@ -0,0 +1,222 @@
+import random
+import threading
+import pytest
+from corpus_store import CorpusStore, new_sentence
+from matching import RelationMatcher
+from state_backend import SQLiteBackend, backend_from_url
+
+SESSION = "session"
+FISH = {"src": "fishing", "tgt": "fish stocks", "direction": "decrease"}
+WIND = {"src": "wind farms", "tgt": "fish stocks", "direction": "increase"}
+
+
+def sentence(text, relations=(), llm=None):
+    data = {"text": text, "causal relations": list(relations), "meta_data": {"title": "", "authors": "", "year": ""}}
+    if llm:
+        data["LLM"] = llm
+    return data
+
+
+@pytest.fixture
+def workers(tmp_path):
+    # Two stores on the same database, like two worker processes of serve.py
+    path = str(tmp_path / "state.db")
+    return CorpusStore(SQLiteBackend(path)), CorpusStore(SQLiteBackend(path))
+
+
+def test_memory_store():
+    store = CorpusStore()
+    store.extend(SESSION, [sentence("a"), sentence("c")])
+    store.insert(SESSION, 1, new_sentence("b"))
+    assert store.texts(SESSION, 0, 3) == ["a", "b", "c"]
+    assert store.add_relation(SESSION, 1, FISH)
+    assert not store.add_relation(SESSION, 1, FISH)
+    assert store.relations(SESSION, 1) == [FISH]
+    assert store.pop(SESSION, -1)["text"] == "c"
+    assert store.length(SESSION) == 2
+    assert store.length("other session") == 0
+
+
+def test_revision_follows_writes():
+    store = CorpusStore()
+    revision = store.extend(SESSION, [sentence("a")])
+    assert store.set_relations(SESSION, 0, [FISH]) == revision + 1
+    assert store.revision(SESSION) == revision + 1
+    store.add_relation(SESSION, 0, FISH)  # Duplicate, nothing written
+    assert store.revision(SESSION) == revision + 1
+
+
+def test_meta_data_without_empty_sentences_writes_nothing(workers):
+    first, second = workers
+    first.extend(SESSION, [sentence("a")])
+    revision = first.fill_meta_data(SESSION, {"title": "Paper", "authors": "", "year": ""})
+    assert first.fill_meta_data(SESSION, {"title": "Other", "authors": "", "year": ""}) == revision
+    assert first.backend.revision(SESSION) == revision
+    assert second.revision(SESSION) == revision
+    assert second.sentence(SESSION, 0)["meta_data"]["title"] == "Paper"
+
+
+def test_edits_are_seen_by_other_workers(workers):
+    first, second = workers
+    first.extend(SESSION, [sentence("a"), sentence("b"), sentence("c")])
+    assert second.texts(SESSION, 0, 3) == ["a", "b", "c"]
+
+    second.add_relation(SESSION, 1, FISH)
+    first.insert(SESSION, 1, new_sentence("a2", [WIND]))
+    second.pop(SESSION, 0)
+    first.set_relations(SESSION, -1, [FISH, WIND])
+
+    expected = [("a2", [WIND]), ("b", [FISH]), ("c", [FISH, WIND])]
+    for store in workers:
+        assert store.revision(SESSION) == first.revision(SESSION)
+        assert [(s["text"], s["causal relations"]) for s in store.window(SESSION, 0, 10)] == expected
+
+
+def test_metrics_follow_edits_of_other_workers(workers):
+    first, second = workers
+    first.extend(SESSION, [sentence("a", [FISH], {"model": [FISH, WIND]}), sentence("b", [], {"model": []})])
+    assert second.metrics(SESSION)["model"]["precision"] == 0.5
+    first.add_relation(SESSION, 0, WIND)
+    assert second.metrics(SESSION) == first.metrics(SESSION)
+    assert second.metrics(SESSION)["model"]["precision"] == 1.0
+    second.pop(SESSION, 0)
+    assert first.metrics(SESSION)["model"] == {"precision": 0.0, "recall": 0.0, "F1": 0.0, "accuracy": 1.0}
+
+
+def test_alignment_follows_edits_of_other_workers(workers):
+    first, second = workers
+    first.extend(SESSION, [sentence("a", [], {"model": [FISH]})])
+    assert first.alignment(SESSION, 0)["rows"][0]["0"] == "Unmatched"
+    second.set_relations(SESSION, 0, [FISH])
+    assert first.alignment(SESSION, 0)["rows"] == [{"0": "fishing", "1": "fish stocks", "2": "decrease",
+                                                    "3": "fishing", "4": "fish stocks", "5": "decrease"}]
+
+
+def test_clear_keeps_the_previous_corpus(workers):
+    first, second = workers
+    first.extend(SESSION, [sentence("a")])
+    first.fill_meta_data(SESSION, {"title": "Paper", "authors": "", "year": "2024"})
+    second.clear(SESSION)
+    assert first.length(SESSION) == 0
+    corpora = first.backend.corpora()
+    assert [corpus["sentences"] for corpus in corpora] == [1, 0]
+    assert first.backend.export_corpus(corpora[0]["id"])[0]["meta_data"]["title"] == "Paper"
+
+
+def test_failed_write_is_rolled_back(workers):
+    first, second = workers
+    first.extend(SESSION, [sentence("a")])
+    with pytest.raises(IndexError):
+        first.set_relations(SESSION, 5, [FISH])
+    with pytest.raises(KeyError):
+        first.add_relation(SESSION, 0, {"src": "fishing"})
+    assert second.relations(SESSION, 0) == []
+    assert first.relations(SESSION, 0) == []
+
+
+def test_status_is_shared(workers):
+    first, second = workers
+    first.set_status(SESSION, {"done": False, "read": 10})
+    assert second.status(SESSION) == {"done": False, "read": 10}
+    assert second.status("other session") is None
+
+
+def test_backend_from_url(tmp_path):
+    assert backend_from_url("memory") is None
+    assert isinstance(backend_from_url(f"sqlite:///{tmp_path / 'state.db'}"), SQLiteBackend)
+    with pytest.raises(ValueError):
+        backend_from_url("postgres://localhost")
+
+
+def count_loads(store, monkeypatch):
+    loads = []
+    load = store.backend.load
+    monkeypatch.setattr(store.backend, "load", lambda session_id: loads.append(session_id) or load(session_id))
+    return loads
+
+
+def test_other_workers_replay_changes_instead_of_reloading(workers, monkeypatch):
+    first, second = workers
+    first.extend(SESSION, [sentence(f"s{i}", [], {"model": [FISH]}) for i in range(10)])
+    assert second.length(SESSION) == 10
+    loads = count_loads(second, monkeypatch)
+
+    first.set_relations(SESSION, 3, [FISH])
+    first.insert(SESSION, 5, new_sentence("inserted", [WIND]))
+    first.add_relation(SESSION, 7, FISH)  # After the inserted sentence, found by id
+    first.pop(SESSION, 0)
+    first.pop(SESSION, -1)
+    first.extend(SESSION, [sentence("appended")])
+    first.fill_meta_data(SESSION, {"title": "Paper", "authors": "", "year": ""})
+    assert second.window(SESSION, 0, 20) == first.window(SESSION, 0, 20)
+    assert second.metrics(SESSION) == first.metrics(SESSION)
+    assert second.sentence(SESSION, -1)["meta_data"]["title"] == "Paper"
+
+    first.clear(SESSION)
+    first.extend(SESSION, [sentence("new corpus")])
+    assert second.texts(SESSION, 0, 5) == ["new corpus"]
+    assert loads == []
+
+
+def test_copies_behind_the_log_are_reloaded(workers, monkeypatch):
+    first, second = workers
+    first.extend(SESSION, [sentence("a")])
+    assert second.length(SESSION) == 1
+    loads = count_loads(second, monkeypatch)
+    monkeypatch.setattr("state_backend.CHANGE_LOG_LENGTH", 3)
+    for relations in ([FISH], [WIND], [FISH, WIND], [], [WIND]):
+        first.set_relations(SESSION, 0, relations)
+    assert second.relations(SESSION, 0) == [WIND]
+    assert loads == [SESSION]
+
+
+def test_sessions_have_their_own_lock():
+    store = CorpusStore()
+    store.extend("other session", [sentence("a")])
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with store._writing(SESSION):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(5)
+    try:
+        reader = threading.Thread(target=store.length, args=("other session",))
+        reader.start()
+        reader.join(1)
+        assert not reader.is_alive()
+    finally:
+        release.set()
+        thread.join()
+
+
+@pytest.mark.parametrize("mode", ["normalized", "fuzzy"])
+def test_replayed_scores_match_a_fresh_load(tmp_path, monkeypatch, mode):
+    path = str(tmp_path / "state.db")
+    first, second = (CorpusStore(SQLiteBackend(path), RelationMatcher(mode)) for _ in range(2))
+    rng = random.Random(9)
+    relations = [FISH, WIND, {"src": "Fishing", "tgt": "fish stock", "direction": "decrease"}]
+    first.extend(SESSION, [sentence(f"s{i}", rng.sample(relations, rng.randrange(3)),
+                                    {"a": rng.sample(relations, 2), "b": []}) for i in range(30)])
+    second.length(SESSION)
+    loads = count_loads(second, monkeypatch)
+    for _ in range(60):
+        writer = rng.choice((first, second))
+        index = rng.randrange(writer.length(SESSION))
+        action = rng.randrange(4)
+        if action == 0:
+            writer.set_relations(SESSION, index, rng.sample(relations, rng.randrange(3)))
+        elif action == 1:
+            writer.add_relation(SESSION, index, rng.choice(relations))
+        elif action == 2:
+            writer.insert(SESSION, index, sentence("new", [FISH], {"a": [WIND]}))
+        else:
+            writer.pop(SESSION, index)
+        assert second.metrics(SESSION) == first.metrics(SESSION)
+    fresh = CorpusStore(SQLiteBackend(path), RelationMatcher(mode))
+    assert fresh.metrics(SESSION) == second.metrics(SESSION)
+    assert loads == []
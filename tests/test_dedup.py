@@ -0,0 +1,55 @@
+import json
+import numpy as np
+import pytest
+from corpus_model import Passage
+from dedup import Deduplicator, MinHasher, clusters, merge, shingles
+
+FISH = {"src": "fishing", "tgt": "fish stocks", "direction": "decrease"}
+WIND = {"src": "wind farms", "tgt": "fish stocks", "direction": "increase"}
+TEXT = "Intensive bottom trawling in the North Sea has reduced the abundance of cod and other demersal fish stocks"
+
+
+def test_shingles():
+    assert shingles("One, two") == {"one two"}
+    assert shingles("One two three FOUR.") == {"one two three", "two three four"}
+
+
+def test_near_duplicates_are_clustered():
+    texts = [TEXT, "Something else entirely, about offshore wind farms and seabirds", TEXT.upper() + ".",
+             TEXT.replace("cod", "haddock")]
+    cluster = clusters(MinHasher().signatures(texts), threshold=0.8)
+    assert cluster[:3].tolist() == [0, 1, 0]
+    assert cluster[3] in (0, 3)  # One word in 18 changed, estimated around 0.8
+
+
+def test_signatures_estimate_jaccard():
+    signatures = MinHasher(256).signatures([TEXT, TEXT.replace("cod", "haddock")])
+    true = len(shingles(TEXT) & shingles(TEXT.replace("cod", "haddock"))) / len(
+        shingles(TEXT) | shingles(TEXT.replace("cod", "haddock")))
+    assert abs((signatures[0] == signatures[1]).mean() - true) < 0.1
+
+
+def test_merge_policies():
+    copies = [Passage(TEXT, [FISH]), Passage(TEXT, [WIND, FISH])]
+    assert [r.to_dict() for r in merge(copies, "union").relations] == [FISH, WIND]
+    assert [r.to_dict() for r in merge(copies, "first").relations] == [FISH]
+    assert [r.to_dict() for r in merge(copies, "most").relations] == [WIND, FISH]
+    with pytest.raises(ValueError):
+        merge(copies, "last")
+
+
+def test_deduplicator_across_files(tmp_path):
+    first = [{"text": TEXT, "causal relations": [FISH]}, {"text": "Another passage about seabirds and turbines"}]
+    second = [{"text": TEXT + " ", "causal relations": [WIND]}]
+    paths = []
+    for name, records in (("first.json", first), ("second.json", second)):
+        (tmp_path / name).write_text(json.dumps(records))
+        paths.append(str(tmp_path / name))
+    deduplicator = Deduplicator(paths)
+    report = tmp_path / "report.json"
+    passages = list(deduplicator.passages(str(report)))
+    assert [passage.text for passage in passages] == [TEXT, first[1]["text"]]
+    assert [r.to_dict() for r in passages[0].relations] == [FISH, WIND]
+    assert json.loads(report.read_text())["clusters"][0]["duplicates"][0]["file"] == paths[1]
+    assert len(deduplicator) == 2
+    assert np.array_equal(deduplicator.members, [0, 2])
@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import pytest
+from evaluate import evaluate, to_csv, unique_paths
+
+FISH = {"src": "fishing", "tgt": "fish stocks", "direction": "decrease"}
+WIND = {"src": "wind farms", "tgt": "fish stocks", "direction": "increase"}
+
+
+def sentence(text, relations, outputs):
+    return {"text": text, "causal relations": relations, "meta_data": {"title": "", "authors": "", "year": ""},
+            "LLM": {"model": outputs}}
+
+
+def habitus(passage, truth, outputs):
+    as_rels = lambda relations: [{"head": r["src"], "tail": r["tgt"], "direction_head": "increase",
+                                  "direction_tail": r["direction"]} for r in relations]
+    return {"passage": passage, "rels": [{"model_name": "Ground truth", "rels": as_rels(truth)},
+                                         {"model_name": "model", "rels": as_rels(outputs)}]}
+
+
+@pytest.fixture
+def files(tmp_path):
+    main = tmp_path / "main.json"
+    main.write_text(json.dumps([sentence("a", [FISH], [FISH, WIND]),  # TP 1, FP 1
+                                sentence("b", [WIND], []),  # FN 1
+                                sentence("c", [], [])]))  # TN 1
+    habitus_file = tmp_path / "habitus.jsonl"
+    habitus_file.write_text("\n".join(json.dumps(record) for record in [habitus("d", [FISH], [FISH]),  # TP 1
+                                                                          habitus("e", [], [FISH])]))  # FP 1
+    return str(main), str(habitus_file)
+
+
+def counts(scores):
+    return {name: scores[name] for name in ("TP", "FP", "TN", "FN")}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_totals(files, workers):
+    main, habitus_file = files
+    results = evaluate([main, habitus_file], workers=workers, shard_size=2)
+    assert results["sentences"] == 5
+    assert counts(results["models"]["model"]) == {"TP": 2, "FP": 2, "TN": 1, "FN": 1}
+    assert results["models"]["model"]["precision"] == 0.5
+    assert results["documents"][main]["sentences"] == 3
+    assert counts(results["documents"][main]["models"]["model"]) == {"TP": 1, "FP": 1, "TN": 1, "FN": 1}
+    assert counts(results["documents"][habitus_file]["models"]["model"]) == {"TP": 1, "FP": 1, "TN": 0, "FN": 0}
+
+    rows = list(csv.DictReader(io.StringIO(to_csv(results))))
+    assert [(row["document"], row["sentences"], row["TP"], row["FP"], row["TN"], row["FN"]) for row in rows] == [
+        ("ALL", "5", "2", "2", "1", "1"), (main, "3", "1", "1", "1", "1"), (habitus_file, "2", "1", "1", "0", "0")]
+    assert float(rows[0]["precision"]) == 0.5
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_a_file_given_twice_is_evaluated_once(files, workers):
+    main, _ = files
+    results = evaluate([main, main], workers=workers, shard_size=1)
+    assert results["sentences"] == 3
+    assert list(results["documents"]) == [main]
+    assert counts(results["models"]["model"]) == {"TP": 1, "FP": 1, "TN": 1, "FN": 1}
+
+
+def test_unique_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert unique_paths(["a.json", "./a.json", "b.json", str(tmp_path / "a.json")]) == ["a.json", "b.json"]
@@ -0,0 +1,88 @@
+import json
+import logging
+import pytest
+
+dash = pytest.importorskip("dash")
+
+from dash import Input, Output, html  # noqa: E402
+from instrumentation import Histogram, instrument, instrument_from_env, slow_log  # noqa: E402
+
+
+def test_histogram_buckets():
+    histogram = Histogram((5, 10))
+    for value in (1, 5, 7, 10, 11):
+        histogram.observe(value)
+    # Bounds are inclusive (le) and the buckets cumulative, as Prometheus expects them
+    assert list(histogram.lines("latency", 'callback="a"')) == [
+        'latency_bucket{callback="a",le="5"} 2',
+        'latency_bucket{callback="a",le="10"} 4',
+        'latency_bucket{callback="a",le="+Inf"} 5',
+        'latency_sum{callback="a"} 34',
+        'latency_count{callback="a"} 5']
+
+
+def make_app():
+    app = dash.Dash(__name__)
+    app.layout = html.Div([html.Button(id="button"), html.Div(id="output")])
+
+    @app.callback(Output("output", "children"), Input("button", "n_clicks"))
+    def show_clicks(n_clicks):
+        return f"{n_clicks} clicks"
+    return app
+
+
+def update(client, n_clicks):
+    body = {"output": "output.children", "outputs": {"id": "output", "property": "children"},
+            "inputs": [{"id": "button", "property": "n_clicks", "value": n_clicks}],
+            "changedPropIds": ["button.n_clicks"], "state": []}
+    response = client.post("/_dash-update-component", data=json.dumps(body), content_type="application/json")
+    assert response.status_code == 200
+    return response
+
+
+def test_callbacks_are_recorded_and_served_locally():
+    app = make_app()
+    metrics = instrument(app)
+    client = app.server.test_client()
+    update(client, 1)
+    update(client, 2)
+    assert metrics.triggers == {("show_clicks", "button.n_clicks"): 2}
+    assert sum(metrics.latency["show_clicks"].counts) == 2
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'dash_callback_latency_ms_count{callback="show_clicks"' in text
+    assert 'dash_callback_triggers_total{callback="show_clicks",trigger="button.n_clicks"' in text
+
+    remote = app.server.test_client()
+    remote.environ_base["REMOTE_ADDR"] = "10.0.0.1"
+    assert remote.get("/metrics").status_code == 403
+
+
+def test_slow_callbacks_are_logged(tmp_path, monkeypatch):
+    log_file = tmp_path / "slow.log"
+    monkeypatch.setenv("TWOSIX_SLOW_CALLBACK_MS", "0")
+    monkeypatch.setenv("TWOSIX_SLOW_CALLBACK_LOG", str(log_file))
+    handlers = list(slow_log.handlers)
+    slow_log.handlers = []
+    try:
+        app = make_app()
+        instrument_from_env(app)
+        update(app.server.test_client(), 1)
+        for handler in slow_log.handlers:
+            handler.flush()
+        assert "show_clicks took" in log_file.read_text()
+    finally:
+        for handler in slow_log.handlers:
+            handler.close()
+        slow_log.handlers = handlers
+
+
+@pytest.mark.parametrize("slow_ms, logged", [(0, True), (60000, False)])
+def test_only_slow_callbacks_are_logged(caplog, slow_ms, logged):
+    app = make_app()
+    instrument(app, slow_ms=slow_ms)
+    with caplog.at_level(logging.WARNING, logger=slow_log.name):
+        update(app.server.test_client(), 1)
+    assert bool(caplog.records) == logged
@@ -0,0 +1,71 @@
+import pytest
+from corpus_model import Relation
+from matching import SPAN_CACHE_SIZE, RelationMatcher, normalize_span, span_features
+
+GOLD = [Relation("Fishing", "fish stocks", "decrease"), Relation("wind farms", "seabird collisions", "increase")]
+PREDICTED = [Relation(" fishing.", "Fish  stocks", "Decrease"), Relation("offshore wind farms", "seabird collisions",
+                                                                         "increase")]
+
+
+def true_positives(matcher, gold, predicted):
+    return matcher.true_positives(matcher.prepare(gold), matcher.prepare(predicted))
+
+
+def test_normalize_span():
+    assert normalize_span("  Fish\n stocks. ") == "fish stocks"
+    assert normalize_span('"Increase"') == "increase"
+
+
+def test_exact():
+    matcher = RelationMatcher("exact")
+    assert true_positives(matcher, GOLD, GOLD) == 2
+    assert true_positives(matcher, GOLD, PREDICTED) == 0
+
+
+def test_normalized():
+    matcher = RelationMatcher("normalized")
+    assert true_positives(matcher, GOLD, PREDICTED) == 1
+    assert matcher.pairs(matcher.keys(GOLD), matcher.keys(PREDICTED)) == [(0, 0)]
+
+
+@pytest.mark.parametrize("similarity", ["jaccard", "ngram"])
+def test_fuzzy(similarity):
+    matcher = RelationMatcher("fuzzy", similarity, threshold=0.5)
+    assert true_positives(matcher, GOLD, PREDICTED) == 2
+    assert matcher.pairs(matcher.keys(GOLD), matcher.keys(PREDICTED)) == [(0, 0), (1, 1)]
+    # Directions must still agree
+    assert true_positives(matcher, GOLD, [Relation("fishing", "fish stocks", "increase")]) == 0
+    assert true_positives(RelationMatcher("fuzzy", similarity, threshold=1.0), GOLD, PREDICTED) == 1
+
+
+def test_fuzzy_matches_one_to_one():
+    matcher = RelationMatcher("fuzzy", threshold=0.5)
+    gold = [Relation("fishing", "fish stocks", "decrease")]
+    predicted = [Relation("fishing", "fish stocks", "decrease"), Relation("fishing", "fish stock", "decrease")]
+    assert true_positives(matcher, gold, predicted) == 1
+    assert matcher.pairs(matcher.keys(gold), matcher.keys(predicted)) == [(0, 0)]
+
+
+@pytest.mark.parametrize("mode", ["exact", "normalized", "fuzzy"])
+def test_batch_matches_one_at_a_time(mode):
+    matcher = RelationMatcher(mode)
+    sentences = [(matcher.prepare(GOLD), matcher.prepare(PREDICTED)), (matcher.prepare([]), matcher.prepare(GOLD)),
+                 (matcher.prepare(GOLD[:1]), matcher.prepare(PREDICTED[:1]))]
+    assert matcher.true_positives_many(sentences).tolist() == [matcher.true_positives(*pair) for pair in sentences]
+
+
+def test_fuzzy_matcher_keeps_no_state_between_calls():
+    matcher = RelationMatcher("fuzzy", "ngram")
+    state = dict(vars(matcher))
+    for i in range(50):
+        true_positives(matcher, [Relation(f"span {i}", "fish", "increase")],
+                       [Relation(f"span {i}!", "fish", "increase")])
+    assert vars(matcher) == state
+    assert span_features.cache_info().maxsize == SPAN_CACHE_SIZE
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        RelationMatcher("semantic")
+    with pytest.raises(ValueError):
+        RelationMatcher("fuzzy", "cosine")
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("pypdf")
+
+import pdf_ingest  # noqa: E402
+from corpus_store import CorpusStore  # noqa: E402
+from ingest import progress_text, start_job  # noqa: E402
+from pdf_ingest import PdfBatch, pool_size  # noqa: E402
+
+
+def make_pdf(pages):
+    """
+    :param pages: List of page texts, one line each
+    :return: Bytes of a PDF with those pages
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return data
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("TWOSIX_PDF_WORKERS", "2")
+    monkeypatch.setattr(pdf_ingest, "PAGES_PER_TASK", 1)
+    monkeypatch.setattr(pdf_ingest, "_pool", None)
+    yield
+    if pdf_ingest._pool is not None:
+        pdf_ingest._pool.shutdown()
+
+
+def test_pool_size(monkeypatch):
+    monkeypatch.delenv("TWOSIX_PDF_WORKERS", raising=False)
+    monkeypatch.setenv("TWOSIX_WEB_WORKERS", "1000")
+    assert pool_size() == 1
+    monkeypatch.setenv("TWOSIX_PDF_WORKERS", "3")
+    assert pool_size() == 3
+
+
+def test_pdf_batch(pool):
+    paper = make_pdf(["Fishing reduces fish stocks. Wind farms", "kill seabirds.", "Nets catch fish."])
+    batch = PdfBatch([("paper.pdf", paper), ("short.pdf", make_pdf(["One page."]))])
+    files = {}
+    texts = [sentence.text for sentence in batch.sentences(lambda index, sentences: files.update({index: sentences}))]
+    # The sentence cut by the end of the first page is joined with the start of the next one
+    assert texts == ["Fishing reduces fish stocks.", "Wind farms kill seabirds.", "Nets catch fish.", "One page."]
+    assert [len(files[0]), len(files[1])] == [3, 1]
+    assert batch.size() == "4 pages"
+    assert batch.progress() == 1.0
+    batch.close()
+
+
+def test_damaged_pdf_stops_the_job(pool):
+    store = CorpusStore()
+    batch = PdfBatch([("paper.pdf", make_pdf(["First page."])), ("damaged.pdf", b"not a pdf")])
+    job = start_job(store, "session", batch.sentences(), "paper.pdf, damaged.pdf", batch.progress, batch.close,
+                    batch.size)
+    job.join(60)
+    status = store.status("session")
+    assert status["done"] and "damaged.pdf" in status["error"]
+    assert store.texts("session", 0, 5) == ["First page."]
+    assert "stopped" in progress_text(status)
@@ -0,0 +1,44 @@
+import json
+from ConvertJSONtoLLM import to_dialog
+from corpus_io import iter_records
+from pipeline import run
+from record_ids import ID_KEY, assign_ids, content_hash, record_id, source_namespace
+
+
+def dialog(text):
+    return {ID_KEY: None, "dialog": [{"id": 0, "sender": "participant1", "text": text}]}
+
+
+def test_ids_are_stable_and_ignore_the_id_field():
+    record = dialog("Fishing decreases fish stocks")
+    assert content_hash(record) == content_hash(dict(record, **{ID_KEY: "given"}))
+    assert record_id(record, 4, 1) == record_id(dialog("Fishing decreases fish stocks"), 4, 1)
+    assert record_id(record, 4, 1).endswith("-4-1")
+
+
+def test_assign_ids():
+    records = [dialog("a"), dialog("a"), {ID_KEY: "kept"}, {"no id": True}]
+    assign_ids(records, 7)
+    assert records[0][ID_KEY] != records[1][ID_KEY]
+    assert records[1][ID_KEY].endswith("-7-1")
+    assert records[2][ID_KEY] == "kept"
+    assert ID_KEY not in records[3]
+
+
+def test_namespaces_separate_conversions():
+    first, second = source_namespace(["data/shard-0.json"]), source_namespace(["data/shard-1.json"])
+    assert first != second
+    assert source_namespace(["elsewhere/shard-0.json"]) == first
+    assert record_id(dialog("a"), 0, 0, first) != record_id(dialog("a"), 0, 0, second)
+
+
+def test_shards_converted_separately_get_distinct_ids(tmp_path):
+    sentence = {"text": "Fishing decreases fish stocks", "causal relations": [], "meta_data": {}}
+    ids = []
+    for shard in ("shard-0.json", "shard-1.json"):
+        (tmp_path / shard).write_text(json.dumps([sentence]))
+        output = str(tmp_path / (shard + "l"))
+        run([str(tmp_path / shard)], output, [to_dialog])
+        with open(output) as f:
+            ids += [record[ID_KEY] for record in iter_records(f)]
+    assert len(ids) == len(set(ids)) == 2
@@ -0,0 +1,33 @@
+from corpus_model import Passage
+from matching import RelationMatcher
+from scoring import ScoringEngine, compute_metrics, relation_sets
+
+FISH = {"src": "fishing", "tgt": "fish stocks", "direction": "decrease"}
+WIND = {"src": "wind farms", "tgt": "fish stocks", "direction": "increase"}
+
+
+def test_compute_metrics():
+    assert compute_metrics({"TP": 2, "FP": 2, "TN": 0, "FN": 0}) == {"precision": 0.5, "recall": 1.0,
+                                                                     "F1": 2 / 3, "accuracy": 0.5}
+    assert compute_metrics({"TP": 0, "FP": 0, "TN": 0, "FN": 0})["F1"] == 0.0
+
+
+def test_incremental_scores_match_a_full_rescore():
+    matcher = RelationMatcher()
+    passages = [Passage("a", [FISH], llm={"model": [FISH, WIND]}),
+                Passage("b", [WIND], llm={"model": []}),
+                Passage("c", [], llm={"model": []})]
+    engine = ScoringEngine(matcher)
+    engine.add_sentences([relation_sets(passage, matcher) for passage in passages])
+
+    # Label WIND in the first sentence, then remove the second one
+    gold, outputs = relation_sets(passages[0], matcher)
+    passages[0].add(WIND)
+    engine.replace_gold(gold, matcher.prepare(passages[0].relations), outputs)
+    engine.remove_sentence(*relation_sets(passages.pop(1), matcher))
+
+    rescored = ScoringEngine(matcher)
+    for passage in passages:
+        rescored.add_sentence(*relation_sets(passage, matcher))
+    assert engine.scores == rescored.scores == {"model": {"TP": 2, "FP": 0, "TN": 1, "FN": 0}}
+    assert engine.metrics()["model"]["F1"] == 1.0
@@ -0,0 +1,23 @@
+from segmenter import Segmenter, default_segmenter
+
+
+def test_abbreviations_and_initials():
+    text = "Stocks fell (Smith et al. 2020). J. Smith disagrees, e.g. in Fig. 3. Why? Wind farms grew!"
+    assert list(default_segmenter.sentences(text)) == [
+        "Stocks fell (Smith et al. 2020).", "J. Smith disagrees, e.g. in Fig. 3.", "Why?", "Wind farms grew!"]
+
+
+def test_lowercase_continuation_and_blank_lines():
+    text = "Catch was 3.5 t. per boat in the\nnorth\n\nSecond paragraph. third word"
+    assert list(default_segmenter.sentences(text)) == [
+        "Catch was 3.5 t. per boat in the north", "Second paragraph. third word"]
+
+
+def test_spans_are_offsets_without_whitespace():
+    text = "  One.  Two.  "
+    assert [text[start:end] for start, end in default_segmenter.spans(text)] == ["One.", "Two."]
+
+
+def test_custom_abbreviations():
+    assert list(Segmenter(("approx.",)).sentences("It is approx. Ten. Fig. Two.")) == [
+        "It is approx. Ten.", "Fig.", "Two."]
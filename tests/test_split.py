@@ -0,0 +1,86 @@
+import json
+import pytest
+from corpus_io import iter_sentences
+from split import Splitter, parse_fractions, split_files, split_path
+
+
+def passage(text, title=""):
+    return {"text": text, "causal relations": [], "meta_data": {"title": title, "authors": "", "year": ""}}
+
+
+PASSAGES = [passage(f"Sentence number {i}.", f"Paper {i % 7}") for i in range(2000)]
+
+
+def test_splits_are_stable_and_follow_the_fractions():
+    splitter = Splitter()
+    names = [splitter(p) for p in PASSAGES]
+    assert names == [Splitter()(p) for p in PASSAGES]
+    assert abs(names.count("train") / len(names) - 0.8) < 0.05
+    # Normalized text: case and surrounding whitespace don't move a passage
+    assert splitter(passage("  SENTENCE number 3 ")) == splitter(PASSAGES[3])
+    assert Splitter(seed="other")(PASSAGES[0]) in ("train", "validation", "test")
+
+
+def test_adding_data_keeps_the_splits():
+    small = Splitter({"train": 0.5, "test": 0.5})
+    before = [small(p) for p in PASSAGES[:100]]
+    assert [small(p) for p in PASSAGES[:100]] == before
+    assert list(small.select(PASSAGES[:100], "test")) == [p for p, name in zip(PASSAGES, before) if name == "test"]
+
+
+def test_split_by_title_keeps_papers_together():
+    splitter = Splitter(by="title")
+    by_paper = {}
+    for p in PASSAGES:
+        by_paper.setdefault(p["meta_data"]["title"], set()).add(splitter(p))
+    assert all(len(names) == 1 for names in by_paper.values())
+
+
+def test_bad_fractions():
+    with pytest.raises(ValueError):
+        Splitter({"train": 0, "test": 0})
+    with pytest.raises(ValueError):
+        Splitter(by="author")
+    assert parse_fractions(["train=0.75", "test=0.25"]) == {"train": 0.75, "test": 0.25}
+
+
+def test_split_path():
+    assert split_path("corpus.jsonl.gz", "train") == "corpus.train.jsonl.gz"
+    assert split_path("out/corpus.json", "test") == "out/corpus.test.json"
+
+
+def test_split_files(tmp_path):
+    source = tmp_path / "corpus.json"
+    source.write_text(json.dumps(PASSAGES[:200]))
+    output = str(tmp_path / "split.jsonl")
+    counts = split_files([str(source)], output, Splitter())
+    assert sum(counts.values()) == 200
+    texts = []
+    for name, count in counts.items():
+        sentences = list(iter_sentences(split_path(output, name)))
+        assert len(sentences) == count
+        texts += [s["text"] for s in sentences]
+    assert sorted(texts) == sorted(p["text"] for p in PASSAGES[:200])
+
+
+def test_split_files_to_arrow_corpora(tmp_path):
+    pytest.importorskip("pyarrow")
+    from arrow_corpus import is_arrow
+    source = tmp_path / "corpus.json"
+    source.write_text(json.dumps(PASSAGES[:200]))
+    output = str(tmp_path / "split.arrow")
+    counts = split_files([str(source)], output, Splitter())
+    texts = []
+    for name, count in counts.items():
+        assert is_arrow(split_path(output, name))
+        sentences = list(iter_sentences(split_path(output, name)))
+        assert len(sentences) == count
+        texts += [s["text"] for s in sentences]
+    assert sorted(texts) == sorted(p["text"] for p in PASSAGES[:200])
+
+
+def test_compressed_arrow_output_is_rejected(tmp_path):
+    source = tmp_path / "corpus.json"
+    source.write_text(json.dumps(PASSAGES[:10]))
+    with pytest.raises(ValueError):
+        split_files([str(source)], str(tmp_path / "split.arrow.gz"), Splitter())
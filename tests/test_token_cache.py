@@ -0,0 +1,73 @@
+import os
+import pytest
+
+pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+import token_cache  # noqa: E402
+from token_cache import TokenCache  # noqa: E402
+from transformers import PreTrainedTokenizerFast  # noqa: E402
+
+WORDS = ["fishing", "reduces", "fish", "stocks", "wind", "farms", "kill", "seabirds", "sentence"]
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    # A tiny local tokenizer, so nothing is downloaded
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{word: i + 2 for i, word in enumerate(WORDS)}}
+    backend = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="[UNK]"))
+    backend.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=backend, unk_token="[UNK]", pad_token="[PAD]")
+
+
+def format_entry(entry):
+    return f"{entry['text']} {entry['answer']}"
+
+
+def entries(n, start=0):
+    return [{"text": " ".join(WORDS[(i + j) % len(WORDS)] for j in range(1 + i % 5)), "answer": str(i)}
+            for i in range(start, start + n)]
+
+
+def shards(cache):
+    return [name for name in os.listdir(cache.directory) if name.endswith(".npz")]
+
+
+def test_hits_and_misses(tmp_path, tokenizer):
+    data = entries(20)
+    first = TokenCache(str(tmp_path), tokenizer, format_entry)
+    tokenized = first.tokenize(data + data[:3], labels=True, workers=1)
+    assert (first.hits, first.misses) == (0, 20)  # Repeated entries are tokenized once
+    assert tokenized == tokenized[:20] + tokenized[:3]
+    assert all(record["labels"] == record["input_ids"] for record in tokenized)
+    assert tokenized[0]["input_ids"] == tokenizer(format_entry(data[0]))["input_ids"]
+
+    second = TokenCache(str(tmp_path), tokenizer, format_entry)
+    assert second.tokenize(data, labels=True, workers=1) == tokenized[:20]
+    assert (second.hits, second.misses) == (20, 0)
+    second.tokenize(data + entries(5, 20), workers=1)
+    assert (second.hits, second.misses) == (20, 5)
+
+
+def test_max_length_is_part_of_the_key(tmp_path, tokenizer):
+    padded = TokenCache(str(tmp_path), tokenizer, format_entry, max_length=8)
+    records = padded.tokenize(entries(10), workers=1)
+    assert all(len(record["input_ids"]) == 8 for record in records)
+    assert "labels" not in records[0]
+    unpadded = TokenCache(str(tmp_path), tokenizer, format_entry)
+    assert unpadded.key != padded.key
+    unpadded.tokenize(entries(10), workers=1)
+    assert unpadded.misses == 10
+
+
+def test_shards_are_merged(tmp_path, tokenizer, monkeypatch):
+    monkeypatch.setattr(token_cache, "MAX_SHARDS", 2)
+    expected = []
+    for run in range(6):
+        cache = TokenCache(str(tmp_path), tokenizer, format_entry)
+        expected = cache.tokenize(entries(4 * (run + 1)), labels=True, workers=1)
+        assert (cache.hits, cache.misses) == (4 * run, 4)
+        assert len(shards(cache)) <= 3
+    cache = TokenCache(str(tmp_path), tokenizer, format_entry)
+    assert cache.tokenize(entries(24), labels=True, workers=1) == expected
+    assert (cache.hits, cache.misses) == (24, 0)
@@ -0,0 +1,68 @@
+import hashlib
+import importlib
+import pytest
+import upload_cache
+from upload_cache import UploadCache, content_key
+
+MB = 1024 * 1024
+
+
+def test_hit_by_content():
+    cache = UploadCache(1000)
+    cache.put(content_key(b"paper"), ["parsed"], 5)
+    # The same bytes under any file name
+    assert cache.get(content_key(b"paper")) == ["parsed"]
+    assert cache.get(content_key(b"other paper")) is None
+    assert content_key(b"paper") == hashlib.sha256(b"paper").hexdigest()
+
+
+def test_least_recently_used_are_evicted_past_the_byte_limit():
+    cache = UploadCache(100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"  # b is now the least recently used
+    cache.put("c", "C", 40)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.size == 80
+    cache.put("a", "A2", 60)  # Replacing an entry counts its new size only
+    assert cache.size == 100 and len(cache) == 2
+    assert cache.get("a") == "A2"
+
+
+def test_entry_larger_than_the_limit_is_not_cached():
+    cache = UploadCache(100)
+    cache.put("a", "A", 40)
+    cache.put("huge", "H", 101)
+    assert "huge" not in cache
+    assert cache.get("a") == "A" and cache.size == 40
+    disabled = UploadCache(0)
+    disabled.put("a", "A", 1)
+    assert len(disabled) == 0
+
+
+def test_limit_from_the_environment(monkeypatch):
+    monkeypatch.setenv("TWOSIX_UPLOAD_CACHE_MB", "0.5")
+    try:
+        assert importlib.reload(upload_cache).UploadCache().max_bytes == MB // 2
+    finally:
+        monkeypatch.delenv("TWOSIX_UPLOAD_CACHE_MB")
+        importlib.reload(upload_cache)
+    assert upload_cache.DEFAULT_MAX_BYTES == 256 * MB
+
+
+def test_uploads_are_parsed_once(monkeypatch):
+    pytest.importorskip("dash")
+    monkeypatch.setenv("TWOSIX_STATE_BACKEND", "memory")
+    DashUI = importlib.import_module("DashUI")
+    monkeypatch.setattr(DashUI, "upload_cache", UploadCache(MB))
+    calls = []
+
+    def parse(decoded):
+        calls.append(decoded)
+        return [decoded.decode()]
+
+    assert DashUI.cached_parse(parse, b"Fishing reduces stocks.", ".txt") == (["Fishing reduces stocks."], False)
+    assert DashUI.cached_parse(parse, b"Fishing reduces stocks.", ".txt") == (["Fishing reduces stocks."], True)
+    # The same bytes are parsed again as another file type
+    assert DashUI.cached_parse(parse, b"Fishing reduces stocks.", ".rtf")[1] is False
+    assert len(calls) == 2